@@ -0,0 +1,508 @@
+"""
+Load benchmark - concurrent uploads against the real app, with fake Gemini and TTS
+Run from the backend directory:
+
+    python benchmarks/bench_load.py [--jobs 40] [--clients 10] [--gemini-latency 1.5] [--workers 0]
+
+Starts fake_backends.py in-process and the API (uvicorn main:app) as a
+subprocess in a scratch directory, then has --clients clients each upload a
+note photo and poll /api/status until the job finishes, --jobs in total.
+With --workers N the jobs run in EXECUTION_MODE=queue on worker.py instead.
+
+Reports throughput, p50/p95/p99 job latency, per-stage times and Gemini
+latency (from each process's /metrics), peak RSS of the app's process trees
+and event-loop stalls, and writes everything as JSON to --out.
+
+The Gemini rate limiter is opened up (GEMINI_RPM/TPM) so the backend, not the
+quota, is measured; pass --env GEMINI_RPM=10 to include it. Any other setting
+(STAGE_LIMIT_*, TTS_MODE, ...) goes through --env as well.
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import socket
+import random
+import shutil
+import signal
+import asyncio
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_backends import FakeBackends, add_arguments, config_from_args  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][\w:]*)(?:\{(.*)\})? (\S+)$")
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# ---- Scratch environment ----
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def free_port_range(count: int) -> int:
+    """First of `count` consecutive free ports (worker i serves metrics on base + i)"""
+    for _ in range(50):
+        base = random.randint(20000, 40000)
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as s:
+                    s.bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+    raise RuntimeError("no free port range")
+
+
+def wait_http(url: str, timeout: float, process: subprocess.Popen):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[1]} exited with {process.returncode} - see its log")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def stop_process(process: subprocess.Popen, sig=signal.SIGINT, timeout: float = 15):
+    if process.poll() is None:
+        process.send_signal(sig)
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+# ---- Peak RSS (Linux /proc) ----
+
+def _tree(pid: int) -> List[int]:
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler:
+    """Peak summed RSS of each named process tree, sampled every `interval` seconds"""
+
+    def __init__(self, roots: Dict[str, int], interval: float = 0.25):
+        self.roots = roots
+        self.interval = interval
+        self.peak = {name: 0 for name in roots}
+        self.supported = os.path.isdir("/proc/self/task")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            for name, pid in self.roots.items():
+                self.peak[name] = max(self.peak[name], sum(_rss_bytes(p) for p in _tree(pid)))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.supported:
+            self._thread.start()
+        return self
+
+    def stop(self) -> Optional[Dict[str, float]]:
+        if not self.supported:
+            return None
+        self._stop.set()
+        self._thread.join()
+        return {name: round(peak / (1024 * 1024), 1) for name, peak in self.peak.items()}
+
+
+# ---- Prometheus text ----
+
+def parse_metrics(text: str) -> Dict[tuple, float]:
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match and not line.startswith("#"):
+            name, labels, value = match.groups()
+            key = (name, tuple(sorted(_LABEL.findall(labels or ""))))
+            samples[key] = float(value)
+    return samples
+
+
+def merge_metrics(scrapes: List[Dict[tuple, float]]) -> Dict[tuple, float]:
+    """Counters and histograms add up across processes; max_* gauges take the max"""
+    merged = defaultdict(float)
+    for samples in scrapes:
+        for key, value in samples.items():
+            merged[key] = max(merged[key], value) if "_max_" in key[0] else merged[key] + value
+    return merged
+
+
+def histogram_quantile(q: float, buckets: List[tuple]) -> Optional[float]:
+    """Linear interpolation inside the bucket holding the q-th observation, like PromQL's"""
+    buckets = sorted(buckets)
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower, below = 0.0, 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - below) / max(cumulative - below, 1e-9)
+        lower, below = bound, cumulative
+    return lower
+
+
+def histograms(samples: Dict[tuple, float], name: str, label: Optional[str] = None) -> dict:
+    """{label value: {count, mean, p50, p95}} for one histogram (label None = unlabelled)"""
+    grouped = defaultdict(lambda: {"buckets": [], "sum": 0.0, "count": 0.0})
+    for (metric, labels), value in samples.items():
+        if not metric.startswith(name + "_"):
+            continue
+        labels = dict(labels)
+        group = grouped[labels.get(label, "all") if label else "all"]
+        if metric == f"{name}_bucket":
+            group["buckets"].append((float(labels["le"].replace("+Inf", "inf")), value))
+        elif metric == f"{name}_sum":
+            group["sum"] = value
+        elif metric == f"{name}_count":
+            group["count"] = value
+    out = {}
+    for key, group in sorted(grouped.items()):
+        if not group["count"]:
+            continue
+        out[key] = {
+            "count": int(group["count"]),
+            "mean": round(group["sum"] / group["count"], 4),
+            "p50": _round(histogram_quantile(0.5, group["buckets"])),
+            "p95": _round(histogram_quantile(0.95, group["buckets"])),
+        }
+    return out
+
+
+def _round(value: Optional[float], digits: int = 4) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))], 3)
+
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3) if values else None,
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": round(max(values), 3) if values else None,
+    }
+
+
+# ---- Load ----
+
+def make_page(base, index: int) -> bytes:
+    """JPEG of the base page with an index-coloured block, so every upload has distinct content"""
+    page = base.copy()
+    rng = random.Random(index)
+    block = tuple(rng.randrange(256) for _ in range(3))
+    for x in range(24):
+        for y in range(24):
+            page.putpixel((16 + x, 16 + y), block)
+    buf = io.BytesIO()
+    page.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def base_page(size: str):
+    from PIL import Image, ImageDraw
+    width, height = (int(n) for n in size.lower().split("x"))
+    # Light paper noise plus lines of "writing" - compresses like a real phone photo
+    page = Image.effect_noise((width, height), 24).point(lambda v: 200 + v // 5).convert("RGB")
+    draw = ImageDraw.Draw(page)
+    rng = random.Random(1)
+    for y in range(80, height - 60, 48):
+        x = 60
+        while x < width - 120:
+            word = rng.randint(30, 140)
+            draw.line((x, y, x + word, y + rng.randint(-3, 3)), fill=(30, 30, 60), width=4)
+            x += word + 25
+    return page
+
+
+async def run_job(client: httpx.AsyncClient, args, base, index: int) -> dict:
+    pages = await asyncio.to_thread(lambda: [make_page(base, index * args.pages + p) for p in range(args.pages)])
+    files = [("files" if args.pages > 1 else "file", (f"page{p + 1}.jpg", data, "image/jpeg"))
+             for p, data in enumerate(pages)]
+    record = {"index": index, "status": None, "error": None}
+
+    started = time.perf_counter()
+    try:
+        response = await client.post("/api/upload", files=files,
+                                     data={"subject": "Physics", "chapter": f"Laws of Motion {index}"})
+    except httpx.HTTPError as e:
+        record.update(status="upload_failed", error=type(e).__name__)
+        return record
+    record["upload_s"] = round(time.perf_counter() - started, 3)
+    if response.status_code != 200:
+        record.update(status="rejected" if response.status_code in (429, 503) else "upload_failed",
+                      error=f"HTTP {response.status_code}")
+        return record
+
+    job_id = record["job_id"] = response.json()["job_id"]
+    deadline = started + args.job_timeout
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(args.poll)
+        try:
+            job = (await client.get(f"/api/status/{job_id}")).json()
+        except (httpx.HTTPError, ValueError):
+            continue
+        if job.get("stream_url") and "first_audio_s" not in record:
+            record["first_audio_s"] = round(time.perf_counter() - started, 3)
+        if job.get("status") in ("completed", "error"):
+            record["status"] = job["status"]
+            record["error"] = job.get("error")
+            record["latency_s"] = round(time.perf_counter() - started, 3)
+            record["duration"] = job.get("duration")
+            return record
+    record.update(status="timeout", latency_s=round(time.perf_counter() - started, 3))
+    return record
+
+
+async def drive(base_url: str, args, base) -> tuple:
+    next_index = 0
+    records = []
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal next_index
+        while next_index < args.jobs:
+            index = next_index
+            next_index += 1
+            records.append(await run_job(client, args, base, index))
+            done = len(records)
+            if done % max(1, args.jobs // 10) == 0 or done == args.jobs:
+                print(f"  {done}/{args.jobs} jobs finished", flush=True)
+
+    limits = httpx.Limits(max_connections=args.clients * 2, max_keepalive_connections=args.clients * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(args.clients)))
+        wall = time.perf_counter() - started
+    return sorted(records, key=lambda r: r["index"]), wall
+
+
+def scrape(urls: List[str]) -> Dict[tuple, float]:
+    scrapes = []
+    for url in urls:
+        try:
+            scrapes.append(parse_metrics(httpx.get(url, timeout=10).text))
+        except httpx.HTTPError as e:
+            print(f"  could not scrape {url}: {e}")
+    return merge_metrics(scrapes)
+
+
+def report(args, records: List[dict], wall: float, samples: Dict[tuple, float], rss, fake_stats: dict) -> dict:
+    completed = [r for r in records if r["status"] == "completed"]
+    statuses = Counter(r["status"] for r in records)
+    errors = Counter(r["error"] for r in records if r["error"])
+
+    def value(name: str) -> float:
+        return sum(v for (metric, _), v in samples.items() if metric == name)
+
+    return {
+        "label": args.label,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "jobs": args.jobs, "clients": args.clients, "pages": args.pages, "image_size": args.image_size,
+            "workers": args.workers, "env": dict(args.env),
+            "fakes": {k: v for k, v in vars(config_from_args(args)).items() if k != "stats"},
+        },
+        "wall_s": round(wall, 3),
+        "throughput_jobs_per_min": round(len(completed) / wall * 60, 2) if wall else None,
+        "statuses": dict(statuses),
+        "errors": dict(errors.most_common(10)),
+        "job_latency_s": summarize([r["latency_s"] for r in completed]),
+        "first_audio_s": summarize([r["first_audio_s"] for r in completed if "first_audio_s" in r]),
+        "upload_s": summarize([r["upload_s"] for r in records if "upload_s" in r]),
+        "stages_s": histograms(samples, "saarlm_stage_duration_seconds", "stage"),
+        "stage_wait_s": histograms(samples, "saarlm_stage_wait_seconds", "stage"),
+        "queue_wait_s": histograms(samples, "saarlm_queue_wait_seconds").get("all"),
+        "gemini_request_s": histograms(samples, "saarlm_gemini_request_seconds", "stage"),
+        "event_loop": {
+            "stalls": int(value("saarlm_loop_stalls_total")),
+            "stall_s_total": round(value("saarlm_loop_stall_seconds_total"), 3),
+            "max_stall_s": max([v for (m, _), v in samples.items() if m == "saarlm_loop_max_stall_seconds"], default=0),
+        },
+        "peak_rss_mb": rss,
+        "fake_backends": fake_stats,
+        "log_records_dropped": int(value("saarlm_log_records_dropped_total")),
+        "jobs_detail": records,
+    }
+
+
+def print_report(result: dict):
+    def line(name, stats):
+        if stats and stats.get("count"):
+            print(f"  {name:<22} n={stats['count']:<5} p50={stats['p50']}  p95={stats['p95']}"
+                  + (f"  p99={stats['p99']}" if "p99" in stats else "") + f"  mean={stats['mean']}")
+
+    print(f"\nWall {result['wall_s']}s - {result['throughput_jobs_per_min']} jobs/min - {result['statuses']}")
+    if result["errors"]:
+        print(f"Errors: {result['errors']}")
+    line("job latency (s)", result["job_latency_s"])
+    line("first audio (s)", result["first_audio_s"])
+    line("upload (s)", result["upload_s"])
+    for stage, stats in result["stages_s"].items():
+        line(f"stage {stage}", stats)
+    for stage, stats in result["stage_wait_s"].items():
+        line(f"wait {stage}", stats)
+    line("queue wait", result["queue_wait_s"])
+    for stage, stats in result["gemini_request_s"].items():
+        line(f"gemini {stage}", stats)
+    loop = result["event_loop"]
+    print(f"Event loop: {loop['stalls']} stalls, {loop['stall_s_total']}s total, max {loop['max_stall_s']}s")
+    print(f"Peak RSS (MB): {result['peak_rss_mb'] or 'n/a (no /proc)'}")
+
+
+def parse_env(pairs: List[str]) -> List[tuple]:
+    env = []
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--env expects KEY=VALUE, got {pair!r}")
+        env.append((key, value))
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=40, help="uploads in total")
+    parser.add_argument("--clients", type=int, default=10, help="concurrent clients")
+    parser.add_argument("--pages", type=int, default=1, help="photos per upload")
+    parser.add_argument("--image-size", default="1600x1200", help="photo size WxH")
+    parser.add_argument("--poll", type=float, default=0.5, help="status poll interval in seconds")
+    parser.add_argument("--job-timeout", type=float, default=600)
+    parser.add_argument("--workers", type=int, default=0, help="run jobs on N worker processes (queue mode)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app setting")
+    parser.add_argument("--label", default="", help="free-form tag stored with the results")
+    parser.add_argument("--out", help="results JSON (default benchmarks/results/load-<time>.json)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory (logs, outputs)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.env = parse_env(args.env)
+
+    fakes = FakeBackends(config_from_args(args)).start()
+    scratch = tempfile.mkdtemp(prefix="saarlm-bench-")
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": "bench",
+        "GEMINI_BASE_URL": fakes.gemini_base_url,
+        "TTS_BASE_URL": fakes.tts_base_url,
+        "GEMINI_RPM": "100000",
+        "GEMINI_TPM": "1000000000",
+        "PYTHONUNBUFFERED": "1",
+    })
+    metrics_urls = [f"http://127.0.0.1:{port}/metrics"]
+    if args.workers:
+        metrics_base = free_port_range(args.workers)
+        env.update({"EXECUTION_MODE": "queue", "WORKER_PROCESSES": str(args.workers),
+                    "WORKER_METRICS_PORT": str(metrics_base)})
+        metrics_urls += [f"http://127.0.0.1:{metrics_base + i}/metrics" for i in range(args.workers)]
+    env.update(dict(args.env))
+
+    print(f"Scratch dir {scratch}; fakes on {fakes.tts_base_url}; app on :{port}")
+    processes = {}
+    logs = []
+    try:
+        # Relative data dirs (uploads/, outputs/, cache/, data/) land in the scratch dir
+        app_log = open(os.path.join(scratch, "app.log"), "w")
+        logs.append(app_log)
+        processes["api"] = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--host", "127.0.0.1",
+             "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            cwd=scratch, env=env, stdout=app_log, stderr=subprocess.STDOUT,
+        )
+        wait_http(f"http://127.0.0.1:{port}/", 60, processes["api"])
+        if args.workers:
+            worker_log = open(os.path.join(scratch, "worker.log"), "w")
+            logs.append(worker_log)
+            processes["workers"] = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "worker.py")],
+                                                    cwd=scratch, env=env, stdout=worker_log, stderr=subprocess.STDOUT)
+            for url in metrics_urls[1:]:
+                wait_http(url, 60, processes["workers"])
+
+        base = base_page(args.image_size)
+        sampler = RssSampler({name: p.pid for name, p in processes.items()}).start()
+        print(f"Running {args.jobs} jobs with {args.clients} clients...")
+        records, wall = asyncio.run(drive(f"http://127.0.0.1:{port}", args, base))
+        rss = sampler.stop()
+
+        samples = scrape(metrics_urls)
+        result = report(args, records, wall, samples, rss, dict(fakes.config.stats))
+    finally:
+        for name in ("workers", "api"):
+            if name in processes:
+                stop_process(processes[name], signal.SIGTERM if name == "workers" else signal.SIGINT)
+        for f in logs:
+            f.close()
+        fakes.stop()
+
+    print_report(result)
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {out}")
+
+    if args.keep:
+        print(f"Scratch dir kept: {scratch}")
+    else:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
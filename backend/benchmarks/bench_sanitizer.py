@@ -0,0 +1,120 @@
+"""
+Sanitizer benchmark - combined single-pass matcher vs the old chain of re.sub passes
+Run from the backend directory:
+
+    python benchmarks/bench_sanitizer.py [--mb 5] [--chunk 64] [--repeat 3]
+
+Also checks that streamed output (fixed-size chunks) equals whole-script output.
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sanitizer import Sanitizer, SanitizeReport  # noqa: E402
+
+LINES = [
+    "DIDI: Toh aaj hum baat karenge Newton ke laws ke baare mein!",
+    "BHAIYA: Haan didi, pehla law kehta hai ki object rest mein rehta hai jab tak force na lage.",
+    "DIDI: Aur second law? F = ma, yaani force equals mass times acceleration.",
+    "BHAIYA: Exactly! Agar mass 2 kg hai aur acceleration 3 m/s^2, toh force 6 newton.",
+    "DIDI: Yeh concept board exam mein 5 marks ka aata hai.",
+    "BHAIYA: Chalo ek recap karte hain, three laws, teen simple ideas.",
+    "",
+]
+NOISE = [
+    "BHAIYA: Doubts ke liye call karo 9876543210 pe.",
+    "DIDI: WhatsApp group 98765 43210 join karo.",
+    "BHAIYA: Notes ke liye visit karo www.example-coaching.in/physics",
+    "DIDI: Mail karo teacher@example.com pe.",
+    "BHAIYA: Contact +91 9123456789 for batches.",
+    "DIDI: Video https://example.com/watch?v=abc123 dekho.",
+    "", "",
+]
+
+
+def legacy_filter(script: str) -> str:
+    """The inline filter this module replaced, kept here for comparison"""
+    script = re.sub(r'\b\d{10}\b', '', script)
+    script = re.sub(r'\b\d{5}[\s-]?\d{5}\b', '', script)
+    script = re.sub(r'\+91[\s-]?\d{10}', '', script)
+    script = re.sub(r'[Ww]hats[Aa]pp[^\n]*\d+[^\n]*', '', script)
+    script = re.sub(r'[Cc]ontact[^\n]*\d+[^\n]*', '', script)
+    script = re.sub(r'[Cc]all[^\n]*\d+[^\n]*', '', script)
+    script = re.sub(r'\b[\w.-]+@[\w.-]+\.\w+\b', '', script)
+    script = re.sub(r'https?://\S+', '', script)
+    script = re.sub(r'www\.\S+', '', script)
+    script = re.sub(r'\n\s*\n\s*\n', '\n\n', script)
+    return script
+
+
+def make_script(size: int, noise: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    lines, total = [], 0
+    while total < size:
+        line = rng.choice(NOISE) if rng.random() < noise else rng.choice(LINES)
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)
+
+
+def best_of(repeat: int, func, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def streamed(sanitizer: Sanitizer, text: str, chunk: int) -> str:
+    stream = sanitizer.stream(SanitizeReport())
+    out = [stream.feed(text[i:i + chunk]) for i in range(0, len(text), chunk)]
+    out.append(stream.close())
+    return "".join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=5.0, help="script size in MB")
+    parser.add_argument("--noise", type=float, default=0.05, help="share of lines carrying contact info")
+    parser.add_argument("--chunk", type=int, default=64, help="stream chunk size in chars")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_script(int(args.mb * 1024 * 1024), args.noise)
+    mb = len(text) / (1024 * 1024)
+    sanitizer = Sanitizer()
+
+    def report_run(t: str) -> str:
+        return sanitizer.sanitize(t, SanitizeReport())
+
+    rows = [
+        ("legacy (10 passes)", *best_of(args.repeat, legacy_filter, text)),
+        ("combined", *best_of(args.repeat, sanitizer.sanitize, text)),
+        ("combined + report", *best_of(args.repeat, report_run, text)),
+        (f"streamed ({args.chunk}-char chunks)", *best_of(args.repeat, streamed, sanitizer, text, args.chunk)),
+    ]
+
+    print(f"Script: {mb:.1f} MB, {text.count(chr(10)) + 1} lines, noise {args.noise:.0%}")
+    for name, seconds, _ in rows:
+        print(f"  {name:<28} {seconds * 1000:9.1f} ms  {mb / seconds:8.1f} MB/s")
+
+    report = SanitizeReport()
+    whole = sanitizer.sanitize(text, report)
+    print(f"Removed: {report.summary()}")
+    print(f"Streamed output identical: {rows[3][2] == whole}")
+    legacy = rows[0][2]
+    if legacy != whole:
+        # One pass matches the leftmost rule, so e.g. "call 98765 43210" now drops the
+        # whole line instead of leaving "call " behind
+        print(f"Differs from legacy output by {abs(len(legacy) - len(whole))} chars (stricter on mixed lines)")
+
+
+if __name__ == "__main__":
+    main()
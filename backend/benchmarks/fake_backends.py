@@ -0,0 +1,246 @@
+"""
+Fake backends - local stand-ins for Gemini and the Translate TTS endpoint
+One FastAPI app serving both, with configurable latency and error rates, so
+the backend can be load-tested without quota or network. Point it there with
+
+    GEMINI_BASE_URL=http://127.0.0.1:<port>/v1beta/models
+    TTS_BASE_URL=http://127.0.0.1:<port>
+
+Run standalone from the backend directory (bench_load.py starts it itself):
+
+    python benchmarks/fake_backends.py [--port 9100] [--gemini-latency 1.5] [--gemini-errors 0.02]
+
+OCR answers echo a short digest of the image, and scripts carry it into every
+turn, so distinct uploads never hit the OCR, script or TTS caches.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass, field
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.mp3_frames import FrameFormat, silent_frame  # noqa: E402
+
+# gTTS output: MPEG-2 Layer III, 24 kHz mono, 32 kbps; 576 samples = 24 ms per frame
+_TTS_FRAME = silent_frame(FrameFormat(2, 24000, True), 32)
+_FRAME_MS = 24
+# Roughly how long speech takes per character
+_MS_PER_CHAR = 60
+
+_REF = re.compile(r"ref ([0-9a-f]{8})")
+_PAGES = re.compile(r"These (\d+) images")
+
+NOTES = (
+    "Newton's laws of motion. First law: a body stays at rest or in uniform motion unless a net force acts "
+    "on it. Second law: F = ma, force equals mass times acceleration. Third law: every action has an equal "
+    "and opposite reaction. Example: a 2 kg block accelerating at 3 m/s^2 needs a net force of 6 N. "
+)
+TURNS = [
+    ("DIDI", "Aaj hum {topic} ke baare mein baat karenge, yeh bahut important chapter hai."),
+    ("BHAIYA", "Haan didi, exam mein iske questions har saal aate hain, dhyan se suno."),
+    ("DIDI", "Pehla law kehta hai ki object apni state nahi badalta jab tak force na lage."),
+    ("BHAIYA", "Trick yaad rakho: inertia matlab aalas, object ko apni state pasand hai."),
+    ("DIDI", "Second law hai F equals m a, force barabar mass into acceleration."),
+    ("BHAIYA", "Numerical mein units check karna mat bhoolna, newton mein answer aayega."),
+]
+
+
+@dataclass
+class FakeConfig:
+    gemini_latency: float = 1.5   # seconds per generateContent call (mean)
+    gemini_jitter: float = 0.3    # +/- fraction of the latency
+    gemini_errors: float = 0.0    # share of calls answered with gemini_error_status
+    gemini_error_status: int = 503
+    stream_chunks: int = 20       # SSE chunks per streamed script (latency is spread over them)
+    script_turns: int = 12
+    tts_latency: float = 0.25     # seconds per TTS request (mean)
+    tts_jitter: float = 0.3
+    tts_errors: float = 0.0
+    seed: int = 7
+    stats: dict = field(default_factory=lambda: {"gemini": 0, "gemini_errors": 0, "tts": 0, "tts_errors": 0})
+
+
+def _delay(rng: random.Random, mean: float, jitter: float) -> float:
+    return max(0.0, mean * (1 + rng.uniform(-jitter, jitter)))
+
+
+def _prompt_and_images(payload: dict):
+    texts, images = [], []
+    for content in payload.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                texts.append(part["text"])
+            inline = part.get("inline_data") or part.get("inlineData")
+            if inline:
+                images.append(inline.get("data", ""))
+    return "\n".join(texts), images
+
+
+def _ocr_text(prompt: str, images: list) -> str:
+    pages = []
+    for data in images:
+        ref = hashlib.sha1(data.encode("ascii")).hexdigest()[:8]
+        pages.append(f"Physics notes, ref {ref}.\n{NOTES}")
+    if len(images) == 1 and not _PAGES.search(prompt):
+        return pages[0]
+    return "\n".join(f"=== PAGE {n} ===\n{text}" for n, text in enumerate(pages, 1))
+
+
+def _script_text(prompt: str, turns: int) -> str:
+    match = _REF.search(prompt)
+    ref = match.group(1) if match else "00000000"
+    lines = []
+    for i in range(turns):
+        speaker, line = TURNS[i % len(TURNS)]
+        # The ref makes every job's turns unique, like real scripts
+        lines.append(f"{speaker}: {line.format(topic='Newton ke laws')} (ref {ref}, {i + 1})")
+    return "\n\n".join(lines)
+
+
+def _tts_text(body: bytes) -> str:
+    try:
+        rpc = json.loads(parse_qs(body.decode("utf-8"))["f.req"][0])
+        return json.loads(rpc[0][0][1])[0]
+    except (KeyError, IndexError, ValueError):
+        return body.decode("utf-8", "replace")
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="SaarLM fake backends")
+    rng = random.Random(config.seed)
+
+    def gemini_error():
+        config.stats["gemini_errors"] += 1
+        return JSONResponse(status_code=config.gemini_error_status,
+                            content={"error": {"code": config.gemini_error_status, "message": "fake error"}})
+
+    @app.post("/v1beta/models/{call}")
+    async def gemini(call: str, request: Request):
+        _, _, method = call.partition(":")
+        payload = await request.json()
+        config.stats["gemini"] += 1
+        prompt, images = _prompt_and_images(payload)
+        text = _ocr_text(prompt, images) if images else _script_text(prompt, config.script_turns)
+        usage = {"totalTokenCount": len(prompt) // 4 + len(text) // 4 + 258 * len(images)}
+        latency = _delay(rng, config.gemini_latency, config.gemini_jitter)
+
+        if rng.random() < config.gemini_errors:
+            await asyncio.sleep(latency / 4)
+            return gemini_error()
+
+        if method == "streamGenerateContent":
+            async def events():
+                size = max(1, -(-len(text) // config.stream_chunks))
+                for i in range(0, len(text), size):
+                    await asyncio.sleep(latency / config.stream_chunks)
+                    chunk = {"candidates": [{"content": {"parts": [{"text": text[i:i + size]}]}}]}
+                    yield f"data: {json.dumps(chunk)}\r\n\r\n"
+                yield f"data: {json.dumps({'candidates': [], 'usageMetadata': usage})}\r\n\r\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(latency)
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}], "usageMetadata": usage}
+
+    @app.post("/_/TranslateWebserverUi/data/batchexecute")
+    async def tts(request: Request):
+        text = _tts_text(await request.body())
+        config.stats["tts"] += 1
+        await asyncio.sleep(_delay(rng, config.tts_latency, config.tts_jitter))
+        if rng.random() < config.tts_errors:
+            config.stats["tts_errors"] += 1
+            return PlainTextResponse("fake error", status_code=500)
+        frames = max(1, len(text) * _MS_PER_CHAR // _FRAME_MS)
+        audio = base64.b64encode(_TTS_FRAME * frames).decode("ascii")
+        return PlainTextResponse(')]}\'\n\n' + '[["wrb.fr","jQ1olc","[\\"' + audio + '\\"]",null,null,null,"generic"]]')
+
+    @app.get("/stats")
+    async def stats():
+        return config.stats
+
+    return app
+
+
+class FakeBackends:
+    """Serve the fakes from a background thread (own event loop), so they don't share the caller's loop"""
+
+    def __init__(self, config: FakeConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def gemini_base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1beta/models"
+
+    @property
+    def tts_base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0):
+        uv_config = uvicorn.Config(create_app(self.config), host=self.host, port=self.port,
+                                   log_level="warning", access_log=False, backlog=4096)
+        self._server = uvicorn.Server(uv_config)
+        self._thread = threading.Thread(target=self._server.run, name="fake-backends", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("fake backends did not start")
+            time.sleep(0.05)
+        if not self.port:
+            self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeConfig()
+    parser.add_argument("--gemini-latency", type=float, default=defaults.gemini_latency, help="seconds per Gemini call")
+    parser.add_argument("--gemini-errors", type=float, default=defaults.gemini_errors, help="share of Gemini calls that fail")
+    parser.add_argument("--gemini-error-status", type=int, default=defaults.gemini_error_status)
+    parser.add_argument("--script-turns", type=int, default=defaults.script_turns, help="dialogue turns per script")
+    parser.add_argument("--tts-latency", type=float, default=defaults.tts_latency, help="seconds per TTS request")
+    parser.add_argument("--tts-errors", type=float, default=defaults.tts_errors, help="share of TTS requests that fail")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args) -> FakeConfig:
+    return FakeConfig(gemini_latency=args.gemini_latency, gemini_errors=args.gemini_errors,
+                      gemini_error_status=args.gemini_error_status, script_turns=args.script_turns,
+                      tts_latency=args.tts_latency, tts_errors=args.tts_errors, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(f"GEMINI_BASE_URL=http://{args.host}:{args.port}/v1beta/models")
+    print(f"TTS_BASE_URL=http://{args.host}:{args.port}")
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
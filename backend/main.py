@@ -6,10 +6,13 @@ import os
 import sys
 import io
 import json
+import time
 import uuid
-import base64
+import shutil
 from datetime import datetime
-from typing import Optional
+import re
+from typing import List, Optional, Tuple
+from contextlib import asynccontextmanager, AsyncExitStack
 import asyncio
 
 # Fix Windows UTF-8 encoding FIRST
@@ -17,25 +20,119 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
-from fastapi import FastAPI, File, UploadFile, Form, BackgroundTasks, HTTPException
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-import httpx
 from dotenv import load_dotenv
 
 # Load environment variables FIRST
 load_dotenv()
 
+from services.logs import get_logger, job_context, preview
+
+log = get_logger("api")
+
 # Get API key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-print(f"\n{'='*60}")
-print(f"[STARTUP] SaarLM Backend Starting...")
-print(f"[STARTUP] API Key: {'LOADED - ' + GEMINI_API_KEY[:15] + '...' if GEMINI_API_KEY else 'MISSING!'}")
-print(f"{'='*60}\n")
+log.info("SaarLM backend starting", extra={"api_key_configured": bool(GEMINI_API_KEY)})
+
+from services.gemini_client import get_gemini_client, close_gemini_client, inline_parts_request_body, GeminiError
+from services.tts_transport import close_tts_transport
+from services import offload, metrics
+from services.metrics import STAGE_SECONDS, BYTES, ACTIVE_JOBS, JOBS, JOB_SECONDS
+from services.loop_monitor import loop_monitor, set_stage, clear_stage
+from services.audio_stream import (
+    STREAM_ENABLED, parts_dir_for, iter_stream, schedule_parts_removal, cancel_parts_removals,
+)
+from services.job_store import get_job_store, JOB_STALE_SECONDS
+from services.job_queue import EXECUTION_MODE, QueueFull, get_job_queue
+from services.stage_limits import stage_slot, stage_stats
+from services.library_index import get_library_index, InvalidQuery, DEFAULT_LIMIT
+from services.ingest import (
+    ingest_form, sha256_file, UploadTooLarge, UnsupportedUpload, MalformedUpload,
+    MAX_UPLOAD_TOTAL_BYTES, UPLOAD_FORM_OVERHEAD,
+)
+from services.cache import get_cache, cache_stats
+from services.ocr_service import ocr_cache_key
+from services.pdf_extract import extract_pdf
+from services.sanitizer import get_sanitizer, SanitizeReport
+from services.image_prep import prepare_image, describe as describe_prepared
+from services.script_generator import script_cache_key
+from services.script_sections import (
+    split_notes, cap_sections, plan_episodes, generate_sections, stream_sections, stitch, SCRIPT_PIPELINE,
+)
+
+# Job ids as generated by upload_file (series episodes add "-<n>"); anything else never reaches the filesystem
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{8}(-\d+)?")
+
+OCR_MODEL = "gemini-2.5-flash"
+SCRIPT_MODEL = "gemini-2.5-flash"
+
+# Bump OCR_PROMPT_VERSION whenever OCR_PROMPT changes so cached results are not reused
+OCR_PROMPT = "Extract ALL text from this image exactly as written. Include all headings, bullet points, formulas. Return ONLY the extracted text."
+OCR_PROMPT_VERSION = "v1"
+OCR_GENERATION_CONFIG = {"temperature": 0.1, "maxOutputTokens": 8192}
+# Multi-page uploads: several pages per request, text split back per page with the markers
+# (bump OCR_PROMPT_VERSION for changes here too - per-page results share the OCR cache)
+OCR_BATCH_PROMPT = (
+    "These {count} images are consecutive pages of the same notes. Extract ALL text from each image exactly "
+    "as written. Include all headings, bullet points, formulas. Before the text of each page write a line "
+    "'=== PAGE n ===' (n = 1 to {count}, in the order given). Return ONLY the markers and the extracted text."
+)
+OCR_BATCH_GENERATION_CONFIG = {"temperature": 0.1, "maxOutputTokens": 32768}
+OCR_BATCH_MAX_BYTES = int(float(os.getenv("OCR_BATCH_MAX_MB", 12)) * 1024 * 1024)
+OCR_BATCH_MAX_PAGES = int(os.getenv("OCR_BATCH_MAX_PAGES", 8))
+OCR_BATCH_CONCURRENCY = int(os.getenv("OCR_BATCH_CONCURRENCY", 3))
+_PAGE_MARKER = re.compile(r"^\s*=+\s*PAGE\s+\d+\s*=+\s*$", re.MULTILINE | re.IGNORECASE)
+
+# Bump SCRIPT_PROMPT_VERSION whenever the step-2 prompt template changes
+SCRIPT_PROMPT_VERSION = "v1"
+SCRIPT_GENERATION_CONFIG = {"temperature": 0.7, "maxOutputTokens": 8192}
+
+
+# Jobs process_file_direct is running in this process (the stale-job sweep leaves them alone)
+_running_jobs = set()
+
+
+async def _sweep_stale_jobs():
+    """Inline mode: fail jobs whose process died mid-way (restart, redeploy), which would
+    otherwise stay "processing" forever. Runs from startup on, as those jobs only go
+    stale JOB_STALE_SECONDS after their last write"""
+    while True:
+        try:
+            failed = await job_store.afail_stale(JOB_STALE_SECONDS, "Processing was interrupted - please upload again",
+                                                 alive=_running_jobs)
+            if failed:
+                log.warning("Stale jobs marked as failed", extra={"jobs": failed})
+        except Exception:
+            log.exception("Stale job sweep failed")
+        await asyncio.sleep(JOB_STALE_SECONDS / 4)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled Gemini client for every request/job in this process
+    get_gemini_client().start()
+    loop_monitor.start()
+    # Pick up metadata written (or removed) while the index was not running
+    added, removed = await library_index.areconcile(METADATA_DIR)
+    if added or removed:
+        log.info("Library index reconciled", extra={"added": added, "removed": removed})
+    # Queue mode re-runs interrupted jobs through the queue lease instead
+    sweeper = asyncio.create_task(_sweep_stale_jobs()) if EXECUTION_MODE == "inline" else None
+    yield
+    if sweeper is not None:
+        sweeper.cancel()
+    await cancel_parts_removals()
+    await loop_monitor.stop()
+    await close_gemini_client()
+    await close_tts_transport()
+    offload.shutdown()
+
 
 # Create FastAPI app
-app = FastAPI(title="SaarLM API", version="1.0.0")
+app = FastAPI(title="SaarLM API", version="1.0.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -46,6 +143,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse oversized uploads from Content-Length before the body is read.
+
+    Uploads without a length (chunked) are refused too; ingest_form still counts
+    the bytes actually received, so this is the cheap early answer, not the cap.
+    """
+    if request.method == "POST" and request.url.path.startswith("/api/upload"):
+        length = request.headers.get("content-length")
+        if not length or not length.isdigit():
+            return JSONResponse(status_code=411, content={"detail": "Content-Length required"})
+        if int(length) > MAX_UPLOAD_TOTAL_BYTES + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(status_code=413, content={"detail": "File too large"})
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def reject_uploads_when_queue_full(request: Request, call_next):
+    """Backpressure (queue mode): answer 503 before the multipart body is read and spooled"""
+    if EXECUTION_MODE == "queue" and request.method == "POST" and request.url.path.startswith("/api/upload"):
+        job_queue = get_job_queue()
+        queue_stats = await job_queue.astats()
+        if queue_stats["queued"] >= job_queue.max_depth:
+            busy = _queue_full(QueueFull(queue_stats["queued"]))
+            return JSONResponse(status_code=busy.status_code, content={"detail": busy.detail}, headers=busy.headers)
+    return await call_next(request)
+
+
 # Directories
 UPLOAD_DIR = "uploads"
 OUTPUT_DIR = "outputs"
@@ -54,8 +179,9 @@ METADATA_DIR = "metadata"
 for d in [UPLOAD_DIR, OUTPUT_DIR, METADATA_DIR]:
     os.makedirs(d, exist_ok=True)
 
-# Job storage
-jobs = {}
+# Job storage - shared across worker processes (SQLite by default)
+job_store = get_job_store()
+library_index = get_library_index()
 
 # Mount static files
 app.mount("/audio", StaticFiles(directory=OUTPUT_DIR), name="audio")
@@ -78,11 +204,9 @@ async def test_ocr():
         return {"error": "No API key"}
 
     try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}"
         payload = {"contents": [{"parts": [{"text": "Say hello"}]}]}
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=payload)
+        response = await get_gemini_client().generate(OCR_MODEL, payload, stage="test")
 
         return {"status": response.status_code, "works": response.status_code == 200}
     except Exception as e:
@@ -90,94 +214,92 @@ async def test_ocr():
 
 
 @app.post("/api/upload")
-async def upload_file(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    subject: str = Form("General"),
-    chapter: str = Form("Notes")
-):
-    """Upload file and start processing"""
-    print(f"\n{'='*60}")
-    print(f"[UPLOAD] New file: {file.filename}")
-    print(f"[UPLOAD] Subject: {subject}, Chapter: {chapter}")
-    print(f"{'='*60}")
+async def upload_file(request: Request, background_tasks: BackgroundTasks):
+    """Upload file(s) and start processing
+
+    Multipart form: one `file`, or several `files` (pages in order) for one combined
+    episode, plus optional `subject`, `chapter`, `fresh` and `series` fields.
+    `series=true` splits long notes into a multi-episode series.
+    """
+    # A full queue was already refused by reject_uploads_when_queue_full; aenqueue re-checks
+    job_queue = get_job_queue() if EXECUTION_MODE == "queue" else None
 
     # Generate job ID
     job_id = str(uuid.uuid4())[:8]
 
-    # Save file
-    ext = file.filename.split(".")[-1].lower()
-    file_path = os.path.join(UPLOAD_DIR, f"{job_id}.{ext}")
-
-    content = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(content)
-
-    print(f"[UPLOAD] Saved: {file_path} ({len(content)} bytes)")
+    # Save files - parsed off the request stream and written once, hashed and type-sniffed on the way
+    try:
+        with STAGE_SECONDS.time(stage="upload"):
+            form, saved = await ingest_form(request, UPLOAD_DIR, job_id)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedUpload as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except MalformedUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not saved:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+
+    subject = form.get("subject") or "General"
+    chapter = form.get("chapter") or "Notes"
+    fresh = _form_bool(form.get("fresh"))
+    series = _form_bool(form.get("series"))
+    log.info("Upload received", extra={"job_id": job_id, "files": len(saved), "subject": subject, "chapter": chapter})
+    for upload in saved:
+        BYTES.inc(upload.size, channel="upload", direction="in")
+        log.debug("Upload saved", extra={"job_id": job_id, "path": upload.path, "bytes": upload.size,
+                                           "mime_type": upload.mime_type})
+
+    upload = saved[0]
+    # Further pages as [path, sha256, mime_type] (JSON-friendly for the queue)
+    extra_pages = [[u.path, u.sha256, u.mime_type] for u in saved[1:]] or None
 
     # Initialize job
-    jobs[job_id] = {"status": "processing", "progress": 0, "stage": "upload"}
+    await job_store.aset(job_id, {"status": "processing", "progress": 0, "stage": "upload"})
+
+    if job_queue is not None:
+        # Queue mode: a worker.py process picks the job up
+        payload = {
+            "file_path": upload.path, "subject": subject, "chapter": chapter, "use_cache": not fresh,
+            "file_sha256": upload.sha256, "mime_type": upload.mime_type, "extra_pages": extra_pages,
+            "series": series,
+        }
+        try:
+            position = await job_queue.aenqueue(job_id, payload)
+        except QueueFull as e:
+            await job_store.aset(job_id, {"status": "error", "error": str(e)})
+            for saved_upload in saved:
+                await offload.remove(saved_upload.path)
+            raise _queue_full(e)
+        await job_store.aupdate(job_id, queue_position=position, message=f"Waiting in queue (position {position})")
+        return {"job_id": job_id, "status": "processing", "queue_position": position}
 
     # Start processing in background
-    background_tasks.add_task(process_file_direct, job_id, file_path, subject, chapter)
+    background_tasks.add_task(process_file_direct, job_id, upload.path, subject, chapter, not fresh,
+                              upload.sha256, upload.mime_type, extra_pages, series)
 
     return {"job_id": job_id, "status": "processing"}
 
 
-async def process_file_direct(job_id: str, file_path: str, subject: str, chapter: str):
-    """Process file - ALL IN ONE FUNCTION (no service classes)"""
-    try:
-        print(f"\n{'='*60}")
-        print(f"[PROCESS] Job {job_id} starting...")
-        print(f"[PROCESS] API Key: {GEMINI_API_KEY[:15] if GEMINI_API_KEY else 'MISSING'}...")
-        print(f"{'='*60}")
-
-        # ============ STEP 1: OCR ============
-        print(f"\n[STEP 1] OCR - Reading image...")
-        jobs[job_id] = {"status": "processing", "progress": 20, "stage": "ocr"}
-
-        with open(file_path, "rb") as f:
-            image_bytes = f.read()
-
-        image_b64 = base64.b64encode(image_bytes).decode("utf-8")
-
-        ext = file_path.split(".")[-1].lower()
-        mime_map = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
-        mime_type = mime_map.get(ext, "image/jpeg")
+def _form_bool(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
 
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}"
 
-        ocr_payload = {
-            "contents": [{
-                "parts": [
-                    {"text": "Extract ALL text from this image exactly as written. Include all headings, bullet points, formulas. Return ONLY the extracted text."},
-                    {"inline_data": {"mime_type": mime_type, "data": image_b64}}
-                ]
-            }],
-            "generationConfig": {"temperature": 0.1, "maxOutputTokens": 8192}
-        }
+def _check_job_id(job_id: str):
+    """For routes that build file paths from job_id: reject '..', slashes and anything else odd"""
+    if not JOB_ID_PATTERN.fullmatch(job_id):
+        raise HTTPException(status_code=404, detail="Not found")
 
-        print(f"[STEP 1] Calling Gemini Vision API...")
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=ocr_payload)
 
-        print(f"[STEP 1] Response: {response.status_code}")
+def _queue_full(e: QueueFull) -> HTTPException:
+    return HTTPException(status_code=503, detail="Server busy - too many podcasts in the queue, try again shortly",
+                         headers={"Retry-After": str(e.retry_after)})
 
-        if response.status_code != 200:
-            print(f"[STEP 1] ERROR: {response.text[:300]}")
-            jobs[job_id] = {"status": "error", "error": f"OCR failed: {response.status_code}"}
-            return
 
-        result = response.json()
-        extracted_text = result["candidates"][0]["content"]["parts"][0]["text"]
-        print(f"[STEP 1] SUCCESS! Extracted {len(extracted_text)} chars")
-        print(f"[STEP 1] Preview: {extracted_text[:200]}...")
-
-        # ============ STEP 2: SCRIPT GENERATION ============
-        print(f"\n[STEP 2] Generating podcast script...")
-        jobs[job_id] = {"status": "processing", "progress": 50, "stage": "script"}
-
-        script_prompt = f"""Create a Hinglish podcast script for Indian JEE/NEET students.
+def _script_prompt(subject: str, chapter: str, notes: str, part_brief: str = "") -> str:
+    """Step-2 prompt; `part_brief` (long notes only) tells Gemini which part of the episode this is"""
+    part_block = f"\nPART: {part_brief}\n" if part_brief else ""
+    return f"""Create a Hinglish podcast script for Indian JEE/NEET students.
 
 CHARACTERS:
 - DIDI: Female tutor, warm and encouraging
@@ -204,9 +326,9 @@ ONLY discuss the educational content from the notes. End with motivation like "K
 
 SUBJECT: {subject}
 CHAPTER: {chapter}
-
+{part_block}
 STUDY NOTES:
-{extracted_text[:3500]}
+{notes}
 
 FORMAT:
 DIDI: [dialogue]
@@ -214,169 +336,607 @@ BHAIYA: [dialogue]
 
 Generate the complete podcast script (educational content only, no contact info):"""
 
-        script_payload = {
-            "contents": [{"parts": [{"text": script_prompt}]}],
-            "generationConfig": {"temperature": 0.7, "maxOutputTokens": 8192}
-        }
-
-        print(f"[STEP 2] Calling Gemini API for script...")
-        async with httpx.AsyncClient(timeout=90.0) as client:
-            response = await client.post(url, json=script_payload)
-
-        print(f"[STEP 2] Response: {response.status_code}")
-
-        if response.status_code != 200:
-            print(f"[STEP 2] ERROR: {response.text[:300]}")
-            jobs[job_id] = {"status": "error", "error": f"Script failed: {response.status_code}"}
-            return
-
-        result = response.json()
-        script = result["candidates"][0]["content"]["parts"][0]["text"]
-        print(f"[STEP 2] Generated {len(script)} chars")
-
-        # ============ SAFETY FILTER ============
-        import re
-
-        # Remove phone numbers (Indian format)
-        script = re.sub(r'\b\d{10}\b', '', script)
-        script = re.sub(r'\b\d{5}[\s-]?\d{5}\b', '', script)
-        script = re.sub(r'\+91[\s-]?\d{10}', '', script)
-
-        # Remove WhatsApp references with numbers
-        script = re.sub(r'[Ww]hats[Aa]pp[^\n]*\d+[^\n]*', '', script)
-        script = re.sub(r'[Cc]ontact[^\n]*\d+[^\n]*', '', script)
-        script = re.sub(r'[Cc]all[^\n]*\d+[^\n]*', '', script)
-
-        # Remove email addresses
-        script = re.sub(r'\b[\w.-]+@[\w.-]+\.\w+\b', '', script)
-
-        # Remove URLs
-        script = re.sub(r'https?://\S+', '', script)
-        script = re.sub(r'www\.\S+', '', script)
 
-        # Clean up empty lines
-        script = re.sub(r'\n\s*\n\s*\n', '\n\n', script)
+def _guess_mime(path: str) -> str:
+    ext = path.split(".")[-1].lower()
+    mime_map = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp", "pdf": "application/pdf"}
+    return mime_map.get(ext, "image/jpeg")
+
+
+def _pack_batches(sizes: List[int]) -> List[List[int]]:
+    """Group page indexes, in order, into batches within the byte/page budget"""
+    batches, current, current_bytes = [], [], 0
+    for i, size in enumerate(sizes):
+        if current and (current_bytes + size > OCR_BATCH_MAX_BYTES or len(current) >= OCR_BATCH_MAX_PAGES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(i)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _ocr_batch(files: List[Tuple[str, bytes]]) -> Tuple[Optional[List[str]], Optional[str], bool]:
+    """One generateContent call for all (mime_type, data) pages; returns (per-page texts, error, split_ok)"""
+    count = len(files)
+    if count == 1:
+        body = await offload.run_io(inline_parts_request_body, OCR_PROMPT, files, OCR_GENERATION_CONFIG)
+    else:
+        body = await offload.run_io(inline_parts_request_body, OCR_BATCH_PROMPT.format(count=count),
+                                    files, OCR_BATCH_GENERATION_CONFIG)
+    del files
+
+    response = await get_gemini_client().generate(OCR_MODEL, stage="ocr" if count == 1 else "ocr_batch", body=body)
+
+    if response.status_code != 200:
+        log.error("Gemini OCR failed", extra={"pages": count, "status": response.status_code,
+                                              "error": response.text[:300]})
+        return None, f"OCR failed: {response.status_code}", False
+
+    result = response.json()
+    text = result["candidates"][0]["content"]["parts"][0]["text"]
+    if count == 1:
+        return [text], None, True
+
+    sections = _PAGE_MARKER.split(text)
+    if len(sections) == count + 1:
+        return [section.strip() for section in sections[1:]], None, True
+    # Markers missing or merged: keep the text, but it can't be cached per page
+    log.warning("Could not split OCR batch into pages - using it whole", extra={"pages": count})
+    return [text] + [""] * (count - 1), None, False
+
+
+async def _ocr_pages(job_id: str, pages: List[Tuple[str, Optional[str], Optional[str]]],
+                     prep_stats: dict) -> Tuple[Optional[str], Optional[str]]:
+    """OCR pages in order; cached pages are skipped, the rest go out in parallel batches.
+
+    Returns (combined text, error message). Image bytes before/after preprocessing
+    are added to `prep_stats` ("original" / "sent"), PDF pages past the page cap to "pages_dropped".
+    """
+    pages = [
+        (path, sha or await offload.run_io(sha256_file, path), mime_type or _guess_mime(path))
+        for path, sha, mime_type in pages
+    ]
+    texts: List[Optional[str]] = [None] * len(pages)
+
+    # Content-addressed cache: a re-uploaded photo skips Gemini Vision
+    # (and, on a hit, the file is never even read back from disk)
+    ocr_cache = get_cache("ocr")
+    keys = [ocr_cache_key(sha, OCR_MODEL, OCR_PROMPT_VERSION) for _, sha, _ in pages]
+    if ocr_cache:
+        for i, key in enumerate(keys):
+            texts[i] = await ocr_cache.aget_text(key)
+
+    missing = [i for i, text in enumerate(texts) if text is None]
+    if len(missing) < len(pages):
+        log.info("OCR cache hit", extra={"hits": len(pages) - len(missing), "pages": len(pages)})
+
+    # PDFs go through the page-level pipeline; images are batched into multi-part requests
+    pdfs = [i for i in missing if pages[i][2] == "application/pdf"]
+    missing = [i for i in missing if i not in pdfs]
+
+    async def run_pdf(i: int):
+        path, sha, _ = pages[i]
+
+        async def on_pdf_progress(done: int, total: int):
+            await job_store.aupdate(job_id, pages_done=done, pages_total=total,
+                                    progress=20 + int(25 * done / total))
+
+        result = await _ocr_pdf(path, sha, on_pdf_progress if len(pages) == 1 else None)
+        if not result.text.strip():
+            return i, None, "No text found in PDF"
+        # Pages past PDF_MAX_PAGES: reported with the episode; the partial text isn't cached as the whole file's
+        prep_stats["pages_dropped"] += result.dropped
+        if result.failed:
+            log.warning("PDF pages without text", extra={"failed_pages": [n + 1 for n in result.failed]})
+        elif ocr_cache and not result.dropped:
+            await ocr_cache.aset_text(keys[i], result.text)
+        return i, result.text, None
+
+    pdf_tasks = [asyncio.create_task(run_pdf(i)) for i in pdfs]
+    try:
+        error = await _ocr_images(job_id, pages, missing, texts, keys, ocr_cache, prep_stats)
+        for i, text, pdf_error in await asyncio.gather(*pdf_tasks):
+            error = error or pdf_error
+            texts[i] = text
+    finally:
+        for task in pdf_tasks:
+            task.cancel()
+    if error:
+        return None, error
+
+    return "\n\n".join(text for text in texts if text), None
+
+
+async def _ocr_pdf(path: str, file_sha256: str, on_progress=None):
+    """Text layer per page in the process pool; scanned pages OCR'd by Gemini as single-page PDFs"""
+
+    async def ocr_page(data: bytes) -> Tuple[str, bool]:
+        page_texts, error, _ = await _ocr_batch([("application/pdf", data)])
+        return (page_texts[0], True) if error is None else (error, False)
+
+    return await extract_pdf(
+        path,
+        ocr_page=ocr_page,
+        page_key=lambda index: ocr_cache_key(f"{file_sha256}#page{index}", OCR_MODEL, OCR_PROMPT_VERSION),
+        cache=get_cache("ocr"),
+        on_progress=on_progress,
+    )
 
-        print(f"[STEP 2] After safety filter: {len(script)} chars")
-        print(f"[STEP 2] Preview: {script[:200]}...")
 
-        # ============ STEP 3: TTS ============
-        print(f"\n[STEP 3] Generating audio...")
-        jobs[job_id] = {"status": "processing", "progress": 75, "stage": "tts"}
+async def _ocr_images(job_id: str, pages, missing: List[int], texts: List[Optional[str]], keys: List[str],
+                      ocr_cache, prep_stats: dict) -> Optional[str]:
+    """Batched OCR of the image pages in `missing`; fills `texts`, returns an error message on failure"""
+    if not missing:
+        return None
+
+    limit = asyncio.Semaphore(OCR_BATCH_CONCURRENCY)
+
+    async def load(i: int) -> Tuple[str, bytes]:
+        # Downscale/recompress first, so batches are packed by what is actually sent
+        path, _, mime_type = pages[i]
+        async with limit:
+            data = await offload.read_bytes(path)
+            prepared = await offload.run_io(prepare_image, data, mime_type)
+        del data
+        prep_stats["original"] += prepared.original_bytes
+        prep_stats["sent"] += len(prepared.data)
+        summary = describe_prepared(prepared)
+        if summary:
+            log.debug("Image preprocessed", extra={"page": i + 1, "summary": summary})
+        return prepared.mime_type, prepared.data
+
+    files = dict(zip(missing, await asyncio.gather(*(load(i) for i in missing))))
+    batches = [[missing[j] for j in batch] for batch in _pack_batches([len(files[i][1]) for i in missing])]
+    done = len(pages) - len(missing)
+
+    async def run(batch: List[int]):
+        nonlocal done
+        async with limit:
+            result = await _ocr_batch([files[i] for i in batch])
+        if result[1] is None and len(pages) > 1:
+            done += len(batch)
+            await job_store.aupdate(job_id, pages_done=done, pages_total=len(pages),
+                                    progress=20 + int(25 * done / len(pages)))
+        return result
+
+    results = await asyncio.gather(*(run(batch) for batch in batches))
+    files.clear()
+    for batch, (page_texts, error, split_ok) in zip(batches, results):
+        if error:
+            return error
+        for i, text in zip(batch, page_texts):
+            texts[i] = text
+            if ocr_cache and split_ok:
+                await ocr_cache.aset_text(keys[i], text)
+    return None
+
+
+async def process_file_direct(job_id: str, file_path: str, subject: str, chapter: str, use_cache: bool = True,
+                              file_sha256: Optional[str] = None, mime_type: Optional[str] = None,
+                              extra_pages: Optional[List[list]] = None, series: bool = False):
+    """Process file - ALL IN ONE FUNCTION (no service classes)
+
+    `use_cache=False` (upload with fresh=true) regenerates the script instead of reusing a cached one.
+    `file_sha256` / `mime_type` come from upload ingestion; computed here if missing.
+    `extra_pages` ([path, sha256, mime_type] each) are further pages OCR'd into the same episode.
+    `series=True` turns long notes into several episodes instead of one long one.
+    """
+    with job_context(job_id):
+        started = time.perf_counter()
+        outcome = "error"
+        ACTIVE_JOBS.inc()
+        _running_jobs.add(job_id)
+        try:
+            log.info("Job started", extra={"pages": 1 + len(extra_pages or []), "subject": subject, "chapter": chapter})
+
+            # ============ STEP 1: OCR ============
+            await job_store.aset(job_id, {"status": "processing", "progress": 20, "stage": "ocr"})
+            set_stage(job_id, "ocr")
+
+            pages = [(file_path, file_sha256, mime_type)] + [tuple(page) for page in (extra_pages or [])]
+            prep_stats = {"original": 0, "sent": 0, "pages_dropped": 0}
+            async with stage_slot("ocr"):
+                with STAGE_SECONDS.time(stage="ocr"):
+                    extracted_text, error = await _ocr_pages(job_id, pages, prep_stats)
+
+            if error:
+                await job_store.aset(job_id, {"status": "error", "error": error})
+                return
+
+            # Bytes the image preprocessing kept off the wire (0 on cache hits / PDFs)
+            image_bytes_saved = prep_stats["original"] - prep_stats["sent"]
+            if prep_stats["original"]:
+                await job_store.aupdate(job_id, image_bytes_original=prep_stats["original"],
+                                        image_bytes_sent=prep_stats["sent"], image_bytes_saved=image_bytes_saved)
+
+            log.info("OCR done", extra={"chars": len(extracted_text), "image_bytes_original": prep_stats["original"] or None,
+                                        "image_bytes_sent": prep_stats["sent"] or None, "preview": preview(extracted_text)})
+
+            # ============ STEP 2: SCRIPT GENERATION ============
+            await job_store.aset(job_id, {"status": "processing", "progress": 50, "stage": "script"})
+            set_stage(job_id, "script")
+
+            # Long notes: split into sections, dialogue per section in parallel, stitched in order
+            sections, sections_dropped = cap_sections(split_notes(extracted_text) or [extracted_text])
+            # Notes left out by the page/section caps - saved with the episode so the app can say so
+            omitted = {key: n for key, n in (("pages_dropped", prep_stats["pages_dropped"]),
+                                             ("sections_dropped", sections_dropped)) if n}
+            plan = plan_episodes(sections, series)
+            if len(sections) > 1:
+                log.info("Notes split", extra={"chars": len(extracted_text), "sections": len(sections),
+                                               "episodes": len(plan)})
+            script_cache = get_cache("script")
+            failures = []
+
+            async def write_section(notes: str, brief: str, index: int) -> Optional[str]:
+                script_key = script_cache_key(notes, subject, chapter, SCRIPT_MODEL, SCRIPT_PROMPT_VERSION,
+                                              SCRIPT_GENERATION_CONFIG, part=brief)
+                if script_cache and use_cache:
+                    cached = await script_cache.aget_text(script_key)
+                    if cached is not None:
+                        log.info("Script cache hit", extra={"section": index + 1, "chars": len(cached)})
+                        return cached
+
+                script_payload = {
+                    "contents": [{"parts": [{"text": _script_prompt(subject, chapter, notes, brief)}]}],
+                    "generationConfig": SCRIPT_GENERATION_CONFIG
+                }
+
+                async with stage_slot("script"):
+                    response = await get_gemini_client().generate(SCRIPT_MODEL, script_payload, stage="script")
+
+                if response.status_code != 200:
+                    log.error("Gemini script failed", extra={"section": index + 1, "status": response.status_code,
+                                                             "error": response.text[:300]})
+                    failures.append(response.status_code)
+                    return None
+
+                result = response.json()
+                section_script = result["candidates"][0]["content"]["parts"][0]["text"]
+                log.info("Section generated", extra={"section": index + 1, "chars": len(section_script)})
+                if script_cache:
+                    await script_cache.aset_text(script_key, section_script)
+                return section_script
+
+            async def stream_section(notes: str, brief: str, index: int):
+                """write_section for the pipelined mode: yields the dialogue as Gemini writes it"""
+                script_key = script_cache_key(notes, subject, chapter, SCRIPT_MODEL, SCRIPT_PROMPT_VERSION,
+                                              SCRIPT_GENERATION_CONFIG, part=brief)
+                if script_cache and use_cache:
+                    cached = await script_cache.aget_text(script_key)
+                    if cached is not None:
+                        log.info("Script cache hit", extra={"section": index + 1, "chars": len(cached)})
+                        yield cached
+                        return
+
+                script_payload = {
+                    "contents": [{"parts": [{"text": _script_prompt(subject, chapter, notes, brief)}]}],
+                    "generationConfig": SCRIPT_GENERATION_CONFIG
+                }
+
+                chunks = []
+                async with stage_slot("script"):
+                    async for chunk in get_gemini_client().stream_generate(SCRIPT_MODEL, script_payload, stage="script"):
+                        chunks.append(chunk)
+                        yield chunk
+
+                section_script = "".join(chunks)
+                log.info("Section generated", extra={"section": index + 1, "chars": len(section_script)})
+                if script_cache:
+                    await script_cache.aset_text(script_key, section_script)
+
+            async def on_section_progress(done: int, total: int):
+                if total > 1:
+                    await job_store.aupdate(job_id, sections_done=done, sections_total=total,
+                                            progress=50 + int(20 * done / total))
+
+            from services.tts_service import TTSService, TurnParser, TTS_MODE
+            tts = TTSService()
+            safety = SanitizeReport()
+
+            # Pipelined: one episode streamed from Gemini through the safety filter into
+            # TTS turn by turn, so recording starts while the script is still being written
+            pipelined = SCRIPT_PIPELINE and TTS_MODE == "concurrent" and len(plan) == 1
+            streamed = []
+
+            async def start_recording(tts_slot: AsyncExitStack):
+                # The TTS slot is taken only once there is a turn to synthesize, so jobs still
+                # waiting on Gemini neither hold TTS slots nor count against the TTS limit
+                await tts_slot.enter_async_context(stage_slot("tts"))
+                log.info("First turn ready - recording while the script is written")
+                await job_store.aupdate(job_id, stage="tts", progress=75)
+                set_stage(job_id, "tts")
+
+            async def script_turns(tts_slot: AsyncExitStack):
+                cleaned = get_sanitizer().stream(safety)
+                parser = TurnParser()
+                turns = 0
+                script_started, filter_seconds = time.perf_counter(), 0.0
+                async for chunk in stream_sections(plan[0], stream_section, on_progress=on_section_progress):
+                    filter_started = time.perf_counter()
+                    text = cleaned.feed(chunk)
+                    filter_seconds += time.perf_counter() - filter_started
+                    streamed.append(text)
+                    for turn in parser.feed(text):
+                        if turns == 0:
+                            await start_recording(tts_slot)
+                        turns += 1
+                        yield turn
+                text = cleaned.close()
+                streamed.append(text)
+                # Script and filter time overlap TTS here; filter time is summed over chunks
+                STAGE_SECONDS.observe(time.perf_counter() - script_started, stage="script")
+                STAGE_SECONDS.observe(filter_seconds, stage="safety_filter")
+                rest = parser.feed(text) + parser.close()
+                if turns == 0 and not rest:
+                    rest = [("DIDI", "".join(streamed))]
+                for turn in rest:
+                    if turns == 0:
+                        await start_recording(tts_slot)
+                    turns += 1
+                    yield turn
+
+            if pipelined:
+                # Filled in once the stream has finished
+                scripts = [None]
+            else:
+                with STAGE_SECONDS.time(stage="script"):
+                    results = await generate_sections(plan, write_section, on_progress=on_section_progress)
+                if failures:
+                    await job_store.aset(job_id, {"status": "error", "error": f"Script failed: {failures[0]}"})
+                    return
+
+                # ============ SAFETY FILTER ============
+                with STAGE_SECONDS.time(stage="safety_filter"):
+                    scripts = [get_sanitizer().sanitize(stitch(parts), safety) for parts in results]
+
+                log.info("Script ready", extra={"chars": sum(len(s) for s in scripts),
+                                                "safety_removed": safety.counts() or None,
+                                                "preview": preview(scripts[0])})
+
+                # ============ STEP 3: TTS ============
+                await job_store.aset(job_id, {"status": "processing", "progress": 75, "stage": "tts"})
+                set_stage(job_id, "tts")
+
+            count = len(scripts)
+            episodes = []
+            for number, script in enumerate(scripts, 1):
+                # A series is saved as one library entry per episode: <job_id>-1, <job_id>-2, ...
+                episode_id = job_id if count == 1 else f"{job_id}-{number}"
+                title = f"{subject} - {chapter}" if count == 1 else f"{subject} - {chapter} (Part {number} of {count})"
+                audio_filename = f"{episode_id}.mp3"
+                audio_path = os.path.join(OUTPUT_DIR, audio_filename)
+
+                # Progressive delivery: segments are published as they finish and
+                # /api/status exposes stream_url as soon as the first one is playable
+                parts_dir = parts_dir_for(job_id) if STREAM_ENABLED and number == 1 else None
+
+                async def on_tts_progress(done: int, ready: int, total: int, number=number, parts_dir=parts_dir):
+                    fields = {
+                        "progress": 75 + int(20 * (number - 1 + done / total) / count),
+                        "segments_done": done,
+                        "segments_ready": ready,
+                        "segments_total": total,
+                    }
+                    if count > 1:
+                        fields["episode"] = number
+                    if parts_dir and ready > 0:
+                        fields["stream_url"] = f"/api/stream/{job_id}.mp3"
+                    await job_store.aupdate(job_id, **fields)
+
+                if pipelined:
+                    # Holds the TTS slot from the first turn (start_recording) until the episode is recorded
+                    async with AsyncExitStack() as tts_slot:
+                        try:
+                            duration = await tts.generate_audio_stream(script_turns(tts_slot), audio_path,
+                                                                       parts_dir=parts_dir, on_progress=on_tts_progress)
+                        except GeminiError as e:
+                            log.error("Gemini script stream failed", extra={"status": e.status_code})
+                            await job_store.aset(job_id, {"status": "error", "error": f"Script failed: {e.status_code}"})
+                            return
+                    script = "".join(streamed)
+                    log.info("Script ready", extra={"chars": len(script), "safety_removed": safety.counts() or None,
+                                                    "preview": preview(script)})
+                else:
+                    async with stage_slot("tts"):
+                        duration = await tts.generate_audio(script, audio_path, parts_dir=parts_dir, on_progress=on_tts_progress)
+                log.info("Audio ready", extra={"episode": episode_id, "duration": duration})
+
+                # ============ STEP 4: SAVE METADATA ============
+                metadata = {
+                    "job_id": episode_id,
+                    "title": title,
+                    "subject": subject,
+                    "chapter": chapter,
+                    "duration": duration,
+                    "audio_file": audio_filename,
+                    "script": script,
+                    "extracted_text": extracted_text[:1000],
+                    "created_at": datetime.now().isoformat(),
+                    **omitted,
+                }
+
+                metadata_path = os.path.join(METADATA_DIR, f"{episode_id}.json")
+                await offload.write_json(metadata_path, metadata)
+                await library_index.aupsert(metadata)
+                episodes.append(metadata)
+
+            # ============ COMPLETE ============
+            log.info("Job completed", extra={"episodes": count, "seconds": round(time.perf_counter() - started, 2)})
+
+            first = episodes[0]
+            status = {
+                "status": "completed",
+                "progress": 100,
+                "stage": "done",
+                "image_bytes_saved": image_bytes_saved,
+                "safety_removed": safety.counts(),
+                **omitted,
+                "audio_url": f"/audio/{first['audio_file']}",
+                "duration": first["duration"],
+                "script": first["script"],
+                "metadata": {k: v for k, v in first.items() if k not in ("script", "extracted_text")}
+            }
+            if count > 1:
+                status["episodes"] = [
+                    {"job_id": e["job_id"], "title": e["title"], "duration": e["duration"], "audio_url": f"/audio/{e['audio_file']}"}
+                    for e in episodes
+                ]
+            await job_store.aset(job_id, status)
+            outcome = "completed"
 
-        from services.tts_service import TTSService
-        tts = TTSService()
+        except Exception as e:
+            log.exception("Job failed")
+            await job_store.aset(job_id, {"status": "error", "error": str(e)})
 
-        audio_filename = f"{job_id}.mp3"
-        audio_path = os.path.join(OUTPUT_DIR, audio_filename)
+        finally:
+            if STREAM_ENABLED:
+                # Whether the job completed or failed; a no-op if nothing was published
+                schedule_parts_removal(parts_dir_for(job_id))
+            clear_stage(job_id)
+            _running_jobs.discard(job_id)
+            ACTIVE_JOBS.dec()
+            JOBS.inc(status=outcome)
+            JOB_SECONDS.observe(time.perf_counter() - started, status=outcome)
 
-        duration = await tts.generate_audio(script, audio_path)
-        print(f"[STEP 3] SUCCESS! Audio duration: {duration}s")
 
-        # ============ STEP 4: SAVE METADATA ============
-        print(f"\n[STEP 4] Saving metadata...")
+@app.get("/api/status/{job_id}")
+async def get_status(job_id: str):
+    """Get job status"""
+    job = await job_store.aget(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-        metadata = {
-            "job_id": job_id,
-            "title": f"{subject} - {chapter}",
-            "subject": subject,
-            "chapter": chapter,
-            "duration": duration,
-            "audio_file": audio_filename,
-            "script": script,
-            "extracted_text": extracted_text[:1000],
-            "created_at": datetime.now().isoformat()
-        }
 
-        metadata_path = os.path.join(METADATA_DIR, f"{job_id}.json")
-        with open(metadata_path, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-
-        # ============ COMPLETE ============
-        print(f"\n{'='*60}")
-        print(f"[COMPLETE] Job {job_id} finished successfully!")
-        print(f"{'='*60}\n")
-
-        jobs[job_id] = {
-            "status": "completed",
-            "progress": 100,
-            "stage": "done",
-            "audio_url": f"/audio/{audio_filename}",
-            "duration": duration,
-            "script": script,
-            "metadata": {
-                "job_id": job_id,
-                "title": f"{subject} - {chapter}",
-                "subject": subject,
-                "chapter": chapter,
-                "duration": duration,
-                "audio_file": audio_filename,
-                "created_at": datetime.now().isoformat()
-            }
-        }
+@app.get("/api/events/{job_id}")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of the job record: one `progress` event per change
+    (stage transitions, every finished TTS segment), closed once the job completes or fails.
+    /api/status stays available for clients that cannot use SSE.
+    """
+    if await job_store.aget(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    except Exception as e:
-        print(f"\n[ERROR] Job {job_id} failed: {e}")
-        import traceback
-        traceback.print_exc()
-        jobs[job_id] = {"status": "error", "error": str(e)}
+    async def event_stream():
+        async for job in job_store.watch(job_id):
+            if job is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
-@app.get("/api/status/{job_id}")
-async def get_status(job_id: str):
-    """Get job status"""
-    if job_id not in jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
-    return jobs[job_id]
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters and sizes for the result caches"""
+    return cache_stats()
 
 
 @app.get("/api/library")
-async def get_library():
-    """Get all podcasts"""
-    podcasts = []
-    for filename in os.listdir(METADATA_DIR):
-        if filename.endswith(".json"):
-            try:
-                with open(os.path.join(METADATA_DIR, filename), "r", encoding="utf-8") as f:
-                    podcasts.append(json.load(f))
-            except Exception as e:
-                print(f"[LIBRARY] Error loading {filename}: {e}")
-                continue
-
-    podcasts.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return {"podcasts": podcasts, "total": len(podcasts)}
+async def get_library(
+    limit: int = DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    subject: Optional[str] = None,
+    chapter: Optional[str] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get one page of podcasts
+
+    `sort` is created_at / title / duration, "-" prefix for descending (default -created_at).
+    `fields` is a comma-separated projection; scripts are only returned when asked for ("*" = all).
+    Pass the returned `next_cursor` back as `cursor` for the next page.
+    """
+    try:
+        return await library_index.aquery(limit=limit, cursor=cursor, subject=subject, chapter=chapter,
+                                          sort=sort, fields=fields)
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.get("/api/podcast/{job_id}")
 async def get_podcast(job_id: str):
     """Get single podcast"""
+    _check_job_id(job_id)
     metadata_path = os.path.join(METADATA_DIR, f"{job_id}.json")
-    if not os.path.exists(metadata_path):
+    try:
+        return await offload.read_json(metadata_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Podcast not found")
 
-    with open(metadata_path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
 
 @app.delete("/api/podcast/{job_id}")
 async def delete_podcast(job_id: str):
     """Delete podcast"""
+    _check_job_id(job_id)
     metadata_path = os.path.join(METADATA_DIR, f"{job_id}.json")
     audio_path = os.path.join(OUTPUT_DIR, f"{job_id}.mp3")
 
-    if os.path.exists(metadata_path):
-        os.remove(metadata_path)
-    if os.path.exists(audio_path):
-        os.remove(audio_path)
+    await library_index.adelete(job_id)
+    await offload.remove(metadata_path)
+    await offload.remove(audio_path)
+    await offload.run_io(shutil.rmtree, parts_dir_for(job_id), True)
 
     return {"status": "deleted"}
 
 
+@app.get("/api/queue")
+async def get_queue_stats():
+    """Queue depth/age (queue mode) and this process's per-stage concurrency slots"""
+    stats = await get_job_queue().astats() if EXECUTION_MODE == "queue" else {"mode": EXECUTION_MODE}
+    stats["stages"] = stage_stats()
+    return stats
+
+
+@app.get("/api/gemini/stats")
+async def get_gemini_stats():
+    """Outbound rate limiter: quota settings, queue waits, retries and 429s"""
+    return get_gemini_client().limiter.stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint (this process only - scrape each web/worker process)"""
+    return PlainTextResponse(await offload.run_io(metrics.render), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/debug/loop")
+async def get_loop_stats():
+    """Event-loop stall history (duration, active job stages, blocking code location)"""
+    return loop_monitor.stats()
+
+
+@app.get("/api/stream/{job_id}.mp3")
+async def stream_audio(job_id: str):
+    """Chunked MP3 of the episode while it is still being recorded"""
+    _check_job_id(job_id)
+    parts_dir = parts_dir_for(job_id)
+    if not await offload.run_io(os.path.exists, os.path.join(parts_dir, "manifest.json")):
+        raise HTTPException(status_code=404, detail="Stream not available")
+
+    from services.tts_service import PAUSE_MS
+    return StreamingResponse(
+        iter_stream(parts_dir, pause_ms=PAUSE_MS),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
 @app.get("/api/download/{job_id}")
 async def download_audio(job_id: str):
     """Download audio file"""
+    _check_job_id(job_id)
     audio_path = os.path.join(OUTPUT_DIR, f"{job_id}.mp3")
-    if not os.path.exists(audio_path):
+    if not await offload.run_io(os.path.exists, audio_path):
         raise HTTPException(status_code=404, detail="Audio not found")
 
     return FileResponse(
@@ -389,4 +949,5 @@ async def download_audio(job_id: str):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Job state lives in the job store, so several workers can serve status polls
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=int(os.getenv("WEB_CONCURRENCY", 1)))
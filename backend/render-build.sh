@@ -10,5 +10,6 @@ pip install -r requirements.txt
 echo "Installing ffmpeg for audio processing..."
 apt-get update
 apt-get install -y ffmpeg
+# Offline TTS engine (TTS_ENGINE=espeak): apt-get install -y espeak-ng
 
 echo "Build complete!"
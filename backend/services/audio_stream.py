@@ -0,0 +1,203 @@
+"""
+Audio Stream - progressive delivery of TTS segments while a job is still running
+SegmentPublisher (TTS side) drops finished segments into a per-job parts dir;
+iter_stream (API side) turns that growing dir into one chunked MP3 stream
+"""
+
+import os
+import io
+import json
+import shutil
+import asyncio
+from typing import Awaitable, Callable, Optional, Set
+
+from dotenv import load_dotenv
+
+from .mp3_frames import Mp3StreamWriter, probe_format
+from .offload import run_io, read_bytes, read_json
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("stream")
+
+STREAM_ENABLED = os.getenv("STREAM_ENABLED", "1") == "1"
+STREAM_DIR = os.getenv("STREAM_DIR", "streams")
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", 0.25))
+STREAM_IDLE_TIMEOUT = float(os.getenv("STREAM_IDLE_TIMEOUT", 120))
+# Parts are kept this long after the job finishes so in-flight listeners can finish
+STREAM_PARTS_TTL = float(os.getenv("STREAM_PARTS_TTL", 600))
+
+ProgressCallback = Callable[[int, int, int], Awaitable[None]]
+
+
+def parts_dir_for(job_id: str) -> str:
+    parts_dir = os.path.join(STREAM_DIR, job_id)
+    # Callers validate job_id; this just makes sure nothing outside STREAM_DIR is ever touched
+    root = os.path.realpath(STREAM_DIR)
+    if os.path.dirname(os.path.realpath(parts_dir)) != root:
+        raise ValueError(f"Invalid job id {job_id!r}")
+    return parts_dir
+
+
+def _publish_file(src: Optional[str], parts_dir: str, index: int):
+    if src is None:
+        open(os.path.join(parts_dir, f"{index:04d}.skip"), "w").close()
+        return
+    # Copy then rename so readers never see a half-written part
+    tmp = os.path.join(parts_dir, f"{index:04d}.tmp")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, os.path.join(parts_dir, f"{index:04d}.mp3"))
+
+
+def _write_manifest(parts_dir: str, total: Optional[int]):
+    # Rewritten by seal() while listeners may be reading it: replace, never truncate
+    tmp = os.path.join(parts_dir, "manifest.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"total": total}, f)
+    os.replace(tmp, os.path.join(parts_dir, "manifest.json"))
+
+
+def _mark_done(parts_dir: str):
+    open(os.path.join(parts_dir, "done"), "w").close()
+
+
+class SegmentPublisher:
+    """Tracks finished segments (in any order) and reports progress in script order.
+
+    `total` None = segments are still being discovered (pipelined script): add()
+    one per segment, then seal() to record the final count for listeners.
+    """
+
+    def __init__(self, total: Optional[int], parts_dir: Optional[str] = None, on_progress: Optional[ProgressCallback] = None):
+        self.total = total
+        self.parts_dir = parts_dir
+        self.on_progress = on_progress
+        self._done = set()
+        self._ready = 0
+        self._count = total or 0
+
+    async def start(self):
+        if self.parts_dir:
+            await run_io(os.makedirs, self.parts_dir, exist_ok=True)
+            await run_io(_write_manifest, self.parts_dir, self.total)
+
+    def add(self):
+        self._count += 1
+
+    async def seal(self):
+        self.total = self._count
+        if self.parts_dir:
+            await run_io(_write_manifest, self.parts_dir, self.total)
+
+    async def publish(self, index: int, segment_path: Optional[str]):
+        """`segment_path` None = segment failed; listeners skip it instead of waiting"""
+        if self.parts_dir:
+            await run_io(_publish_file, segment_path, self.parts_dir, index)
+
+        self._done.add(index)
+        while self._ready in self._done:
+            self._ready += 1
+
+        if self.on_progress:
+            await self.on_progress(len(self._done), self._ready, self._count)
+
+    async def finish(self):
+        if self.total is None:
+            # Never sealed (the script stream failed): record the count so listeners can end
+            await self.seal()
+        if self.parts_dir:
+            await run_io(_mark_done, self.parts_dir)
+
+
+def _part_state(parts_dir: str, index: int) -> Optional[str]:
+    base = os.path.join(parts_dir, f"{index:04d}")
+    if os.path.exists(base + ".mp3"):
+        return "mp3"
+    if os.path.exists(base + ".skip"):
+        return "skip"
+    if os.path.exists(os.path.join(parts_dir, "done")):
+        # Check once more - the part may have landed right before `done`
+        return "mp3" if os.path.exists(base + ".mp3") else "skip"
+    return None
+
+
+async def iter_stream(parts_dir: str, pause_ms: int = 500):
+    """Yield one continuous MP3 stream: parts in order, silent frames between them"""
+    manifest = os.path.join(parts_dir, "manifest.json")
+    # None while the script is still streaming in; set just before `done`
+    total = (await read_json(manifest))["total"]
+
+    buf = io.BytesIO()
+    writer = None
+    index = 0
+    idle = 0.0
+
+    while total is None or index < total:
+        state = await run_io(_part_state, parts_dir, index)
+        if state == "skip" and total is None:
+            total = (await read_json(manifest))["total"]
+            if total is None:
+                if await run_io(os.path.exists, os.path.join(parts_dir, "done")):
+                    # Finished without a count (older publisher): nothing more is coming
+                    return
+                # A failed segment; don't race through the indexes while the count is unknown
+                await asyncio.sleep(pause_ms / 1000)
+            elif index >= total:
+                break
+        if state is None:
+            if idle >= STREAM_IDLE_TIMEOUT:
+                log.warning("Gave up waiting for part", extra={"parts_dir": parts_dir, "part": index})
+                return
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+            idle += STREAM_POLL_INTERVAL
+            continue
+
+        idle = 0.0
+        if state == "mp3":
+            data = await read_bytes(os.path.join(parts_dir, f"{index:04d}.mp3"))
+            if writer is None:
+                header = probe_format(data)
+                if header is not None:
+                    # No Xing header: length is unknown while streaming
+                    writer = Mp3StreamWriter(buf, header.format, header.bitrate, xing=False)
+            if writer is not None:
+                if writer.frames > 0:
+                    writer.write_silence(pause_ms)
+                writer.write_segment(data)
+                chunk = buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+                if chunk:
+                    yield chunk
+        index += 1
+
+
+# Pending removals - referenced here so they aren't garbage-collected while they sleep
+_removals: Set[asyncio.Task] = set()
+
+
+async def remove_parts_later(parts_dir: str, delay: float = STREAM_PARTS_TTL):
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        # Shutting down: nobody will be listening after this, so don't leave the dir behind
+        await run_io(shutil.rmtree, parts_dir, True)
+        raise
+    await run_io(shutil.rmtree, parts_dir, True)
+
+
+def schedule_parts_removal(parts_dir: str, delay: float = STREAM_PARTS_TTL):
+    """Remove `parts_dir` once in-flight listeners have had `delay` seconds to finish"""
+    task = asyncio.create_task(remove_parts_later(parts_dir, delay))
+    _removals.add(task)
+    task.add_done_callback(_removals.discard)
+
+
+async def cancel_parts_removals():
+    """Shutdown: remove every parts dir still waiting for its TTL now"""
+    tasks = list(_removals)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
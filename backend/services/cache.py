@@ -0,0 +1,235 @@
+"""
+Disk Cache - small persistent key/value store for expensive pipeline results
+SQLite-backed, LRU + size-bounded eviction, optional TTL, hit/miss counters
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from .offload import run_io
+from .metrics import register_collector, sample
+
+# Load environment variables
+load_dotenv()
+
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+# Writes between full recounts + TTL sweeps (other processes write to the same files)
+CACHE_RECOUNT_EVERY = int(os.getenv("CACHE_RECOUNT_EVERY", 100))
+# Eviction frees down to this fraction of the bounds, so a full cache doesn't evict on every write
+CACHE_EVICT_TO = float(os.getenv("CACHE_EVICT_TO", 0.9))
+
+
+def make_key(*parts) -> str:
+    """SHA-256 over the given parts (bytes or str), unambiguously separated"""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(str(len(part)).encode("ascii") + b":")
+        h.update(part)
+    return h.hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so cosmetic OCR differences map to the same key"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def config_fingerprint(config: dict) -> str:
+    return json.dumps(config, sort_keys=True, separators=(",", ":"))
+
+
+class DiskCache:
+    def __init__(self, name: str, max_bytes: int, max_entries: int = 0, ttl: float = 0, directory: str = CACHE_DIR):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.db")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        # Running totals, so a write only costs a full scan every CACHE_RECOUNT_EVERY writes
+        self._writes = 0
+        self._recount()
+
+    def _recount(self):
+        self._count, self._bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+    def _size_of(self, key: str) -> Optional[int]:
+        row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _forget(self, size: Optional[int]):
+        if size is not None:
+            self._count -= 1
+            self._bytes -= size
+
+    def _over(self, count: int, total: int, fraction: float = 1.0) -> bool:
+        return bool((self.max_bytes and total > self.max_bytes * fraction)
+                    or (self.max_entries and count > self.max_entries * fraction))
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                self._forget(self._size_of(key))
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes):
+        if self.max_bytes and len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._forget(self._size_of(key))
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), now, now),
+            )
+            self._count += 1
+            self._bytes += len(value)
+            self._writes += 1
+            if self._writes >= CACHE_RECOUNT_EVERY or self._over(self._count, self._bytes):
+                self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._forget(self._size_of(key))
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def get_text(self, key: str) -> Optional[str]:
+        value = self.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set_text(self, key: str, text: str):
+        self.set(key, text.encode("utf-8"))
+
+    # Async variants - sqlite I/O runs on the offload io pool, never on the event loop
+    async def aget(self, key: str) -> Optional[bytes]:
+        return await run_io(self.get, key)
+
+    async def aset(self, key: str, value: bytes):
+        await run_io(self.set, key, value)
+
+    async def aget_text(self, key: str) -> Optional[str]:
+        return await run_io(self.get_text, key)
+
+    async def aset_text(self, key: str, text: str):
+        await run_io(self.set_text, key, text)
+
+    def _evict(self):
+        """Drop expired entries, recount, then least-recently-used ones until under CACHE_EVICT_TO of the bounds"""
+        self._writes = 0
+        if self.ttl:
+            cur = self._db.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+            self.evictions += max(cur.rowcount, 0)
+
+        self._recount()
+        if not self._over(self._count, self._bytes):
+            return
+
+        count, total = self._count, self._bytes
+        removed = []
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+            if not self._over(count, total, CACHE_EVICT_TO):
+                break
+            removed.append((key,))
+            total -= size
+            count -= 1
+        self._db.executemany("DELETE FROM entries WHERE key = ?", removed)
+        self.evictions += len(removed)
+        self._count, self._bytes = count, total
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._recount()
+            count, total = self._count, self._bytes
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+# Named caches, configured from env: <NAME>_CACHE_MAX_MB, <NAME>_CACHE_MAX_ENTRIES, <NAME>_CACHE_TTL
+CACHE_DEFAULTS = {
+    "ocr": {"max_mb": 50, "ttl": 0},
+    "script": {"max_mb": 20, "max_entries": 2000, "ttl": 7 * 24 * 3600},
+    "tts": {"max_mb": 200, "ttl": 0},
+}
+
+_caches: Dict[str, DiskCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str) -> Optional[DiskCache]:
+    """Return the shared cache called `name`, or None when caching is disabled"""
+    if os.getenv("CACHE_ENABLED", "1") != "1":
+        return None
+    with _caches_lock:
+        if name not in _caches:
+            defaults = CACHE_DEFAULTS.get(name, {})
+            prefix = name.upper()
+            max_mb = float(os.getenv(f"{prefix}_CACHE_MAX_MB", defaults.get("max_mb", 50)))
+            _caches[name] = DiskCache(
+                name,
+                max_bytes=int(max_mb * 1024 * 1024),
+                max_entries=int(os.getenv(f"{prefix}_CACHE_MAX_ENTRIES", defaults.get("max_entries", 0))),
+                ttl=float(os.getenv(f"{prefix}_CACHE_TTL", defaults.get("ttl", 0))),
+            )
+        return _caches[name]
+
+
+def cache_stats() -> dict:
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def _collect_metrics():
+    lines = ["# TYPE saarlm_cache_hits_total counter", "# TYPE saarlm_cache_misses_total counter",
+             "# TYPE saarlm_cache_entries gauge", "# TYPE saarlm_cache_bytes gauge"]
+    for name, stats in cache_stats().items():
+        lines.append(sample("saarlm_cache_hits_total", stats["hits"], cache=name))
+        lines.append(sample("saarlm_cache_misses_total", stats["misses"], cache=name))
+        lines.append(sample("saarlm_cache_entries", stats["entries"], cache=name))
+        lines.append(sample("saarlm_cache_bytes", stats["bytes"], cache=name))
+    return lines
+
+
+register_collector(_collect_metrics)
@@ -0,0 +1,247 @@
+"""
+Gemini Client - one pooled httpx.AsyncClient shared by the whole app
+Created/closed in the FastAPI lifespan, reused by every Gemini call site
+"""
+
+import os
+import json
+import time
+import base64
+import asyncio
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from .rate_limiter import (
+    GeminiRateLimiter, GEMINI_MAX_RETRIES, RETRYABLE_STATUS, RETRYABLE_ERRORS,
+    estimate_tokens, usage_tokens, retry_after, backoff,
+)
+from .metrics import GEMINI_RESPONSES, GEMINI_SECONDS, BYTES
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("gemini")
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+
+# Per-stage read timeouts (seconds) - same values the call sites used before
+STAGE_TIMEOUTS = {
+    "test": float(os.getenv("GEMINI_TIMEOUT_TEST", 30)),
+    "ocr": float(os.getenv("GEMINI_TIMEOUT_OCR", 60)),
+    "script": float(os.getenv("GEMINI_TIMEOUT_SCRIPT", 90)),
+    # Several pages in one request take proportionally longer
+    "ocr_batch": float(os.getenv("GEMINI_TIMEOUT_OCR_BATCH", 180)),
+}
+DEFAULT_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT_DEFAULT", 60))
+CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", 10))
+
+
+def inline_request_body(prompt: str, mime_type: str, data: bytes, generation_config: dict) -> bytes:
+    """generateContent JSON for prompt + one inline file, built straight from bytes.
+
+    Equivalent to json= with a base64 str payload, minus the extra str/JSON
+    copies of the (large) encoded file. Blocking - call through run_io.
+    """
+    return inline_parts_request_body(prompt, [(mime_type, data)], generation_config)
+
+
+def inline_parts_request_body(prompt: str, files: List[Tuple[str, bytes]], generation_config: dict) -> bytes:
+    """Same as inline_request_body, with one inline_data part per (mime_type, data) in `files`"""
+    chunks = [('{"contents":[{"parts":[{"text":' + json.dumps(prompt) + '}').encode("utf-8")]
+    for mime_type, data in files:
+        chunks.append((',{"inline_data":{"mime_type":' + json.dumps(mime_type) + ',"data":"').encode("utf-8"))
+        chunks.append(base64.b64encode(data))
+        chunks.append(b'"}}')
+    chunks.append((']}],"generationConfig":' + json.dumps(generation_config) + '}').encode("utf-8"))
+    return b"".join(chunks)
+
+
+class GeminiError(Exception):
+    """Non-200 response from a streaming call (generate() returns the response instead)"""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Gemini returned {status_code}: {text[:300]}")
+        self.status_code = status_code
+        self.text = text
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class GeminiClient:
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.max_connections = int(os.getenv("GEMINI_MAX_CONNECTIONS", 20))
+        self.max_keepalive = int(os.getenv("GEMINI_MAX_KEEPALIVE", 10))
+        self.keepalive_expiry = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", 60))
+        self.http2 = os.getenv("GEMINI_HTTP2", "0") == "1"
+        self._client: Optional[httpx.AsyncClient] = None
+        self.limiter = GeminiRateLimiter()
+
+    def url(self, model: str, method: str = "generateContent") -> str:
+        return f"{GEMINI_BASE_URL}/{model}:{method}?key={self.api_key}"
+
+    def timeout(self, stage: str) -> httpx.Timeout:
+        return httpx.Timeout(STAGE_TIMEOUTS.get(stage, DEFAULT_TIMEOUT), connect=CONNECT_TIMEOUT)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self.start()
+        return self._client
+
+    def start(self):
+        """Open the connection pool (idempotent)"""
+        if self._client is not None and not self._client.is_closed:
+            return
+
+        http2 = self.http2
+        if http2 and not _http2_available():
+            log.warning("HTTP/2 requested but 'h2' is not installed - using HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        self._client = httpx.AsyncClient(limits=limits, http2=http2, timeout=DEFAULT_TIMEOUT)
+        log.info("Client ready", extra={"max_connections": self.max_connections,
+                                         "keepalive": self.max_keepalive, "http2": http2})
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            log.info("Client closed")
+        self._client = None
+
+    @staticmethod
+    def _record(stage: str, status: int, started: float, sent: int, received: int):
+        GEMINI_RESPONSES.inc(stage=stage, status=status)
+        GEMINI_SECONDS.observe(time.perf_counter() - started, stage=stage)
+        BYTES.inc(sent, channel="gemini", direction="out")
+        BYTES.inc(received, channel="gemini", direction="in")
+
+    async def generate(self, model: str, payload: Optional[dict] = None, stage: str = "default",
+                       body: Optional[bytes] = None) -> httpx.Response:
+        """POST a generateContent request for `model` on the shared pool.
+
+        Pass either `payload` (dict) or a pre-serialized JSON `body`. Waits for
+        the outbound rate limiter, and retries 429/5xx and connection failures
+        with jittered exponential backoff (honouring Retry-After). The last
+        response is returned if retries run out, so callers see the real status.
+        """
+        tokens = estimate_tokens(payload, body)
+        attempt = 0
+        while True:
+            await self.limiter.acquire(tokens)
+            started = time.perf_counter()
+            try:
+                if body is not None:
+                    response = await self.client.post(self.url(model), content=body, timeout=self.timeout(stage),
+                                                      headers={"Content-Type": "application/json"})
+                else:
+                    response = await self.client.post(self.url(model), json=payload, timeout=self.timeout(stage))
+            except RETRYABLE_ERRORS as e:
+                GEMINI_RESPONSES.inc(stage=stage, status=type(e).__name__)
+                if attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                delay = backoff(attempt)
+                log.warning("Retrying", extra={"stage": stage, "error": type(e).__name__, "delay": round(delay, 1)})
+            else:
+                self._record(stage, response.status_code, started, len(response.request.content), len(response.content))
+                if response.status_code == 200:
+                    await self.limiter.settle(tokens, usage_tokens(response))
+                    return response
+                if response.status_code not in RETRYABLE_STATUS or attempt >= GEMINI_MAX_RETRIES:
+                    return response
+                requested = retry_after(response)
+                delay = requested if requested is not None else backoff(attempt)
+                if response.status_code == 429:
+                    # Quota exhausted for everyone, not just this call
+                    await self.limiter.pause(delay)
+                log.warning("Retrying", extra={"stage": stage, "status": response.status_code, "delay": round(delay, 1)})
+
+            attempt += 1
+            self.limiter.record_retry()
+            await asyncio.sleep(delay)
+
+    async def stream_generate(self, model: str, payload: dict, stage: str = "default") -> AsyncIterator[str]:
+        """streamGenerateContent (SSE): yield text deltas as Gemini writes them.
+
+        Same rate limiting and retries as generate(), but only until the first
+        delta arrives - after that a failure is raised, since the caller has
+        already used part of the output. Non-200 responses raise GeminiError.
+        """
+        tokens = estimate_tokens(payload)
+        url = self.url(model, "streamGenerateContent") + "&alt=sse"
+        attempt = 0
+        while True:
+            await self.limiter.acquire(tokens)
+            started = False
+            sent_at = time.perf_counter()
+            try:
+                async with self.client.stream("POST", url, json=payload, timeout=self.timeout(stage)) as response:
+                    if response.status_code == 200:
+                        usage = None
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            chunk = json.loads(line[5:])
+                            usage = chunk.get("usageMetadata", {}).get("totalTokenCount", usage)
+                            for candidate in chunk.get("candidates", [])[:1]:
+                                for part in candidate.get("content", {}).get("parts", []):
+                                    if part.get("text"):
+                                        started = True
+                                        yield part["text"]
+                        await self.limiter.settle(tokens, usage)
+                        self._record(stage, 200, sent_at, len(response.request.content), response.num_bytes_downloaded)
+                        return
+
+                    await response.aread()
+                    self._record(stage, response.status_code, sent_at, len(response.request.content), len(response.content))
+                    if response.status_code not in RETRYABLE_STATUS or attempt >= GEMINI_MAX_RETRIES:
+                        raise GeminiError(response.status_code, response.text)
+                    requested = retry_after(response)
+                    delay = requested if requested is not None else backoff(attempt)
+                    if response.status_code == 429:
+                        await self.limiter.pause(delay)
+                    log.warning("Retrying stream", extra={"stage": stage, "status": response.status_code,
+                                                         "delay": round(delay, 1)})
+            except RETRYABLE_ERRORS as e:
+                GEMINI_RESPONSES.inc(stage=stage, status=type(e).__name__)
+                if started or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                delay = backoff(attempt)
+                log.warning("Retrying stream", extra={"stage": stage, "error": type(e).__name__, "delay": round(delay, 1)})
+
+            attempt += 1
+            self.limiter.record_retry()
+            await asyncio.sleep(delay)
+
+
+# App-wide instance
+_gemini_client: Optional[GeminiClient] = None
+
+
+def get_gemini_client() -> GeminiClient:
+    """Return the shared client, creating it lazily for use outside the app lifespan"""
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = GeminiClient()
+    return _gemini_client
+
+
+async def close_gemini_client():
+    global _gemini_client
+    if _gemini_client is not None:
+        await _gemini_client.close()
+        _gemini_client = None
@@ -0,0 +1,122 @@
+"""
+Image Prep - shrink note photos before they are sent to Gemini Vision
+Downscales to an OCR-sufficient size, drops colour when the page is
+effectively monochrome, strips EXIF (after applying its rotation) and
+recompresses to a byte budget. Needs Pillow; without it images pass through.
+"""
+
+import io
+import os
+from collections import namedtuple
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("image")
+
+IMAGE_PREP_ENABLED = os.getenv("IMAGE_PREP_ENABLED", "1") == "1"
+# Longest side in pixels - plenty for printed/handwritten notes
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 2048))
+IMAGE_TARGET_BYTES = int(float(os.getenv("IMAGE_TARGET_KB", 600)) * 1024)
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 85))
+IMAGE_MIN_QUALITY = int(os.getenv("IMAGE_MIN_QUALITY", 50))
+# "auto" = grayscale when the page has almost no colour, "always", or "never"
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "auto")
+# Mean saturation (0-255) below which a page counts as monochrome
+_GRAYSCALE_SATURATION = 24
+
+PreparedImage = namedtuple("PreparedImage", ["data", "mime_type", "original_bytes", "width", "height", "grayscale"])
+
+_pillow_checked = False
+_pillow_ok = False
+
+
+def _pillow_available() -> bool:
+    global _pillow_checked, _pillow_ok
+    if not _pillow_checked:
+        _pillow_checked = True
+        try:
+            import PIL  # noqa: F401
+            _pillow_ok = True
+        except ImportError:
+            log.warning("Pillow is not installed - images are sent to OCR unprocessed")
+    return _pillow_ok
+
+
+def _is_monochrome(img) -> bool:
+    from PIL import ImageStat
+    sample = img.convert("RGB")
+    sample.thumbnail((128, 128))
+    saturation = ImageStat.Stat(sample.convert("HSV").getchannel("S")).mean[0]
+    return saturation < _GRAYSCALE_SATURATION
+
+
+def _encode(img, quality: int) -> bytes:
+    buf = io.BytesIO()
+    # No exif= argument: the output carries no EXIF/GPS metadata
+    img.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def prepare_image(data: bytes, mime_type: str) -> PreparedImage:
+    """Blocking (Pillow releases the GIL while decoding/resampling/encoding) - call through run_io"""
+    unchanged = PreparedImage(data, mime_type, len(data), None, None, False)
+    if not IMAGE_PREP_ENABLED or not mime_type.startswith("image/") or not _pillow_available():
+        return unchanged
+
+    from PIL import Image, ImageOps
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        # JPEG: let the decoder downscale by 1/2, 1/4, 1/8 while decoding
+        img.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        had_exif = bool(img.info.get("exif"))
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white paper
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+
+        grayscale = img.mode == "L"
+        if not grayscale and (IMAGE_GRAYSCALE == "always" or (IMAGE_GRAYSCALE == "auto" and _is_monochrome(img))):
+            img = img.convert("L")
+            grayscale = True
+
+        # Lower the quality first, then the resolution, until the budget is met
+        quality = IMAGE_QUALITY
+        out = _encode(img, quality)
+        while len(out) > IMAGE_TARGET_BYTES:
+            if quality > IMAGE_MIN_QUALITY:
+                quality = max(IMAGE_MIN_QUALITY, quality - 10)
+            elif max(img.size) > 1024:
+                img = img.resize((int(img.width * 0.8), int(img.height * 0.8)), Image.LANCZOS)
+            else:
+                break
+            out = _encode(img, quality)
+    except Exception as e:
+        log.warning("Could not preprocess image", extra={"mime_type": mime_type, "error": str(e)})
+        return unchanged
+
+    if len(out) >= len(data) and not had_exif:
+        # Already small and clean - keep the original
+        return unchanged
+    return PreparedImage(out, "image/jpeg", len(data), img.width, img.height, grayscale)
+
+
+def describe(prepared: PreparedImage) -> Optional[str]:
+    if prepared.width is None:
+        return None
+    saved = prepared.original_bytes - len(prepared.data)
+    return (f"{prepared.original_bytes // 1024} KB -> {len(prepared.data) // 1024} KB "
+            f"({prepared.width}x{prepared.height}{', grayscale' if prepared.grayscale else ''}, saved {saved // 1024} KB)")
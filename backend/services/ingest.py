@@ -0,0 +1,246 @@
+"""
+Ingest - streaming, size-capped upload ingestion
+The multipart body is parsed straight off the request stream and each file is
+written once, in chunks, to its final place; SHA-256 and the sniffed MIME type
+are computed on the way, so nothing ever holds (or spools) the whole file
+"""
+
+import os
+import hashlib
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from dotenv import load_dotenv
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from .offload import run_io, remove
+
+# Load environment variables
+load_dotenv()
+
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", 20))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+# Multi-page uploads: at most this many files, and this much in total
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", 10))
+MAX_UPLOAD_TOTAL_BYTES = int(float(os.getenv("MAX_UPLOAD_TOTAL_MB", 60)) * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+# Room for multipart boundaries, part headers and the form fields on top of the files
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Sniffed MIME type -> extension we store the upload under
+SUPPORTED_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "application/pdf": "pdf",
+}
+
+IngestedFile = namedtuple("IngestedFile", ["path", "size", "sha256", "mime_type", "ext"])
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UnsupportedUpload(Exception):
+    pass
+
+
+class MalformedUpload(Exception):
+    pass
+
+
+def sniff_mime(head: bytes) -> Optional[str]:
+    """Identify the upload from its magic bytes, ignoring the client's filename/content-type"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    return None
+
+
+def sha256_file(path: str) -> str:
+    """Chunked SHA-256 of a file on disk - blocking, call through run_io"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _write_chunk(fh, hasher, chunk: bytes):
+    # hashlib releases the GIL for large buffers, so both run truly off-loop
+    hasher.update(chunk)
+    fh.write(chunk)
+
+
+def _too_large(max_bytes: int) -> UploadTooLarge:
+    return UploadTooLarge(f"File is larger than {max_bytes // (1024 * 1024)} MB")
+
+
+class _FileSink:
+    """One uploaded file on its way to `<tmp_path>`: sniffed, hashed and size-capped as it is written"""
+
+    def __init__(self, tmp_path: str, max_bytes: int):
+        self.tmp_path = tmp_path
+        self.max_bytes = max_bytes
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.mime_type = None
+        self._head = b""
+        self._fh = None
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise _too_large(self.max_bytes)
+        if self.mime_type is None:
+            # Magic bytes may straddle parser callbacks: sniff once 16 bytes are in
+            self._head += data
+            if len(self._head) < 16:
+                return
+            await self._sniff()
+            data, self._head = self._head, b""
+        await run_io(_write_chunk, self._fh, self.hasher, data)
+
+    async def _sniff(self):
+        self.mime_type = sniff_mime(self._head[:16])
+        if self.mime_type is None:
+            raise UnsupportedUpload("Unsupported file type - upload a JPG, PNG, WEBP or PDF")
+        self._fh = await run_io(open, self.tmp_path, "wb")
+
+    async def finish(self, path_base: str) -> IngestedFile:
+        if self.size == 0:
+            raise UnsupportedUpload("Empty file")
+        if self.mime_type is None:
+            await self._sniff()
+            await run_io(_write_chunk, self._fh, self.hasher, self._head)
+        await self.close()
+        ext = SUPPORTED_TYPES[self.mime_type]
+        path = f"{path_base}.{ext}"
+        await run_io(os.replace, self.tmp_path, path)
+        return IngestedFile(path, self.size, self.hasher.hexdigest(), self.mime_type, ext)
+
+    async def close(self):
+        if self._fh is not None:
+            await run_io(self._fh.close)
+            self._fh = None
+
+    async def discard(self):
+        await self.close()
+        await remove(self.tmp_path)
+
+
+def _form_events(boundary: bytes):
+    """python-multipart parser whose callbacks queue (kind, value) events for async handling"""
+    events = []
+    header = {"field": b"", "value": b"", "headers": {}}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        header["headers"][header["field"].lower()] = header["value"]
+        header["field"], header["value"] = b"", b""
+
+    def on_headers_finished():
+        events.append(("headers", header["headers"]))
+        header["headers"] = {}
+
+    callbacks = {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    }
+    return MultipartParser(boundary, callbacks), events
+
+
+async def ingest_form(request: Request, dest_dir: str, name: str, file_fields: Tuple[str, ...] = ("file", "files"),
+                      max_bytes: int = MAX_UPLOAD_BYTES, max_total_bytes: int = MAX_UPLOAD_TOTAL_BYTES,
+                      max_files: int = MAX_UPLOAD_FILES) -> Tuple[Dict[str, str], List[IngestedFile]]:
+    """Read a multipart upload off the request stream: (form fields, files saved in order).
+
+    Files land in `dest_dir` as `<name>.<ext>` (one file) or `<name>-01.<ext>`, ...
+    Caps are enforced on the bytes actually received, so a missing or wrong
+    Content-Length doesn't get past them. Raises UploadTooLarge / UnsupportedUpload /
+    MalformedUpload; nothing is left on disk when it does.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise MalformedUpload("Expected a multipart/form-data upload")
+
+    parser, events = _form_events(boundary)
+    fields: Dict[str, str] = {}
+    sinks: List[_FileSink] = []
+    saved: List[IngestedFile] = []
+    received = 0
+    part = None  # ("field", name, [chunks]) or ("file", sink)
+
+    async def handle():
+        nonlocal part
+        for kind, value in events:
+            if kind == "headers":
+                _, options = parse_options_header(value.get(b"content-disposition", b""))
+                field = options.get(b"name", b"").decode("utf-8", "replace")
+                # An empty filename is a file input left blank: treated as no file
+                if options.get(b"filename") and field in file_fields:
+                    if len(sinks) >= max_files:
+                        raise UploadTooLarge(f"Too many files (max {max_files})")
+                    remaining = max_total_bytes - sum(sink.size for sink in sinks)
+                    sink = _FileSink(os.path.join(dest_dir, f"{name}-{len(sinks) + 1:02d}.part"),
+                                     min(max_bytes, remaining))
+                    sinks.append(sink)
+                    part = ("file", sink)
+                else:
+                    part = ("field", field, [])
+            elif kind == "data" and part is not None:
+                if part[0] == "file":
+                    await part[1].write(value)
+                else:
+                    part[2].append(value)
+            elif kind == "end" and part is not None:
+                if part[0] == "field":
+                    fields[part[1]] = b"".join(part[2]).decode("utf-8", "replace")
+                part = None
+        events.clear()
+
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_total_bytes + UPLOAD_FORM_OVERHEAD:
+                raise _too_large(max_total_bytes)
+            try:
+                parser.write(chunk)
+            except Exception as e:
+                raise MalformedUpload(f"Malformed upload: {e}")
+            await handle()
+        parser.finalize()
+        await handle()
+
+        single = len(sinks) == 1
+        for i, sink in enumerate(sinks):
+            saved.append(await sink.finish(os.path.join(dest_dir, name if single else f"{name}-{i + 1:02d}")))
+    except BaseException:
+        for sink in sinks:
+            await sink.discard()
+        for upload in saved:
+            await remove(upload.path)
+        raise
+
+    return fields, saved
@@ -0,0 +1,186 @@
+"""
+Job Queue - durable SQLite work queue between the API and the worker pool
+Lives in the job store database, so no external broker is needed. Workers
+claim jobs with a lease; a job whose worker dies is handed out again once its
+lease runs out (up to QUEUE_MAX_ATTEMPTS).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .offload import run_io
+from .job_store import JOB_DB_PATH
+from .metrics import QUEUE_WAIT_SECONDS, register_collector, sample
+
+# Load environment variables
+load_dotenv()
+
+# "inline" = run jobs inside the web process (BackgroundTasks), "queue" = hand them to worker.py
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "inline")
+QUEUE_MAX_DEPTH = int(os.getenv("QUEUE_MAX_DEPTH", 100))
+QUEUE_RETRY_AFTER = int(os.getenv("QUEUE_RETRY_AFTER", 30))
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", 120))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 3))
+
+
+class QueueFull(Exception):
+    def __init__(self, depth: int, retry_after: int = QUEUE_RETRY_AFTER):
+        super().__init__(f"Job queue is full ({depth} waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """enqueue/claim/... are blocking; use the a* variants from async code"""
+
+    def __init__(self, path: str = JOB_DB_PATH, max_depth: int = QUEUE_MAX_DEPTH):
+        self.path = path
+        self.max_depth = max_depth
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS queue ("
+            " job_id TEXT PRIMARY KEY, payload TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'queued',"
+            " attempts INTEGER NOT NULL DEFAULT 0, enqueued_at REAL NOT NULL,"
+            " lease_until REAL, worker TEXT, error TEXT)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_queue_state ON queue (state, enqueued_at)")
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread: sqlite connections must not be shared across threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            self._local.db = db
+        return db
+
+    def enqueue(self, job_id: str, payload: dict) -> int:
+        """Add a job; returns its position (1 = next). Raises QueueFull past max_depth"""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            depth = db.execute("SELECT COUNT(*) FROM queue WHERE state = 'queued'").fetchone()[0]
+            if depth >= self.max_depth:
+                db.execute("ROLLBACK")
+                raise QueueFull(depth)
+            db.execute(
+                "INSERT INTO queue (job_id, payload, enqueued_at) VALUES (?, ?, ?)",
+                (job_id, json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+            db.execute("COMMIT")
+            return depth + 1
+        except QueueFull:
+            raise
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def claim(self, worker: str, lease: float = QUEUE_LEASE_SECONDS) -> Optional[Tuple[str, dict, int]]:
+        """Take the oldest runnable job (queued, or running with an expired lease).
+
+        Returns (job_id, payload, attempt) or None when there is nothing to do.
+        """
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT job_id, payload, attempts, enqueued_at FROM queue"
+                " WHERE state = 'queued' OR (state = 'running' AND lease_until < ?)"
+                " ORDER BY enqueued_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            job_id, payload, attempts, enqueued_at = row
+            db.execute(
+                "UPDATE queue SET state = 'running', attempts = attempts + 1, lease_until = ?, worker = ?"
+                " WHERE job_id = ?",
+                (now + lease, worker, job_id),
+            )
+            db.execute("COMMIT")
+            if attempts == 0:
+                QUEUE_WAIT_SECONDS.observe(now - enqueued_at)
+            return job_id, json.loads(payload), attempts + 1
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def extend(self, job_id: str, worker: str, lease: float = QUEUE_LEASE_SECONDS):
+        """Heartbeat: keep the lease while the job is still being worked on"""
+        self._db().execute(
+            "UPDATE queue SET lease_until = ? WHERE job_id = ? AND worker = ? AND state = 'running'",
+            (time.time() + lease, job_id, worker),
+        )
+
+    def finish(self, job_id: str, error: Optional[str] = None):
+        """Remove a finished job; failed ones are kept (state 'failed') for inspection"""
+        if error is None:
+            self._db().execute("DELETE FROM queue WHERE job_id = ?", (job_id,))
+        else:
+            self._db().execute("UPDATE queue SET state = 'failed', error = ? WHERE job_id = ?", (error, job_id))
+
+    def stats(self) -> dict:
+        rows = self._db().execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall()
+        counts = {state: count for state, count in rows}
+        oldest = self._db().execute("SELECT MIN(enqueued_at) FROM queue WHERE state = 'queued'").fetchone()[0]
+        return {
+            "mode": EXECUTION_MODE,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "failed": counts.get("failed", 0),
+            "max_depth": self.max_depth,
+            "oldest_wait_seconds": round(time.time() - oldest, 1) if oldest else 0,
+        }
+
+    async def aenqueue(self, job_id: str, payload: dict) -> int:
+        return await run_io(self.enqueue, job_id, payload)
+
+    async def aclaim(self, worker: str, lease: float = QUEUE_LEASE_SECONDS) -> Optional[Tuple[str, dict, int]]:
+        return await run_io(self.claim, worker, lease)
+
+    async def aextend(self, job_id: str, worker: str, lease: float = QUEUE_LEASE_SECONDS):
+        await run_io(self.extend, job_id, worker, lease)
+
+    async def afinish(self, job_id: str, error: Optional[str] = None):
+        await run_io(self.finish, job_id, error)
+
+    async def astats(self) -> dict:
+        return await run_io(self.stats)
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+        register_collector(_collect_metrics)
+    return _job_queue
+
+
+def _collect_metrics():
+    stats = get_job_queue().stats()
+    return [
+        "# TYPE saarlm_queue_depth gauge",
+        sample("saarlm_queue_depth", stats["queued"], state="queued"),
+        sample("saarlm_queue_depth", stats["running"], state="running"),
+        sample("saarlm_queue_depth", stats["failed"], state="failed"),
+        "# TYPE saarlm_queue_oldest_wait_seconds gauge",
+        sample("saarlm_queue_oldest_wait_seconds", stats["oldest_wait_seconds"]),
+    ]
@@ -0,0 +1,259 @@
+"""
+Job Store - job status shared by every worker process and surviving restarts
+SQLite (WAL) by default: one writer at a time, any number of concurrent readers.
+The in-memory store keeps the old single-process behaviour (JOB_STORE=memory).
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from .offload import run_io
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("jobs")
+
+JOB_STORE = os.getenv("JOB_STORE", "sqlite")
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join("data", "jobs.db"))
+# How often watchers re-check the store for writes made by other worker processes
+JOB_WATCH_INTERVAL = float(os.getenv("JOB_WATCH_INTERVAL", 0.5))
+# Inline mode: an unfinished job nobody has written for this long lost its process (restart, redeploy)
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", 600))
+
+TERMINAL_STATUSES = ("completed", "error")
+
+
+class JobStore:
+    """get/set/update are blocking; use the a* variants from async code"""
+
+    def __init__(self):
+        # Watchers in this process, woken right after a local write
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def set(self, job_id: str, data: dict):
+        """Replace the whole job record"""
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        """Atomically merge `fields` into the job record; returns the new record (None if unknown job)"""
+        raise NotImplementedError
+
+    def version(self, job_id: str) -> int:
+        """Bumped on every write - lets readers cheaply detect changes"""
+        raise NotImplementedError
+
+    def fail_stale(self, older_than: float, error: str, alive: Iterable[str] = ()) -> List[str]:
+        """Mark unfinished jobs that nobody has written for `older_than` seconds as failed.
+
+        `alive` are jobs the calling process is still running: they are refreshed
+        instead, so slow stages don't look dead. Returns the failed job ids.
+        """
+        raise NotImplementedError
+
+    async def aget(self, job_id: str) -> Optional[dict]:
+        return await run_io(self.get, job_id)
+
+    async def aset(self, job_id: str, data: dict):
+        await run_io(self.set, job_id, data)
+        self._notify(job_id)
+
+    async def aupdate(self, job_id: str, **fields) -> Optional[dict]:
+        job = await run_io(lambda: self.update(job_id, **fields))
+        self._notify(job_id)
+        return job
+
+    async def aversion(self, job_id: str) -> int:
+        return await run_io(self.version, job_id)
+
+    async def afail_stale(self, older_than: float, error: str, alive: Iterable[str] = ()) -> List[str]:
+        job_ids = await run_io(self.fail_stale, older_than, error, list(alive))
+        for job_id in job_ids:
+            self._notify(job_id)
+        return job_ids
+
+    def _notify(self, job_id: str):
+        for event in self._waiters.get(job_id, ()):
+            event.set()
+
+    async def watch(self, job_id: str, heartbeat: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """Yield the job record each time it changes, until it completes or fails.
+
+        Writes from this process wake the watcher immediately; writes from other
+        workers are picked up within JOB_WATCH_INTERVAL. Yields None after
+        `heartbeat` seconds without a change so callers can keep the connection alive.
+        """
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, set()).add(event)
+        try:
+            seen = -1
+            idle = 0.0
+            while True:
+                event.clear()
+                version = await self.aversion(job_id)
+                if version != seen:
+                    seen = version
+                    idle = 0.0
+                    job = await self.aget(job_id)
+                    yield job
+                    if job is None or job.get("status") in TERMINAL_STATUSES:
+                        return
+                elif idle >= heartbeat:
+                    idle = 0.0
+                    yield None
+
+                try:
+                    await asyncio.wait_for(event.wait(), JOB_WATCH_INTERVAL)
+                except asyncio.TimeoutError:
+                    idle += JOB_WATCH_INTERVAL
+        finally:
+            waiters = self._waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[job_id]
+
+
+class MemoryJobStore(JobStore):
+    def __init__(self):
+        super().__init__()
+        self._jobs: Dict[str, dict] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def set(self, job_id: str, data: dict):
+        with self._lock:
+            self._jobs[job_id] = dict(data)
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            if job_id not in self._jobs:
+                return None
+            self._jobs[job_id].update(fields)
+            self._versions[job_id] += 1
+            return dict(self._jobs[job_id])
+
+    def version(self, job_id: str) -> int:
+        with self._lock:
+            return self._versions.get(job_id, 0)
+
+    def fail_stale(self, older_than: float, error: str, alive: Iterable[str] = ()) -> List[str]:
+        # Jobs never outlive the process that ran them
+        return []
+
+
+class SQLiteJobStore(JobStore):
+    def __init__(self, path: str = JOB_DB_PATH):
+        super().__init__()
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, data TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 1,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread: sqlite connections must not be shared across threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            self._local.db = db
+        return db
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._db().execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, job_id: str, data: dict):
+        now = time.time()
+        self._db().execute(
+            "INSERT INTO jobs (job_id, data, version, created_at, updated_at) VALUES (?, ?, 1, ?, ?)"
+            " ON CONFLICT(job_id) DO UPDATE SET data = excluded.data, version = version + 1,"
+            " updated_at = excluded.updated_at",
+            (job_id, json.dumps(data, ensure_ascii=False), now, now),
+        )
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        db = self._db()
+        # IMMEDIATE takes the write lock up front, so read-merge-write can't interleave
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                db.execute("ROLLBACK")
+                return None
+            data = json.loads(row[0])
+            data.update(fields)
+            db.execute(
+                "UPDATE jobs SET data = ?, version = version + 1, updated_at = ? WHERE job_id = ?",
+                (json.dumps(data, ensure_ascii=False), time.time(), job_id),
+            )
+            db.execute("COMMIT")
+            return data
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def version(self, job_id: str) -> int:
+        row = self._db().execute("SELECT version FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else 0
+
+    def fail_stale(self, older_than: float, error: str, alive: Iterable[str] = ()) -> List[str]:
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Touch only: no version bump, so watchers don't see a change
+            db.executemany("UPDATE jobs SET updated_at = ? WHERE job_id = ?", [(now, job_id) for job_id in alive])
+            rows = db.execute(
+                "SELECT job_id FROM jobs WHERE updated_at < ?"
+                " AND json_extract(data, '$.status') NOT IN ('completed', 'error')",
+                (now - older_than,),
+            ).fetchall()
+            data = json.dumps({"status": "error", "error": error}, ensure_ascii=False)
+            db.executemany(
+                "UPDATE jobs SET data = ?, version = version + 1, updated_at = ? WHERE job_id = ?",
+                [(data, now, job_id) for job_id, in rows],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return [job_id for job_id, in rows]
+
+
+_job_store: Optional[JobStore] = None
+
+
+def get_job_store() -> JobStore:
+    global _job_store
+    if _job_store is None:
+        _job_store = MemoryJobStore() if JOB_STORE == "memory" else SQLiteJobStore()
+        log.info("Job store ready", extra={"store": type(_job_store).__name__})
+    return _job_store
@@ -0,0 +1,213 @@
+"""
+Library Index - SQLite index over the podcast metadata files
+Metadata JSON files stay the source of truth; the index is updated on job
+completion/delete and reconciled with METADATA_DIR at startup, so listing
+the library never has to open every file.
+"""
+
+import os
+import json
+import base64
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .offload import run_io
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("library")
+
+LIBRARY_DB_PATH = os.getenv("LIBRARY_DB_PATH", os.path.join("data", "library.db"))
+
+# Columns a client may ask for; "script" / "extracted_text" are the heavy ones
+FIELDS = ["job_id", "title", "subject", "chapter", "duration", "audio_file", "created_at", "script", "extracted_text"]
+LIST_FIELDS = ["job_id", "title", "subject", "chapter", "duration", "audio_file", "created_at"]
+SORT_FIELDS = ["created_at", "title", "duration"]
+DEFAULT_SORT = "-created_at"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def _encode_cursor(value, job_id: str) -> str:
+    raw = json.dumps([value, job_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[object, str]:
+    try:
+        value, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return value, str(job_id)
+    except Exception:
+        raise InvalidQuery("Invalid cursor")
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Comma-separated projection -> column list (job_id is always included)"""
+    if not fields:
+        return list(LIST_FIELDS)
+    if fields == "*":
+        return list(FIELDS)
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in FIELDS]
+    if unknown:
+        raise InvalidQuery(f"Unknown field(s): {', '.join(unknown)}")
+    if "job_id" not in wanted:
+        wanted.insert(0, "job_id")
+    return wanted
+
+
+def parse_sort(sort: Optional[str]) -> Tuple[str, bool]:
+    """"created_at" / "-created_at" -> (column, descending)"""
+    sort = sort or DEFAULT_SORT
+    descending = sort.startswith("-")
+    column = sort.lstrip("-+")
+    if column not in SORT_FIELDS:
+        raise InvalidQuery(f"Cannot sort by '{column}' (use one of: {', '.join(SORT_FIELDS)})")
+    return column, descending
+
+
+class LibraryIndex:
+    """query/upsert/delete are blocking; use the a* variants from async code"""
+
+    def __init__(self, path: str = LIBRARY_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS podcasts ("
+            " job_id TEXT PRIMARY KEY, title TEXT, subject TEXT, chapter TEXT, duration REAL,"
+            " audio_file TEXT, created_at TEXT NOT NULL DEFAULT '', script TEXT, extracted_text TEXT)"
+        )
+        # One index per sort order, plus subject/chapter-first ones for filtered listings
+        for column in SORT_FIELDS:
+            db.execute(f"CREATE INDEX IF NOT EXISTS idx_podcasts_{column} ON podcasts ({column}, job_id)")
+            db.execute(f"CREATE INDEX IF NOT EXISTS idx_podcasts_subject_{column} "
+                       f"ON podcasts (subject, chapter, {column}, job_id)")
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread: sqlite connections must not be shared across threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _row(metadata: dict) -> tuple:
+        # Sort columns must never be NULL, or keyset comparisons would drop the row
+        defaults = {"created_at": "", "title": "", "duration": 0}
+        return tuple(metadata.get(f) if metadata.get(f) is not None else defaults.get(f) for f in FIELDS)
+
+    def upsert(self, metadata: dict):
+        placeholders = ", ".join("?" for _ in FIELDS)
+        self._db().execute(
+            f"INSERT OR REPLACE INTO podcasts ({', '.join(FIELDS)}) VALUES ({placeholders})",
+            self._row(metadata),
+        )
+
+    def delete(self, job_id: str):
+        self._db().execute("DELETE FROM podcasts WHERE job_id = ?", (job_id,))
+
+    def query(self, limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None, subject: Optional[str] = None,
+              chapter: Optional[str] = None, sort: Optional[str] = None, fields: Optional[str] = None) -> dict:
+        """One page of the library: {"podcasts", "total", "next_cursor"}"""
+        columns = parse_fields(fields)
+        sort_column, descending = parse_sort(sort)
+        limit = max(1, min(int(limit), MAX_LIMIT))
+
+        where, params = [], []
+        if subject:
+            where.append("subject = ?")
+            params.append(subject)
+        if chapter:
+            where.append("chapter = ?")
+            params.append(chapter)
+        filter_sql = (" WHERE " + " AND ".join(where)) if where else ""
+        filter_params = list(params)
+
+        # Keyset pagination: continue strictly after the (sort value, job_id) of the last row
+        if cursor:
+            value, last_id = _decode_cursor(cursor)
+            op = "<" if descending else ">"
+            where.append(f"({sort_column}, job_id) {op} (?, ?)")
+            params.extend([value, last_id])
+
+        direction = "DESC" if descending else "ASC"
+        select = list(columns) if sort_column in columns else columns + [sort_column]
+        sql = (f"SELECT {', '.join(select)} FROM podcasts"
+               + ((" WHERE " + " AND ".join(where)) if where else "")
+               + f" ORDER BY {sort_column} {direction}, job_id {direction} LIMIT ?")
+
+        db = self._db()
+        rows = db.execute(sql, params + [limit + 1]).fetchall()
+        total = db.execute(f"SELECT COUNT(*) FROM podcasts{filter_sql}", filter_params).fetchone()[0]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = _encode_cursor(last[sort_column], last["job_id"])
+
+        podcasts = [{c: row[c] for c in columns} for row in rows]
+        return {"podcasts": podcasts, "total": total, "next_cursor": next_cursor}
+
+    def reconcile(self, metadata_dir: str) -> Tuple[int, int]:
+        """Reconcile the index with the metadata files (added, removed) - run once at startup"""
+        on_disk = {f[:-5] for f in os.listdir(metadata_dir) if f.endswith(".json")}
+        db = self._db()
+        indexed = {row[0] for row in db.execute("SELECT job_id FROM podcasts")}
+
+        added = 0
+        for job_id in on_disk - indexed:
+            try:
+                with open(os.path.join(metadata_dir, f"{job_id}.json"), "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+                metadata.setdefault("job_id", job_id)
+                self.upsert(metadata)
+                added += 1
+            except Exception as e:
+                log.warning("Could not index metadata", extra={"job_id": job_id, "error": str(e)})
+
+        removed = indexed - on_disk
+        for job_id in removed:
+            self.delete(job_id)
+        return added, len(removed)
+
+    async def aupsert(self, metadata: dict):
+        await run_io(self.upsert, metadata)
+
+    async def adelete(self, job_id: str):
+        await run_io(self.delete, job_id)
+
+    async def aquery(self, **kwargs) -> dict:
+        return await run_io(lambda: self.query(**kwargs))
+
+    async def areconcile(self, metadata_dir: str) -> Tuple[int, int]:
+        return await run_io(self.reconcile, metadata_dir)
+
+
+_library_index: Optional[LibraryIndex] = None
+
+
+def get_library_index() -> LibraryIndex:
+    global _library_index
+    if _library_index is None:
+        _library_index = LibraryIndex()
+    return _library_index
@@ -0,0 +1,181 @@
+"""
+Logs - structured, non-blocking logging for the app and workers
+Callers only enqueue records; one background thread formats them (JSON lines
+by default) and writes to stdout, so a slow stdout never stalls the event loop.
+Records carry the current job_id (set with job_context) and any extra= fields.
+Text previews (OCR output, scripts) are sampled per job and truncated.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text" (human-readable, for local runs)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Share of jobs whose text previews are logged, and how much of each
+LOG_PREVIEW_SAMPLE = float(os.getenv("LOG_PREVIEW_SAMPLE", 0.1))
+LOG_PREVIEW_CHARS = int(os.getenv("LOG_PREVIEW_CHARS", 120))
+
+ROOT = "saarlm"
+
+_job_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("job_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "job_id"}
+
+_setup_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_handler: Optional["_DroppingQueueHandler"] = None
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped and counted"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve everything that depends on the caller now; formatting happens on the listener thread
+        if getattr(record, "job_id", None) is None:
+            record.job_id = _job_id.get()
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _extras(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD and value is not None}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "job_id", None):
+            entry["job_id"] = record.job_id
+        entry.update(_extras(record))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} [{record.name}]"
+        if getattr(record, "job_id", None):
+            line += f" ({record.job_id})"
+        line += f" {record.getMessage()}"
+        fields = _extras(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def setup_logging():
+    """Configure the saarlm.* loggers (idempotent); get_logger() calls this on first use"""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+        _handler = _DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=False)
+        _listener.start()
+
+        root = logging.getLogger(ROOT)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_handler)
+        # uvicorn configures its own loggers; ours stay separate
+        root.propagate = False
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        if _handler is not None:
+            logging.getLogger(ROOT).removeHandler(_handler)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """saarlm.<name> logger"""
+    setup_logging()
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+@contextmanager
+def job_context(job_id: str):
+    """Tag every record logged inside (including tasks and offload threads started from it) with job_id"""
+    token = _job_id.set(job_id)
+    try:
+        yield
+    finally:
+        _job_id.reset(token)
+
+
+def current_job_id() -> Optional[str]:
+    return _job_id.get()
+
+
+def _sampled() -> bool:
+    if LOG_PREVIEW_SAMPLE >= 1:
+        return True
+    if LOG_PREVIEW_SAMPLE <= 0:
+        return False
+    job_id = _job_id.get()
+    if job_id is None:
+        return random.random() < LOG_PREVIEW_SAMPLE
+    # Per job, so a sampled job logs all of its previews
+    bucket = int.from_bytes(hashlib.sha1(job_id.encode("utf-8")).digest()[:4], "big") / 2 ** 32
+    return bucket < LOG_PREVIEW_SAMPLE
+
+
+def preview(text: Optional[str]) -> Optional[str]:
+    """Truncated `text` for a preview field, or None (field omitted) when this job isn't sampled"""
+    if not text or not _sampled():
+        return None
+    return text[:LOG_PREVIEW_CHARS]
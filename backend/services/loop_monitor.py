@@ -0,0 +1,152 @@
+"""
+Loop Monitor - measures event-loop lag and names what was blocking it
+A heartbeat task records how late each tick wakes up; a watchdog thread
+samples the loop thread's stack while a stall is in progress, so every
+stall report carries the active job stages and the offending code location
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from .logs import get_logger
+from .metrics import register_collector, sample
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("loop")
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL_MS", 100)) / 1000
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD_MS", 100)) / 1000
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# job_id -> stage currently running for that job
+_active_stages: Dict[str, str] = {}
+
+
+def set_stage(job_id: str, stage: str):
+    _active_stages[job_id] = stage
+
+
+def clear_stage(job_id: str):
+    _active_stages.pop(job_id, None)
+
+
+def _describe_stack(frame) -> Optional[str]:
+    """Innermost backend (non-library) frame, e.g. 'services/tts_service.py:120 _apply_pitch'"""
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path.startswith(_BACKEND_DIR) and not path.endswith("loop_monitor.py"):
+            rel = os.path.relpath(path, _BACKEND_DIR)
+            return f"{rel}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.recent = deque(maxlen=50)
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._sampled: Optional[dict] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        log.info("Lag monitor running", extra={"threshold_ms": int(self.threshold * 1000)})
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            if lag >= self.threshold:
+                self._record(lag)
+
+    def _watch(self):
+        """Runs in a thread: while the loop is overdue, grab where it is stuck"""
+        while not self._stop.wait(self.interval / 2):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue < self.threshold or self._sampled is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            self._sampled = {
+                "where": _describe_stack(frame),
+                "stages": {job: stage for job, stage in _active_stages.items()},
+            }
+
+    def _record(self, lag: float):
+        sample = self._sampled or {"where": None, "stages": dict(_active_stages)}
+        self._sampled = None
+
+        self.stalls += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        stall = {
+            "at": time.time(),
+            "lag_ms": round(lag * 1000, 1),
+            "stages": sample["stages"],
+            "where": sample["where"],
+        }
+        self.recent.append(stall)
+
+        log.warning("Event loop stall", extra={"lag_ms": stall["lag_ms"], "stages": stall["stages"],
+                                                 "where": stall["where"] or "unknown"})
+
+    def stats(self) -> dict:
+        return {
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "total_lag_ms": round(self.total_lag * 1000, 1),
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "recent": list(self.recent),
+        }
+
+
+loop_monitor = LoopLagMonitor()
+
+
+def _collect_metrics():
+    return ["# TYPE saarlm_loop_stalls_total counter", "# TYPE saarlm_loop_stall_seconds_total counter",
+            "# TYPE saarlm_loop_max_stall_seconds gauge",
+            sample("saarlm_loop_stalls_total", loop_monitor.stalls),
+            sample("saarlm_loop_stall_seconds_total", round(loop_monitor.total_lag, 6)),
+            sample("saarlm_loop_max_stall_seconds", round(loop_monitor.max_lag, 6))]
+
+
+register_collector(_collect_metrics)
@@ -0,0 +1,228 @@
+"""
+Metrics - counters, gauges and histograms in the Prometheus text format
+Dependency-free and per process: the API serves its own at /metrics, and
+each worker process can serve its own on WORKER_METRICS_PORT (+ index).
+Metrics are updated from the event loop and from offload threads alike.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from dotenv import load_dotenv
+
+from .logs import get_logger, dropped_records
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("metrics")
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; pipeline stages range from milliseconds (cache hits) to minutes (long TTS)
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_lock = threading.Lock()
+_metrics: List["_Metric"] = []
+# Called at scrape time; each returns extra sample lines (already formatted)
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def sample(name: str, value: float, **labels) -> str:
+    """One formatted sample line, for collectors"""
+    names = tuple(labels)
+    return f"{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values: Dict[Tuple, object] = {}
+        with _lock:
+            _metrics.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _render(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._render()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., sum]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """`with histogram.time(stage="ocr"): ...` - works in sync and async code"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render(self) -> List[str]:
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(state[-1], 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def register_collector(collector: Callable[[], Iterable[str]]):
+    with _lock:
+        _collectors.append(collector)
+
+
+def render() -> str:
+    """The whole registry in the text exposition format. Blocking (collectors may hit SQLite)"""
+    with _lock:
+        lines = [line for metric in _metrics for line in metric.render()]
+        collectors = list(_collectors)
+    for collector in collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            log.warning("Collector failed", extra={"collector": getattr(collector, "__name__", str(collector)),
+                                                    "error": str(e)})
+    return "\n".join(lines) + "\n"
+
+
+async def serve(port: int, host: str = "0.0.0.0"):
+    """Minimal HTTP listener answering every request with render() - for worker processes"""
+    from .offload import run_io
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = (await run_io(render)).encode("utf-8")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: " + CONTENT_TYPE.encode() +
+                         b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    log.info("Serving metrics", extra={"host": host, "port": port})
+    return server
+
+
+# ---- Pipeline metrics ----
+
+STAGE_SECONDS = Histogram(
+    "saarlm_stage_duration_seconds", "Time spent in each pipeline stage",
+    ("stage",),  # upload, ocr, script, safety_filter, tts_segment, combine, export
+)
+STAGE_WAIT_SECONDS = Histogram(
+    "saarlm_stage_wait_seconds", "Time a job waited for a stage slot (STAGE_LIMIT_*)", ("stage",),
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "saarlm_queue_wait_seconds", "Time from enqueue to first claim by a worker (EXECUTION_MODE=queue)",
+)
+JOB_SECONDS = Histogram("saarlm_job_duration_seconds", "Whole-job processing time", ("status",))
+JOBS = Counter("saarlm_jobs_total", "Finished jobs", ("status",))
+ACTIVE_JOBS = Gauge("saarlm_active_jobs", "Jobs being processed by this process")
+
+GEMINI_RESPONSES = Counter("saarlm_gemini_responses_total", "Gemini responses by status code (or error type)",
+                           ("stage", "status"))
+GEMINI_SECONDS = Histogram("saarlm_gemini_request_seconds", "Gemini request latency, per attempt", ("stage",))
+BYTES = Counter("saarlm_bytes_total", "Bytes moved, by channel and direction", ("channel", "direction"))
+
+
+def _collect_logging():
+    return ["# TYPE saarlm_log_records_dropped_total counter",
+            sample("saarlm_log_records_dropped_total", dropped_records())]
+
+
+register_collector(_collect_logging)
@@ -0,0 +1,203 @@
+"""
+MP3 Frames - join MP3 segments at the frame level without decoding
+Handles MPEG-1/2/2.5 Layer III (what gTTS and ffmpeg/lame produce), skips
+ID3/Xing/Info/VBRI metadata, and writes a Xing header so players see the
+right duration for the joined (possibly mixed-bitrate) stream
+"""
+
+from collections import namedtuple
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+# version_id: 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+FrameFormat = namedtuple("FrameFormat", ["version_id", "sample_rate", "mono"])
+FrameHeader = namedtuple("FrameHeader", ["format", "bitrate", "padding", "protected", "length", "samples"])
+
+_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_BITRATES[0] = _BITRATES[2]
+
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+
+def parse_frame_header(data: bytes, pos: int) -> Optional[FrameHeader]:
+    """Decode the 4-byte Layer III header at `pos`, or None if it isn't one"""
+    if pos + 4 > len(data):
+        return None
+    b = int.from_bytes(data[pos:pos + 4], "big")
+    if (b >> 21) & 0x7FF != 0x7FF:
+        return None
+
+    version_id = (b >> 19) & 3
+    layer = (b >> 17) & 3
+    bitrate_idx = (b >> 12) & 0xF
+    sr_idx = (b >> 10) & 3
+    if version_id == 1 or layer != 1 or bitrate_idx in (0, 15) or sr_idx == 3:
+        return None
+
+    bitrate = _BITRATES[version_id][bitrate_idx]
+    sample_rate = _SAMPLE_RATES[version_id][sr_idx]
+    padding = (b >> 9) & 1
+    mono = ((b >> 6) & 3) == 3
+    coeff, samples = (144, 1152) if version_id == 3 else (72, 576)
+    length = coeff * bitrate * 1000 // sample_rate + padding
+
+    return FrameHeader(
+        format=FrameFormat(version_id, sample_rate, mono),
+        bitrate=bitrate,
+        padding=padding,
+        protected=not ((b >> 16) & 1),
+        length=length,
+        samples=samples,
+    )
+
+
+def _side_info_size(fmt: FrameFormat) -> int:
+    if fmt.version_id == 3:
+        return 17 if fmt.mono else 32
+    return 9 if fmt.mono else 17
+
+
+def _is_info_frame(data: bytes, pos: int, header: FrameHeader) -> bool:
+    """Xing/Info/VBRI frames carry stream metadata, not audio"""
+    offset = pos + 4 + (2 if header.protected else 0) + _side_info_size(header.format)
+    return data[offset:offset + 4] in (b"Xing", b"Info") or data[pos + 36:pos + 40] == b"VBRI"
+
+
+def _skip_tags(data: bytes, pos: int) -> int:
+    """Step over ID3v2 / ID3v1 / APE tags starting at `pos`"""
+    while True:
+        if data[pos:pos + 3] == b"ID3" and pos + 10 <= len(data):
+            size = 0
+            for byte in data[pos + 6:pos + 10]:
+                size = (size << 7) | (byte & 0x7F)
+            footer = 10 if data[pos + 5] & 0x10 else 0
+            pos += 10 + size + footer
+        elif data[pos:pos + 3] == b"TAG" and pos + 128 <= len(data):
+            pos += 128
+        elif data[pos:pos + 8] == b"APETAGEX" and pos + 32 <= len(data):
+            pos += 32 + int.from_bytes(data[pos + 12:pos + 16], "little")
+        else:
+            return pos
+
+
+def iter_audio_frames(data: bytes) -> Iterator[Tuple[int, FrameHeader]]:
+    """Yield (offset, header) for each audio frame, resyncing over junk"""
+    pos = 0
+    end = len(data)
+    while pos < end:
+        pos = _skip_tags(data, pos)
+        header = parse_frame_header(data, pos)
+        if header is None or pos + header.length > end:
+            # Resync: next position whose header is followed by another valid header
+            pos = _resync(data, pos + 1)
+            continue
+        if not _is_info_frame(data, pos, header):
+            yield pos, header
+        pos += header.length
+
+
+def _resync(data: bytes, pos: int) -> int:
+    end = len(data)
+    while True:
+        pos = data.find(b"\xff", pos)
+        if pos < 0:
+            return end
+        header = parse_frame_header(data, pos)
+        if header is not None:
+            nxt = pos + header.length
+            if nxt == end or parse_frame_header(data, nxt) is not None or data[nxt:nxt + 3] in (b"ID3", b"TAG"):
+                return pos
+        pos += 1
+
+
+def probe_format(data: bytes) -> Optional[FrameHeader]:
+    """Header of the first audio frame, or None if `data` has no parsable frames"""
+    for _, header in iter_audio_frames(data):
+        return header
+    return None
+
+
+def _build_header(fmt: FrameFormat, bitrate: int) -> Tuple[bytes, int]:
+    """4 header bytes (no CRC, no padding) and the resulting frame length"""
+    version_id = fmt.version_id
+    bitrate_idx = _BITRATES[version_id].index(bitrate)
+    sr_idx = _SAMPLE_RATES[version_id].index(fmt.sample_rate)
+    channel_mode = 3 if fmt.mono else 0
+    b = (0x7FF << 21) | (version_id << 19) | (1 << 17) | (1 << 16) | (bitrate_idx << 12) | (sr_idx << 10) | (channel_mode << 6)
+    coeff = 144 if version_id == 3 else 72
+    return b.to_bytes(4, "big"), coeff * bitrate * 1000 // fmt.sample_rate
+
+
+def silent_frame(fmt: FrameFormat, bitrate: int) -> bytes:
+    """All-zero side info = no main data, global gain 0 -> decodes as digital silence"""
+    header, length = _build_header(fmt, bitrate)
+    return header + bytes(length - 4)
+
+
+def _samples_per_frame(fmt: FrameFormat) -> int:
+    return 1152 if fmt.version_id == 3 else 576
+
+
+class Mp3StreamWriter:
+    """Appends MP3 segments and silence to a file frame by frame, one segment in memory at a time"""
+
+    def __init__(self, fp: BinaryIO, fmt: FrameFormat, bitrate: int, xing: bool = True):
+        self.fp = fp
+        self.format = fmt
+        self.bitrate = bitrate
+        self.frames = 0
+        self.bytes = 0
+        self._silence = silent_frame(fmt, bitrate)
+        self._xing_pos = None
+        if xing:
+            # Placeholder, filled with frame/byte counts in close()
+            self._xing_pos = fp.tell()
+            fp.write(silent_frame(fmt, self._xing_bitrate()))
+
+    def _xing_bitrate(self) -> int:
+        """Smallest bitrate whose frame fits header + side info + 16 bytes of Xing data"""
+        needed = 4 + _side_info_size(self.format) + 16
+        for bitrate in _BITRATES[self.format.version_id][1:]:
+            if _build_header(self.format, bitrate)[1] >= needed:
+                return bitrate
+        return self.bitrate
+
+    @property
+    def duration_ms(self) -> int:
+        return int(self.frames * _samples_per_frame(self.format) * 1000 / self.format.sample_rate)
+
+    def accepts(self, header: Optional[FrameHeader]) -> bool:
+        return header is not None and header.format == self.format
+
+    def write_segment(self, data: bytes) -> int:
+        """Copy every audio frame of `data`; frames in a different format are skipped. Returns frames written"""
+        written = 0
+        for pos, header in iter_audio_frames(data):
+            if header.format != self.format:
+                continue
+            self.fp.write(data[pos:pos + header.length])
+            self.bytes += header.length
+            written += 1
+        self.frames += written
+        return written
+
+    def write_silence(self, ms: int):
+        count = round(ms / 1000 * self.format.sample_rate / _samples_per_frame(self.format))
+        self.fp.write(self._silence * count)
+        self.frames += count
+        self.bytes += len(self._silence) * count
+
+    def close(self):
+        if self._xing_pos is None:
+            return
+        end = self.fp.tell()
+        self.fp.seek(self._xing_pos + 4 + _side_info_size(self.format))
+        # flags 0x3: frame count + byte count present
+        self.fp.write(b"Xing" + (3).to_bytes(4, "big") + self.frames.to_bytes(4, "big") + (end - self._xing_pos).to_bytes(4, "big"))
+        self.fp.seek(end)
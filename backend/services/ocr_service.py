@@ -4,114 +4,136 @@ Fresh clean version - Dec 2024
 """
 
 import os
-import base64
-import httpx
+from typing import Optional
 from dotenv import load_dotenv
 
+from .gemini_client import get_gemini_client, inline_request_body
+from .cache import get_cache, make_key
+from .offload import read_bytes, run_io
+from .ingest import sha256_file
+from .pdf_extract import extract_pdf
+from .image_prep import prepare_image, describe
+from .logs import get_logger, preview
+
 # Load environment variables
 load_dotenv()
 
+log = get_logger("ocr")
+
+OCR_MODEL = "gemini-1.5-pro"
+
+# Bump OCR_PROMPT_VERSION whenever OCR_PROMPT changes so cached results are not reused
+OCR_PROMPT = "Extract ALL text from this image exactly as written. Include headings, bullet points, formulas, equations. Return ONLY the extracted text."
+OCR_PROMPT_VERSION = "v1"
+OCR_GENERATION_CONFIG = {"temperature": 0.1, "maxOutputTokens": 8192}
+
+
+def ocr_cache_key(file_sha256: str, model: str, prompt_version: str) -> str:
+    """Content-addressed OCR cache key: same bytes + same model/prompt = same text"""
+    return make_key("ocr", file_sha256, model, prompt_version)
+
 
 class OCRService:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
-        print(f"[OCR] Initialized")
-        print(f"[OCR] API Key present: {bool(self.api_key)}")
-        if self.api_key:
-            print(f"[OCR] API Key starts with: {self.api_key[:10]}...")
-
-    async def extract_text(self, file_path: str) -> str:
-        print(f"\n[OCR] ========== EXTRACT TEXT ==========")
-        print(f"[OCR] File: {file_path}")
+        log.info("OCR service ready", extra={"api_key_configured": bool(self.api_key)})
 
+    async def extract_text(self, file_path: str, file_sha256: Optional[str] = None) -> str:
+        """`file_sha256` (from upload ingestion) lets a cache hit skip reading the file"""
         # Check API key
         if not self.api_key:
-            print("[OCR] ERROR: No API key!")
+            log.error("No GEMINI_API_KEY configured")
             return "Error: No GEMINI_API_KEY in .env file"
 
-        # Read file
-        try:
-            with open(file_path, "rb") as f:
-                file_bytes = f.read()
-            print(f"[OCR] File size: {len(file_bytes)} bytes")
-        except Exception as e:
-            print(f"[OCR] ERROR reading file: {e}")
-            return f"Error reading file: {e}"
-
         # Determine file type
         ext = file_path.split(".")[-1].lower()
-        print(f"[OCR] File extension: {ext}")
+        log.info("Extracting text", extra={"file": file_path, "ext": ext})
 
         if ext in ["jpg", "jpeg", "png", "webp"]:
-            return await self._ocr_image(file_bytes, ext)
+            # Repeat uploads of the same photo skip the Gemini call entirely
+            cache = get_cache("ocr")
+            try:
+                if file_sha256 is None:
+                    file_sha256 = await run_io(sha256_file, file_path)
+            except Exception as e:
+                log.error("Could not read file", extra={"file": file_path, "error": str(e)})
+                return f"Error reading file: {e}"
+            key = ocr_cache_key(file_sha256, OCR_MODEL, OCR_PROMPT_VERSION)
+            cached = await cache.aget_text(key) if cache else None
+            if cached is not None:
+                log.info("Cache hit", extra={"chars": len(cached)})
+                return cached
+
+            # Read file
+            try:
+                file_bytes = await read_bytes(file_path)
+            except Exception as e:
+                log.error("Could not read file", extra={"file": file_path, "error": str(e)})
+                return f"Error reading file: {e}"
+
+            text, ok = await self._ocr_image(file_bytes, ext)
+            if ok and cache:
+                await cache.aset_text(key, text)
+            return text
         elif ext == "pdf":
-            return await self._ocr_pdf(file_path)
+            try:
+                if file_sha256 is None:
+                    file_sha256 = await run_io(sha256_file, file_path)
+            except Exception as e:
+                log.error("Could not read file", extra={"file": file_path, "error": str(e)})
+                return f"Error reading file: {e}"
+            return await self._ocr_pdf(file_path, file_sha256)
         else:
             return f"Unsupported file type: {ext}"
 
-    async def _ocr_image(self, image_bytes: bytes, ext: str) -> str:
-        print(f"[OCR] Processing image...")
-
-        # Convert to base64
-        image_b64 = base64.b64encode(image_bytes).decode("utf-8")
-        print(f"[OCR] Base64 length: {len(image_b64)}")
-
+    async def _ocr_image(self, image_bytes: bytes, ext: str):
+        """Returns (text, ok) - `ok` is False when `text` is an error message"""
         # Determine MIME type
-        mime_map = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+        mime_map = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp", "pdf": "application/pdf"}
         mime_type = mime_map.get(ext, "image/jpeg")
-        print(f"[OCR] MIME type: {mime_type}")
 
-        # Build API request
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent?key={self.api_key}"
+        if mime_type.startswith("image/"):
+            prepared = await run_io(prepare_image, image_bytes, mime_type)
+            image_bytes, mime_type = prepared.data, prepared.mime_type
+            summary = describe(prepared)
+            if summary:
+                log.debug("Image preprocessed", extra={"summary": summary})
 
-        payload = {
-            "contents": [{
-                "parts": [
-                    {"text": "Extract ALL text from this image exactly as written. Include headings, bullet points, formulas, equations. Return ONLY the extracted text."},
-                    {"inline_data": {"mime_type": mime_type, "data": image_b64}}
-                ]
-            }],
-            "generationConfig": {"temperature": 0.1, "maxOutputTokens": 8192}
-        }
+        # Build API request (base64 + JSON built straight from bytes, off the loop)
+        body = await run_io(inline_request_body, OCR_PROMPT, mime_type, image_bytes, OCR_GENERATION_CONFIG)
 
         # Make API call
-        print(f"[OCR] Calling Gemini API...")
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(url, json=payload)
-
-            print(f"[OCR] Response status: {response.status_code}")
+            response = await get_gemini_client().generate(OCR_MODEL, stage="ocr", body=body)
 
             if response.status_code == 200:
                 result = response.json()
                 text = result["candidates"][0]["content"]["parts"][0]["text"]
-                print(f"[OCR] SUCCESS! Extracted {len(text)} chars")
-                try:
-                    print(f"[OCR] Preview: {text[:200]}...")
-                except:
-                    print(f"[OCR] Preview: (contains special characters)")
-                return text
+                log.info("Text extracted", extra={"mime_type": mime_type, "request_bytes": len(body),
+                                                  "chars": len(text), "preview": preview(text)})
+                return text, True
             else:
                 error_text = response.text[:500]
-                print(f"[OCR] API ERROR: {error_text}")
-                return f"API Error {response.status_code}: {error_text}"
+                log.error("Gemini OCR failed", extra={"status": response.status_code, "error": error_text})
+                return f"API Error {response.status_code}: {error_text}", False
 
         except Exception as e:
-            print(f"[OCR] EXCEPTION: {e}")
-            return f"OCR Exception: {e}"
+            log.exception("OCR request failed")
+            return f"OCR Exception: {e}", False
 
-    async def _ocr_pdf(self, pdf_path: str) -> str:
-        print(f"[OCR] Processing PDF...")
+    async def _ocr_pdf(self, pdf_path: str, file_sha256: str) -> str:
         try:
-            from pypdf import PdfReader
-            reader = PdfReader(pdf_path)
-            text = ""
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += f"Page {i+1}:\n{page_text}\n\n"
-            print(f"[OCR] PDF extracted: {len(text)} chars")
-            return text if text.strip() else "PDF has no extractable text. Please upload as image."
+            # Text layer parsed page by page in the process pool; scanned pages go to Gemini Vision
+            result = await extract_pdf(
+                pdf_path,
+                ocr_page=lambda data: self._ocr_image(data, "pdf"),
+                page_key=lambda index: ocr_cache_key(f"{file_sha256}#page{index}", OCR_MODEL, OCR_PROMPT_VERSION),
+                cache=get_cache("ocr"),
+            )
+            log.info("PDF extracted", extra={"chars": len(result.text), "pages": result.pages,
+                                             "scanned": len(result.scanned), "failed": len(result.failed),
+                                             "dropped": result.dropped})
+            return result.text if result.text.strip() else "PDF has no extractable text. Please upload as image."
         except Exception as e:
-            print(f"[OCR] PDF ERROR: {e}")
+            log.exception("PDF extraction failed")
             return f"PDF Error: {e}"
@@ -0,0 +1,116 @@
+"""
+Offload - run blocking work off the event loop on bounded executors
+  io    -> threads for file/sqlite/network-blocking calls
+  audio -> threads for pydub/ffmpeg decode + export (ffmpeg runs as a subprocess)
+  cpu   -> processes for pure-Python CPU work (func + args must be picklable)
+"""
+
+import os
+import json
+import asyncio
+import functools
+import contextvars
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+IO_WORKERS = int(os.getenv("OFFLOAD_IO_WORKERS", 8))
+AUDIO_WORKERS = int(os.getenv("OFFLOAD_AUDIO_WORKERS", 4))
+CPU_WORKERS = int(os.getenv("OFFLOAD_CPU_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+
+_io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="offload-io")
+_audio_pool = ThreadPoolExecutor(max_workers=AUDIO_WORKERS, thread_name_prefix="offload-audio")
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_cpu_pool() -> ProcessPoolExecutor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        # spawn: never fork a process that already runs executor/loop threads
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _cpu_pool
+
+
+async def _run(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+    return await loop.run_in_executor(executor, func, *args)
+
+
+# Thread pools run the call in a copy of the caller's context (job_id for log records);
+# the process pool can't carry it over
+async def run_io(func, *args, **kwargs):
+    return await _run(_io_pool, contextvars.copy_context().run, func, *args, **kwargs)
+
+
+async def run_audio(func, *args, **kwargs):
+    return await _run(_audio_pool, contextvars.copy_context().run, func, *args, **kwargs)
+
+
+async def run_cpu(func, *args, **kwargs):
+    return await _run(_get_cpu_pool(), func, *args, **kwargs)
+
+
+def shutdown():
+    global _cpu_pool
+    _io_pool.shutdown(wait=False, cancel_futures=True)
+    _audio_pool.shutdown(wait=False, cancel_futures=True)
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+
+
+# ---- Common blocking helpers ----
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_bytes(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _read_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+async def read_bytes(path: str) -> bytes:
+    return await run_io(_read_bytes, path)
+
+
+async def write_bytes(path: str, data: bytes):
+    await run_io(_write_bytes, path, data)
+
+
+async def read_json(path: str):
+    return await run_io(_read_json, path)
+
+
+async def write_json(path: str, data):
+    await run_io(_write_json, path, data)
+
+
+async def remove(path: str) -> bool:
+    return await run_io(_remove, path)
@@ -0,0 +1,148 @@
+"""
+PDF Extract - page-level PDF text extraction with a vision fallback
+Pages are parsed in the offload process pool, a few pages per task, and
+handed back as each task finishes. Pages without a usable text layer
+(scans, photos) are cut out as single-page PDFs and sent to vision OCR
+concurrently, with results cached per page.
+"""
+
+import io
+import os
+import asyncio
+from collections import namedtuple
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .offload import run_cpu
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("pdf")
+
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 4))
+# Pages with less extractable text than this are treated as scanned
+PDF_MIN_TEXT_CHARS = int(os.getenv("PDF_MIN_TEXT_CHARS", 25))
+PDF_VISION_CONCURRENCY = int(os.getenv("PDF_VISION_CONCURRENCY", 4))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 200))
+
+# text: combined "Page n:" text; scanned: pages sent to vision OCR; failed: pages with no text at all;
+# dropped: pages past PDF_MAX_PAGES that were not read
+PdfResult = namedtuple("PdfResult", ["text", "pages", "scanned", "failed", "dropped"])
+
+# (single-page PDF bytes) -> (text, ok)
+PageOCR = Callable[[bytes], Awaitable[Tuple[str, bool]]]
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+# ---- process-pool functions (module level so they pickle) ----
+
+def page_count(pdf_path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(pdf_path).pages)
+
+
+def _extract_range(pdf_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    from pypdf import PdfReader
+    reader = PdfReader(pdf_path)
+    pages = []
+    for index in range(start, stop):
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception as e:
+            log.warning("Text extraction failed", extra={"page": index + 1, "error": str(e)})
+            text = ""
+        pages.append((index, text))
+    return pages
+
+
+def page_pdf_bytes(pdf_path: str, index: int) -> bytes:
+    """Page `index` as a standalone PDF, for vision OCR"""
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter()
+    writer.add_page(PdfReader(pdf_path).pages[index])
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+# ---- async side ----
+
+async def iter_page_text(pdf_path: str, total: int) -> AsyncIterator[Tuple[int, str]]:
+    """Yield (index, text-layer text) in completion order, not page order"""
+    tasks = [
+        asyncio.ensure_future(run_cpu(_extract_range, pdf_path, start, min(start + PDF_PAGES_PER_TASK, total)))
+        for start in range(0, total, PDF_PAGES_PER_TASK)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for page in await next_done:
+                yield page
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def extract_pdf(pdf_path: str, ocr_page: Optional[PageOCR] = None,
+                      page_key: Optional[Callable[[int], str]] = None, cache=None,
+                      on_progress: Optional[ProgressCallback] = None) -> PdfResult:
+    """Text of every page, in order. Scanned pages go to `ocr_page` (if given) as they are found.
+
+    `cache` + `page_key(index)` cache vision results per page.
+    """
+    total = await run_cpu(page_count, pdf_path)
+    dropped = max(0, total - PDF_MAX_PAGES)
+    if dropped:
+        log.warning("PDF truncated", extra={"pdf_path": pdf_path, "pages": total, "used": PDF_MAX_PAGES})
+        total = PDF_MAX_PAGES
+
+    texts = {}
+    layer_texts = {}
+    done = 0
+    limit = asyncio.Semaphore(PDF_VISION_CONCURRENCY)
+
+    async def progress():
+        nonlocal done
+        done += 1
+        if on_progress:
+            await on_progress(done, total)
+
+    async def vision(index: int):
+        key = page_key(index) if page_key else None
+        text = await cache.aget_text(key) if cache and key else None
+        if text is None:
+            async with limit:
+                data = await run_cpu(page_pdf_bytes, pdf_path, index)
+                text, ok = await ocr_page(data)
+            if not ok:
+                log.warning("Vision OCR failed", extra={"page": index + 1, "error": text[:200]})
+                text = None
+            elif cache and key:
+                await cache.aset_text(key, text)
+        if text is not None:
+            texts[index] = text
+        await progress()
+
+    vision_tasks = []
+    try:
+        async for index, text in iter_page_text(pdf_path, total):
+            if len(text.strip()) >= PDF_MIN_TEXT_CHARS or ocr_page is None:
+                texts[index] = text
+                await progress()
+            else:
+                layer_texts[index] = text
+                vision_tasks.append(asyncio.create_task(vision(index)))
+        await asyncio.gather(*vision_tasks)
+    finally:
+        for task in vision_tasks:
+            task.cancel()
+
+    # A failed vision page still keeps whatever little text layer it had
+    for index, text in layer_texts.items():
+        texts.setdefault(index, text)
+    failed = [index for index in range(total) if not texts.get(index, "").strip()]
+
+    text = "".join(f"Page {index + 1}:\n{texts[index]}\n\n" for index in range(total) if texts.get(index, "").strip())
+    return PdfResult(text, total, sorted(layer_texts), failed, dropped)
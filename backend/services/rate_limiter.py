@@ -0,0 +1,285 @@
+"""
+Rate Limiter - outbound token buckets for the Gemini quota
+Requests/min and tokens/min buckets shared by every Gemini call. With
+GEMINI_QUOTA_STORE=sqlite (default) the buckets live in the job store database,
+so web and worker processes all draw from one quota; "memory" keeps a bucket
+per process. Callers reserve before sending and wait their turn, so bursts queue
+up locally instead of bouncing off Gemini with 429s; a 429 pauses everyone for
+Retry-After.
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import sqlite3
+import threading
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from .offload import run_io
+from .job_store import JOB_DB_PATH
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("rate_limiter")
+
+# "sqlite" = one quota for every process on the host, "memory" = per process
+GEMINI_QUOTA_STORE = os.getenv("GEMINI_QUOTA_STORE", "sqlite")
+# The project quota with the sqlite store; each process's share with the memory store
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", 10))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", 250000))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 4))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", 1.0))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", 30.0))
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+# Gemini bills an inline image (or PDF page) as a fixed number of tokens, not by size
+INLINE_PART_TOKENS = 258
+
+_RETRY_DELAY = re.compile(rb'"retryDelay"\s*:\s*"([\d.]+)s"')
+_TOTAL_TOKENS = re.compile(rb'"totalTokenCount"\s*:\s*(\d+)')
+
+
+class TokenBucket:
+    """Continuous-refill bucket; capacity is one minute of quota"""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.per_minute, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: Optional[float] = None) -> float:
+        """Take `amount` now (the balance may go negative) and return how long to wait for it"""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        self.tokens -= min(amount, self.per_minute)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount: float, now: Optional[float] = None):
+        """Correct a reservation after the fact (negative gives tokens back)"""
+        if self.per_minute <= 0:
+            return
+        self._refill(now)
+        self.tokens = min(self.per_minute, self.tokens - amount)
+
+
+class SharedQuota:
+    """Both buckets and the 429 pause in one SQLite row, updated under a write lock.
+
+    Every process on the host reserves from the same balance, so N processes
+    send GEMINI_RPM in total rather than N x GEMINI_RPM. Wall-clock based;
+    blocking - call through run_io.
+    """
+
+    def __init__(self, rpm: float, tpm: float, path: str = JOB_DB_PATH):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS gemini_quota ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1), requests REAL NOT NULL, tokens REAL NOT NULL,"
+            " updated REAL NOT NULL, paused_until REAL NOT NULL DEFAULT 0)"
+        )
+        db.execute("INSERT OR IGNORE INTO gemini_quota (id, requests, tokens, updated) VALUES (1, ?, ?, ?)",
+                   (rpm, tpm, time.time()))
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread: sqlite connections must not be shared across threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            self._local.db = db
+        return db
+
+    def _update(self, change) -> float:
+        """Load the row, let `change(requests, tokens, now, paused_until)` spend from it, write it back"""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT requests, tokens, updated, paused_until FROM gemini_quota WHERE id = 1").fetchone()
+            now = time.time()
+            requests, tokens = TokenBucket(self.rpm), TokenBucket(self.tpm)
+            requests.tokens, tokens.tokens = row[0], row[1]
+            requests.updated = tokens.updated = row[2]
+            result, paused_until = change(requests, tokens, now, row[3])
+            db.execute("UPDATE gemini_quota SET requests = ?, tokens = ?, updated = ?, paused_until = ? WHERE id = 1",
+                       (requests.tokens, tokens.tokens, max(now, row[2]), paused_until))
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def reserve(self, tokens: int) -> float:
+        """Take one request and `tokens` tokens; returns how long to wait for them"""
+        def change(requests, bucket, now, paused_until):
+            wait = max(requests.reserve(1, now), bucket.reserve(tokens, now), paused_until - now)
+            return wait, paused_until
+        return self._update(change)
+
+    def adjust(self, amount: float):
+        def change(requests, bucket, now, paused_until):
+            bucket.adjust(amount, now)
+            return 0.0, paused_until
+        self._update(change)
+
+    def pause(self, seconds: float):
+        def change(requests, bucket, now, paused_until):
+            requests._refill(now)
+            bucket._refill(now)
+            return 0.0, max(paused_until, now + seconds)
+        self._update(change)
+
+
+def estimate_tokens(payload: Optional[dict] = None, body: Optional[bytes] = None) -> int:
+    """Rough input-token estimate (~4 chars/token, fixed cost per inline file); settled with usageMetadata"""
+    if body is not None:
+        # Don't count the base64 file data as text
+        size, parts, pos = len(body), 0, 0
+        while True:
+            start = body.find(b'"data":"', pos)
+            if start < 0:
+                break
+            end = body.find(b'"', start + 8)
+            if end < 0:
+                break
+            size -= end - start
+            parts += 1
+            pos = end + 1
+        return size // 4 + parts * INLINE_PART_TOKENS
+
+    text, parts = 0, 0
+    for content in (payload or {}).get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                text += len(part["text"])
+            else:
+                parts += 1
+    return text // 4 + parts * INLINE_PART_TOKENS
+
+
+def usage_tokens(response: httpx.Response) -> Optional[int]:
+    match = _TOTAL_TOKENS.search(response.content)
+    return int(match.group(1)) if match else None
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """Server-requested delay: Retry-After header, else Gemini's RetryInfo.retryDelay"""
+    header = response.headers.get("retry-after")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            pass
+    match = _RETRY_DELAY.search(response.content[:4096])
+    return float(match.group(1)) if match else None
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** attempt)))
+
+
+class GeminiRateLimiter:
+    def __init__(self, rpm: float = GEMINI_RPM, tpm: float = GEMINI_TPM, store: str = GEMINI_QUOTA_STORE):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.shared = SharedQuota(rpm, tpm) if store == "sqlite" else None
+        self._paused_until = 0.0
+        self._waiting = 0
+        self._metrics = {
+            "requests": 0,
+            "delayed": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "retries": 0,
+            "rate_limited": 0,
+            "tokens_used": 0,
+        }
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait until the request fits the quota; returns the time spent waiting"""
+        wait = None
+        if self.shared:
+            try:
+                wait = await run_io(self.shared.reserve, tokens)
+            except sqlite3.Error as e:
+                # Don't hold up Gemini calls on the database - fall back to this process's buckets
+                log.warning("Shared quota unavailable", extra={"error": str(e)})
+        if wait is None:
+            now = time.monotonic()
+            wait = max(self.requests.reserve(1), self.tokens.reserve(tokens), self._paused_until - now)
+
+        self._metrics["requests"] += 1
+        if wait > 0:
+            self._metrics["delayed"] += 1
+            self._metrics["wait_seconds_total"] += wait
+            self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"], wait)
+            self._waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._waiting -= 1
+        return wait
+
+    async def settle(self, estimated: int, actual: Optional[int]):
+        """Charge the difference once usageMetadata tells us the real token count"""
+        if actual is None:
+            return
+        self._metrics["tokens_used"] += actual
+        if self.shared:
+            try:
+                await run_io(self.shared.adjust, actual - estimated)
+                return
+            except sqlite3.Error as e:
+                log.warning("Shared quota unavailable", extra={"error": str(e)})
+        self.tokens.adjust(actual - estimated)
+
+    async def pause(self, seconds: float):
+        """Quota exhausted upstream: hold every caller for `seconds`"""
+        self._metrics["rate_limited"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        if self.shared:
+            try:
+                await run_io(self.shared.pause, seconds)
+            except sqlite3.Error as e:
+                log.warning("Shared quota unavailable", extra={"error": str(e)})
+
+    def record_retry(self):
+        self._metrics["retries"] += 1
+
+    def stats(self) -> dict:
+        metrics = dict(self._metrics)
+        metrics["wait_seconds_avg"] = round(metrics["wait_seconds_total"] / metrics["delayed"], 3) if metrics["delayed"] else 0
+        metrics["wait_seconds_total"] = round(metrics["wait_seconds_total"], 3)
+        metrics["wait_seconds_max"] = round(metrics["wait_seconds_max"], 3)
+        metrics["waiting"] = self._waiting
+        metrics["rpm"] = self.requests.per_minute
+        metrics["tpm"] = self.tokens.per_minute
+        metrics["shared"] = self.shared is not None
+        metrics["paused_for"] = round(max(0.0, self._paused_until - time.monotonic()), 1)
+        return metrics
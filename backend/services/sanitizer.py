@@ -0,0 +1,191 @@
+"""
+Sanitizer - content-safety filter for generated scripts
+Strips phone numbers, contact/WhatsApp/call lines, email addresses and URLs
+that the model sometimes copies out of coaching-centre notes. All rules are
+compiled into one alternation that only runs on lines a cheap trigger scan
+flags (every rule needs a digit, "@" or a URL marker), and a final pass
+collapses the blank lines left behind. Works on a whole script or on
+streamed chunks, and reports what it removed.
+"""
+
+import re
+from collections import Counter, namedtuple
+from typing import List, Optional, Tuple
+
+# (rule, pattern) - order matters: at a given position the first rule that matches wins
+RULES = [
+    # Phone numbers (Indian format)
+    ("phone", r"\b\d{10}\b"),
+    ("phone", r"\b\d{5}[\s-]?\d{5}\b"),
+    ("phone", r"\+91[\s-]?\d{10}"),
+    # WhatsApp / contact / call lines that carry a number
+    ("whatsapp", r"[Ww]hats[Aa]pp[^\n]*\d+[^\n]*"),
+    ("contact", r"[Cc]ontact[^\n]*\d+[^\n]*"),
+    ("call", r"[Cc]all[^\n]*\d+[^\n]*"),
+    # Email addresses
+    ("email", r"\b[\w.-]+@[\w.-]+\.\w+\b"),
+    # URLs
+    ("url", r"https?://\S+"),
+    ("url", r"www\.\S+"),
+]
+
+# Every RULES match contains one of these, and only spans lines that contain one
+TRIGGER = r"[\d@]|www\.|://"
+
+_BLANK_LINES = re.compile(r"\n\s*\n\s*\n")
+_TRAILING_SPACE = re.compile(r"\s*\Z")
+
+# start/end are offsets in the original (unsanitized) text
+Removal = namedtuple("Removal", ["rule", "start", "end", "text"])
+
+
+class SanitizeReport:
+    """What a sanitize run removed. `removals` holds the removed text itself - log summary(), not that."""
+
+    def __init__(self):
+        self.removals: List[Removal] = []
+
+    @property
+    def chars_removed(self) -> int:
+        return sum(r.end - r.start for r in self.removals)
+
+    def counts(self) -> dict:
+        return dict(Counter(r.rule for r in self.removals))
+
+    def summary(self) -> dict:
+        return {"removed": len(self.removals), "chars_removed": self.chars_removed, "rules": self.counts()}
+
+    def __bool__(self):
+        return bool(self.removals)
+
+
+class Sanitizer:
+    def __init__(self, rules=RULES, trigger: Optional[str] = TRIGGER):
+        """`trigger` must occur on every line a rule can match; None scans every line"""
+        # Non-capturing: capture groups make the alternation markedly slower
+        self.pattern = re.compile("|".join(f"(?:{pattern})" for _, pattern in rules))
+        self.trigger = re.compile(trigger) if trigger else None
+        self._rules = [(name, re.compile(pattern)) for name, pattern in rules]
+
+    def _rule(self, text: str, pos: int) -> str:
+        # The alternation takes the first rule that matches here
+        for name, pattern in self._rules:
+            if pattern.match(text, pos):
+                return name
+        return "unknown"
+
+    def _sub(self, text: str, report: Optional[SanitizeReport], offset: int) -> str:
+        if report is None:
+            return self.pattern.sub("", text)
+
+        def drop(match):
+            report.removals.append(Removal(self._rule(text, match.start()), offset + match.start(),
+                                           offset + match.end(), match.group()))
+            return ""
+        return self.pattern.sub(drop, text)
+
+    def _remove(self, text: str, report: Optional[SanitizeReport], offset: int = 0) -> str:
+        if self.trigger is None:
+            return self._sub(text, report, offset)
+
+        # Run the alternation only over runs of consecutive trigger lines
+        search, find, end = self.trigger.search, text.find, len(text)
+        out, pos = [], 0
+        hit = search(text)
+        while hit:
+            start = text.rfind("\n", 0, hit.start()) + 1
+            stop = find("\n", hit.end())
+            stop = end if stop < 0 else stop
+            hit = search(text, stop)
+            # Extend while the next trigger is on the very next line ("98765\n43210" spans two)
+            while hit and find("\n", stop + 1, hit.start()) < 0:
+                stop = find("\n", hit.end())
+                stop = end if stop < 0 else stop
+                hit = search(text, stop)
+            out.append(text[pos:start])
+            out.append(self._sub(text[start:stop], report, offset + start))
+            pos = stop
+        if not out:
+            return text
+        out.append(text[pos:])
+        return "".join(out)
+
+    def sanitize(self, text: str, report: Optional[SanitizeReport] = None) -> str:
+        """Filtered copy of `text`; removals are appended to `report` if one is given"""
+        return _BLANK_LINES.sub("\n\n", self._remove(text, report))
+
+    def stream(self, report: Optional[SanitizeReport] = None) -> "SanitizerStream":
+        return SanitizerStream(self, report)
+
+
+class SanitizerStream:
+    """Incremental sanitize: feed() chunks as they arrive, close() at the end.
+
+    Only complete lines are filtered (the line rules run to end of line, URLs to the
+    next whitespace), and trailing blank lines are held until real text follows, so
+    the concatenated output is identical to sanitize() over the whole text.
+    """
+
+    def __init__(self, sanitizer: Sanitizer, report: Optional[SanitizeReport] = None):
+        self.sanitizer = sanitizer
+        self.report = report
+        self._pending = ""    # raw text not filtered yet (the unfinished line)
+        self._held = ""       # filtered trailing whitespace not emitted yet
+        self._offset = 0      # position of _pending in the original text
+        self._closed = False
+
+    def _cut(self) -> int:
+        cut = self._pending.rfind("\n") + 1
+        # "98765\n43210" and "+91\n9876543210" match across a newline: keep a line
+        # that ends in a digit until the next one is complete
+        while cut >= 2 and self._pending[cut - 2].isdigit():
+            cut = self._pending.rfind("\n", 0, cut - 1) + 1
+        return cut
+
+    def _emit(self, filtered: str, final: bool) -> str:
+        text = _BLANK_LINES.sub("\n\n", self._held + filtered)
+        if final:
+            self._held = ""
+            return text
+        tail = _TRAILING_SPACE.search(text).start()
+        self._held = text[tail:]
+        return text[:tail]
+
+    def feed(self, chunk: str) -> str:
+        """Filtered text that is now safe to pass on (may be "")"""
+        if self._closed:
+            raise ValueError("sanitizer stream is closed")
+        self._pending += chunk
+        cut = self._cut()
+        if cut == 0:
+            return ""
+        region, self._pending = self._pending[:cut], self._pending[cut:]
+        filtered = self.sanitizer._remove(region, self.report, self._offset)
+        self._offset += cut
+        return self._emit(filtered, final=False)
+
+    def close(self) -> str:
+        """Flush the rest; the stream cannot be fed afterwards"""
+        if self._closed:
+            return ""
+        self._closed = True
+        filtered = self.sanitizer._remove(self._pending, self.report, self._offset)
+        self._offset += len(self._pending)
+        self._pending = ""
+        return self._emit(filtered, final=True)
+
+
+_sanitizer: Optional[Sanitizer] = None
+
+
+def get_sanitizer() -> Sanitizer:
+    global _sanitizer
+    if _sanitizer is None:
+        _sanitizer = Sanitizer()
+    return _sanitizer
+
+
+def sanitize_script(script: str) -> Tuple[str, SanitizeReport]:
+    """Filtered script and what was removed"""
+    report = SanitizeReport()
+    return get_sanitizer().sanitize(script, report), report
@@ -4,40 +4,107 @@ Fresh clean version - Dec 2024
 """
 
 import os
-import httpx
+from typing import List, Optional
 from dotenv import load_dotenv
 
+from .gemini_client import get_gemini_client
+from .cache import get_cache, make_key, normalize_text, config_fingerprint
+from .script_sections import split_notes, cap_sections, plan_episodes, generate_sections, stitch
+from .sanitizer import sanitize_script
+from .logs import get_logger, preview
+
 # Load environment variables
 load_dotenv()
 
+log = get_logger("script")
+
+SCRIPT_MODEL = "gemini-1.5-pro"
+
+# Bump SCRIPT_PROMPT_VERSION whenever the prompt template changes so cached scripts are not reused
+SCRIPT_PROMPT_VERSION = "v1"
+SCRIPT_GENERATION_CONFIG = {"temperature": 0.8, "maxOutputTokens": 8192}
+
+
+def script_cache_key(notes: str, subject: str, chapter: str, model: str, prompt_version: str, generation_config: dict,
+                     part: str = "") -> str:
+    """Key on everything the prompt depends on; `notes` is the exact slice sent to Gemini,
+    `part` the section instructions when long notes are generated in parts"""
+    parts = ["script", normalize_text(notes), subject.strip(), chapter.strip(),
+             model, prompt_version, config_fingerprint(generation_config)]
+    if part:
+        parts.append(part)
+    return make_key(*parts)
+
+
+class ScriptGenerationError(Exception):
+    """Sections of the notes that Gemini could not turn into dialogue (1-based)"""
+
+    def __init__(self, failed: List[int], total: int):
+        super().__init__(f"Script generation failed for section(s) {', '.join(map(str, failed))} of {total}")
+        self.failed = failed
+        self.total = total
+
 
 class ScriptGenerator:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
-        print(f"[SCRIPT] Initialized")
-        print(f"[SCRIPT] API Key present: {bool(self.api_key)}")
-        if self.api_key:
-            print(f"[SCRIPT] API Key starts with: {self.api_key[:10]}...")
-
-    async def generate_script(self, text: str, subject: str = "General", chapter: str = "Notes") -> str:
-        print(f"\n[SCRIPT] ========== GENERATE SCRIPT ==========")
-        print(f"[SCRIPT] Subject: {subject}, Chapter: {chapter}")
-        print(f"[SCRIPT] Input text length: {len(text)} chars")
-        try:
-            print(f"[SCRIPT] Input preview: {text[:200]}...")
-        except:
-            print(f"[SCRIPT] Input preview: <contains special characters>")
+        log.info("Script generator ready", extra={"api_key_configured": bool(self.api_key)})
+
+    async def generate_script(self, text: str, subject: str = "General", chapter: str = "Notes", use_cache: bool = True) -> str:
+        """`use_cache=False` forces a fresh take (the new script still refreshes the cache)
+
+        Short notes (one Gemini call) fall back to a canned script if the call fails.
+        Long notes raise ScriptGenerationError when any section fails - like the upload
+        pipeline, which fails the job rather than record an episode with notes left out.
+        """
+        log.info("Generating script", extra={"subject": subject, "chapter": chapter, "chars": len(text or ""),
+                                             "preview": preview(text)})
 
         # Check API key
         if not self.api_key:
-            print("[SCRIPT] ERROR: No API key!")
+            log.error("No GEMINI_API_KEY configured")
             return self._fallback_script(subject, chapter)
 
         # Check input text
         if not text or len(text.strip()) < 20:
-            print("[SCRIPT] ERROR: Input text too short!")
+            log.warning("Input text too short")
+            return self._fallback_script(subject, chapter)
+
+        # Long notes are generated section by section (in parallel) and stitched in order
+        sections, _ = cap_sections(split_notes(text))
+        if len(sections) > 1:
+            log.info("Notes split", extra={"chars": len(text), "sections": len(sections)})
+        results = await generate_sections(
+            plan_episodes(sections),
+            lambda notes, brief, index: self._generate_section(notes, brief, subject, chapter, use_cache)
+        )
+        parts = results[0]
+        failed = [i + 1 for i, part in enumerate(parts) if part is None]
+        if failed and len(parts) > 1:
+            log.error("Script sections failed", extra={"failed": failed, "sections": len(parts)})
+            raise ScriptGenerationError(failed, len(parts))
+        script = stitch(parts)
+        if not script:
             return self._fallback_script(subject, chapter)
 
+        script, removed = sanitize_script(script)
+        if removed:
+            log.info("Safety filter removed content", extra={"removed": removed.counts()})
+        return script
+
+    async def _generate_section(self, notes: str, brief: str, subject: str, chapter: str, use_cache: bool) -> Optional[str]:
+        """Dialogue for one slice of the notes; None on failure"""
+        cache = get_cache("script")
+        key = script_cache_key(notes, subject, chapter, SCRIPT_MODEL, SCRIPT_PROMPT_VERSION, SCRIPT_GENERATION_CONFIG,
+                               part=brief)
+        if cache and use_cache:
+            cached = await cache.aget_text(key)
+            if cached is not None:
+                log.info("Cache hit", extra={"chars": len(cached)})
+                return cached
+
+        part_block = f"\nPART: {brief}\n" if brief else ""
+
         # Build prompt
         prompt = f"""Create a Hinglish podcast script for Indian JEE/NEET students based on these notes.
 
@@ -54,9 +121,9 @@ RULES:
 
 SUBJECT: {subject}
 CHAPTER: {chapter}
-
+{part_block}
 NOTES:
-{text[:3500]}
+{notes}
 
 FORMAT:
 DIDI: [dialogue]
@@ -65,42 +132,33 @@ BHAIYA: [dialogue]
 Generate the script now:"""
 
         # Build API request
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent?key={self.api_key}"
-
         payload = {
             "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.8, "maxOutputTokens": 8192}
+            "generationConfig": SCRIPT_GENERATION_CONFIG
         }
 
         # Make API call
-        print(f"[SCRIPT] Calling Gemini API...")
         try:
-            async with httpx.AsyncClient(timeout=90.0) as client:
-                response = await client.post(url, json=payload)
-
-            print(f"[SCRIPT] Response status: {response.status_code}")
+            response = await get_gemini_client().generate(SCRIPT_MODEL, payload, stage="script")
 
             if response.status_code == 200:
                 result = response.json()
-                print(f"[SCRIPT] Full API response: {str(result)[:300]}")
                 script = result["candidates"][0]["content"]["parts"][0]["text"]
-                print(f"[SCRIPT] SUCCESS! Generated {len(script)} chars")
-                try:
-                    print(f"[SCRIPT] Preview: {script[:200]}...")
-                except:
-                    print(f"[SCRIPT] Preview: <contains special characters>")
+                log.info("Script generated", extra={"chars": len(script), "preview": preview(script)})
+                if cache:
+                    await cache.aset_text(key, script)
                 return script
             else:
                 error_text = response.text[:500]
-                print(f"[SCRIPT] API ERROR: {error_text}")
-                return self._fallback_script(subject, chapter)
+                log.error("Gemini script failed", extra={"status": response.status_code, "error": error_text})
+                return None
 
-        except Exception as e:
-            print(f"[SCRIPT] EXCEPTION: {e}")
-            return self._fallback_script(subject, chapter)
+        except Exception:
+            log.exception("Script request failed")
+            return None
 
     def _fallback_script(self, subject: str, chapter: str) -> str:
-        print("[SCRIPT] Using fallback script")
+        log.warning("Using fallback script")
         return f"""DIDI: Hello students! Aaj hum {subject} mein {chapter} padhenge!
 
 BHAIYA: Haan Didi! Yeh topic bahut important hai exam ke liye.
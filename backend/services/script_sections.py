@@ -0,0 +1,214 @@
+"""
+Script Sections - map-reduce script generation for long notes
+Notes longer than one prompt's worth are split into sections on paragraph
+boundaries, each section's dialogue is generated in parallel (bounded), and
+the parts are stitched back in order into one episode or a short series.
+stream_sections() does the same for one episode while the text is still
+being written, so TTS can start on the first turns.
+"""
+
+import os
+import re
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("script")
+
+# Same slice size the single-call prompt always used, so short notes are unaffected
+SCRIPT_SECTION_CHARS = int(os.getenv("SCRIPT_SECTION_CHARS", 3500))
+SCRIPT_MAX_SECTIONS = int(os.getenv("SCRIPT_MAX_SECTIONS", 24))
+SCRIPT_SECTION_CONCURRENCY = int(os.getenv("SCRIPT_SECTION_CONCURRENCY", 3))
+# Sections per episode when a series is requested
+SCRIPT_EPISODE_SECTIONS = int(os.getenv("SCRIPT_EPISODE_SECTIONS", 3))
+# Stream single-episode scripts straight into TTS instead of waiting for the whole script
+SCRIPT_PIPELINE = os.getenv("SCRIPT_PIPELINE", "1") == "1"
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n|(?=^Page \d+:$)", re.MULTILINE)
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+|\n")
+
+# (section notes, part brief, section index) -> dialogue, or None if that section failed
+SectionGenerator = Callable[[str, str, int], Awaitable[Optional[str]]]
+# Streaming twin of SectionGenerator: yields the dialogue as it is written, raises on failure
+SectionStream = Callable[[str, str, int], AsyncIterator[str]]
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+def _hard_split(paragraph: str, max_chars: int) -> List[str]:
+    """Split an oversized paragraph on sentence ends, falling back to a plain cut"""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(paragraph):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_notes(text: str, max_chars: int = SCRIPT_SECTION_CHARS) -> List[str]:
+    """Pack paragraphs greedily, in order, into sections of at most `max_chars`"""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    sections, current = [], []
+    size = 0
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for piece in (_hard_split(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph]):
+            if current and size + 2 + len(piece) > max_chars:
+                sections.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+def cap_sections(sections: List[str], max_sections: int = SCRIPT_MAX_SECTIONS) -> Tuple[List[str], int]:
+    """Keep the first `max_sections` (bounds Gemini calls per job); returns (kept, number dropped)"""
+    dropped = max(0, len(sections) - max_sections)
+    if dropped:
+        log.warning("Notes truncated", extra={"sections": len(sections), "used": max_sections})
+    return sections[:max_sections], dropped
+
+
+def plan_episodes(sections: List[str], series: bool = False,
+                  per_episode: int = SCRIPT_EPISODE_SECTIONS) -> List[List[str]]:
+    """One episode with every section, or consecutive groups of `per_episode` sections"""
+    if not series or len(sections) <= per_episode:
+        return [sections]
+    return [sections[i:i + per_episode] for i in range(0, len(sections), per_episode)]
+
+
+def part_brief(part: int, parts: int, episode: int = 1, episodes: int = 1) -> str:
+    """Prompt instructions that make section dialogues join into one conversation ("" for a single call)"""
+    if parts == 1 and episodes == 1:
+        return ""
+
+    where = f"Episode {episode} of a {episodes}-episode series" if episodes > 1 else "This episode"
+    brief = [f"{where} is recorded in {parts} parts; write ONLY part {part} of {parts}, "
+             f"covering ONLY the notes given below (about 2-3 minutes)."]
+    if parts == 1:
+        brief.append("Open with a short greeting and close with a short recap and motivation.")
+    elif part == 1:
+        brief.append("Open with a short greeting and introduce the topic, but do NOT wrap up or say goodbye.")
+    elif part == parts:
+        brief.append("Continue the ongoing conversation with NO greeting, then close with a short recap and motivation.")
+    else:
+        brief.append("Continue the ongoing conversation: NO greeting, NO introduction, NO goodbye.")
+    return " ".join(brief)
+
+
+async def generate_sections(episodes: List[List[str]], generate: SectionGenerator,
+                            concurrency: int = SCRIPT_SECTION_CONCURRENCY,
+                            on_progress: Optional[ProgressCallback] = None) -> List[List[Optional[str]]]:
+    """Run `generate` for every section (at most `concurrency` at once); results keep episode/section order"""
+    limit = asyncio.Semaphore(concurrency)
+    total = sum(len(sections) for sections in episodes)
+    done = 0
+
+    async def run(notes: str, brief: str, index: int) -> Optional[str]:
+        nonlocal done
+        async with limit:
+            result = await generate(notes, brief, index)
+        done += 1
+        if on_progress:
+            await on_progress(done, total)
+        return result
+
+    tasks, index = [], 0
+    for episode, sections in enumerate(episodes, 1):
+        for part, notes in enumerate(sections, 1):
+            brief = part_brief(part, len(sections), episode, len(episodes))
+            tasks.append(asyncio.ensure_future(run(notes, brief, index)))
+            index += 1
+
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    grouped, start = [], 0
+    for sections in episodes:
+        grouped.append(list(results[start:start + len(sections)]))
+        start += len(sections)
+    return grouped
+
+
+async def stream_sections(sections: List[str], stream: SectionStream,
+                          concurrency: int = SCRIPT_SECTION_CONCURRENCY,
+                          on_progress: Optional[ProgressCallback] = None) -> AsyncIterator[str]:
+    """Streaming generate_sections + stitch for one episode.
+
+    Sections still run in parallel (at most `concurrency` at once). A section's
+    text is passed on live once every section before it has finished, and
+    buffered until then. The yielded chunks join to exactly stitch(parts).
+    """
+    limit = asyncio.Semaphore(concurrency)
+    queues = [asyncio.Queue() for _ in sections]
+    done = 0
+
+    async def pump(part: int, notes: str):
+        nonlocal done
+        queue = queues[part - 1]
+        try:
+            async with limit:
+                async for chunk in stream(notes, part_brief(part, len(sections)), part - 1):
+                    queue.put_nowait(chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+            return
+        queue.put_nowait(None)
+        done += 1
+        if on_progress:
+            await on_progress(done, len(sections))
+
+    tasks = [asyncio.ensure_future(pump(part, notes)) for part, notes in enumerate(sections, 1)]
+    try:
+        emitted = False
+        for queue in queues:
+            # Same as stitch(): each part stripped, non-empty parts joined by a blank line
+            started, held = False, ""
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if not started:
+                    chunk = chunk.lstrip()
+                    if not chunk:
+                        continue
+                    started = True
+                    held = "\n\n" if emitted else ""
+                    emitted = True
+                text = held + chunk
+                body = text.rstrip()
+                held = text[len(body):]
+                if body:
+                    yield body
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def stitch(parts: List[Optional[str]]) -> str:
+    """Join section dialogues in order, skipping empty ones (callers refuse to stitch around failed sections)"""
+    return "\n\n".join(part.strip() for part in parts if part and part.strip())
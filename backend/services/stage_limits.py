@@ -0,0 +1,66 @@
+"""
+Stage Limits - per-stage concurrency caps for the processing pipeline
+Each process (web in inline mode, every worker in queue mode) lets at most
+STAGE_LIMIT_<STAGE> jobs run a stage at once; the rest wait their turn
+"""
+
+import os
+import time
+import asyncio
+from typing import Dict
+
+from dotenv import load_dotenv
+
+from .metrics import STAGE_WAIT_SECONDS, register_collector, sample
+
+# Load environment variables
+load_dotenv()
+
+STAGE_LIMITS = {
+    "ocr": int(os.getenv("STAGE_LIMIT_OCR", 4)),
+    "script": int(os.getenv("STAGE_LIMIT_SCRIPT", 4)),
+    "tts": int(os.getenv("STAGE_LIMIT_TTS", 2)),
+}
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+class _StageSlot:
+    """The stage semaphore, recording how long each job waited for it"""
+
+    def __init__(self, stage: str, semaphore: asyncio.Semaphore):
+        self.stage = stage
+        self.semaphore = semaphore
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        await self.semaphore.acquire()
+        STAGE_WAIT_SECONDS.observe(time.perf_counter() - started, stage=self.stage)
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+def stage_slot(stage: str) -> _StageSlot:
+    """`async with stage_slot("tts"): ...` - unknown stages are limited to 1"""
+    semaphore = _semaphores.get(stage)
+    if semaphore is None:
+        semaphore = _semaphores[stage] = asyncio.Semaphore(max(1, STAGE_LIMITS.get(stage, 1)))
+    return _StageSlot(stage, semaphore)
+
+
+def stage_stats() -> dict:
+    return {
+        stage: {"limit": STAGE_LIMITS.get(stage, 1), "available": semaphore._value}
+        for stage, semaphore in _semaphores.items()
+    }
+
+
+def _collect_metrics():
+    lines = ["# TYPE saarlm_stage_slots_in_use gauge"]
+    for stage, stats in stage_stats().items():
+        lines.append(sample("saarlm_stage_slots_in_use", stats["limit"] - stats["available"], stage=stage))
+    return lines
+
+
+register_collector(_collect_metrics)
@@ -0,0 +1,123 @@
+"""
+TTS Engines - the ways a turn of dialogue becomes MP3 bytes
+  gtts   -> Google Translate TTS over the pooled async transport (network)
+  espeak -> espeak-ng on this machine (offline), run in the CPU process pool
+Each speaker in VOICES names its engine, so voices can mix engines.
+All engines return MP3 in gTTS's format (24 kHz mono, 32 kbps) so segments from
+different engines are joined frame by frame without re-encoding.
+"""
+
+import io
+import os
+import shutil
+import subprocess
+from typing import Callable, Dict, Optional
+
+from gtts import gTTS
+from dotenv import load_dotenv
+
+from .offload import run_cpu
+from .mp3_frames import FrameFormat
+from .tts_transport import get_tts_transport
+from .logs import get_logger
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("tts")
+
+# Engine for every speaker unless TTS_ENGINE_<SPEAKER> says otherwise
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+ESPEAK_BIN = os.getenv("ESPEAK_BIN") or shutil.which("espeak-ng") or shutil.which("espeak") or "espeak-ng"
+ESPEAK_TIMEOUT = float(os.getenv("ESPEAK_TIMEOUT", 60))
+
+# Segment format shared by all engines (what gTTS returns): MPEG-2 Layer III, 24 kHz mono, 32 kbps
+SEGMENT_FORMAT = FrameFormat(2, 24000, True)
+SEGMENT_BITRATE = 32
+
+
+def engine_for(speaker: str) -> str:
+    return os.getenv(f"TTS_ENGINE_{speaker}", TTS_ENGINE)
+
+
+class TTSEngine:
+    """Turns text into MP3 bytes for one voice (a VOICES entry)"""
+
+    name = ""
+
+    async def synthesize(self, text: str, voice: dict) -> bytes:
+        raise NotImplementedError
+
+    def synthesize_blocking(self, text: str, voice: dict) -> bytes:
+        """Same as synthesize(), for TTS_MODE=sequential (runs in an offload thread)"""
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    name = "gtts"
+
+    async def synthesize(self, text: str, voice: dict) -> bytes:
+        return await get_tts_transport().synthesize(text, voice["lang"], voice["tld"], voice["slow"])
+
+    def synthesize_blocking(self, text: str, voice: dict) -> bytes:
+        buf = io.BytesIO()
+        gTTS(text=text, lang=voice["lang"], tld=voice["tld"], slow=voice["slow"]).write_to_fp(buf)
+        return buf.getvalue()
+
+
+def _espeak_mp3(text: str, espeak_voice: str, speed: int) -> bytes:
+    """espeak-ng WAV -> MP3 in the segment format. Module-level so the process pool can run it"""
+    from pydub import AudioSegment
+
+    result = subprocess.run(
+        [ESPEAK_BIN, "-v", espeak_voice, "-s", str(speed), "--stdout"],
+        input=text.encode("utf-8"), capture_output=True, timeout=ESPEAK_TIMEOUT,
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(f"espeak-ng failed ({result.returncode}): {result.stderr.decode('utf-8', 'replace')[:200]}")
+
+    audio = AudioSegment.from_wav(io.BytesIO(result.stdout))
+    audio = audio.set_channels(1).set_frame_rate(SEGMENT_FORMAT.sample_rate)
+    buf = io.BytesIO()
+    audio.export(buf, format="mp3", bitrate=f"{SEGMENT_BITRATE}k")
+    return buf.getvalue()
+
+
+class EspeakEngine(TTSEngine):
+    """Offline: synthesis + encoding happen on local cores, one process-pool task per turn"""
+
+    name = "espeak"
+
+    def __init__(self):
+        if shutil.which(ESPEAK_BIN) is None:
+            log.warning("espeak-ng not found - espeak segments will fail over to gTTS", extra={"bin": ESPEAK_BIN})
+
+    async def synthesize(self, text: str, voice: dict) -> bytes:
+        return await run_cpu(_espeak_mp3, text, voice["espeak_voice"], voice["espeak_speed"])
+
+    def synthesize_blocking(self, text: str, voice: dict) -> bytes:
+        return _espeak_mp3(text, voice["espeak_voice"], voice["espeak_speed"])
+
+
+_factories: Dict[str, Callable[[], TTSEngine]] = {
+    GTTSEngine.name: GTTSEngine,
+    EspeakEngine.name: EspeakEngine,
+}
+_engines: Dict[str, TTSEngine] = {}
+
+
+def register_engine(name: str, factory: Callable[[], TTSEngine]):
+    _factories[name] = factory
+    _engines.pop(name, None)
+
+
+def get_engine(name: Optional[str]) -> TTSEngine:
+    """Shared instance of engine `name` (None = TTS_ENGINE)"""
+    name = name or TTS_ENGINE
+    engine = _engines.get(name)
+    if engine is None:
+        factory = _factories.get(name)
+        if factory is None:
+            raise ValueError(f"Unknown TTS engine {name!r} (available: {', '.join(sorted(_factories))})")
+        engine = _engines[name] = factory()
+    return engine
@@ -1,13 +1,16 @@
 """
-TTS Service - Multi-voice using different gTTS settings
+TTS Service - Multi-voice episodes, each speaker on its own TTS engine/voice
 Didi = Female voice (Hindi)
 Bhaiya = Male voice (English-India with different accent)
+Engines (gTTS over the network, espeak-ng offline) live in tts_engines
 """
 
 import os
+import io
 import re
 import asyncio
 import tempfile
+from typing import AsyncIterator, List, Optional, Tuple
 from pydub import AudioSegment
 from pydub.effects import speedup
 from gtts import gTTS
@@ -15,145 +18,329 @@ from gtts import gTTS
 from dotenv import load_dotenv
 load_dotenv()
 
+from .cache import get_cache, make_key, config_fingerprint
+from .tts_engines import get_engine, engine_for, SEGMENT_BITRATE
+from .offload import run_io, run_audio, write_bytes, remove
+from .mp3_frames import Mp3StreamWriter, probe_format
+from .audio_stream import SegmentPublisher, ProgressCallback
+from .metrics import STAGE_SECONDS, BYTES
+from .logs import get_logger
+
+log = get_logger("tts")
+
+# "concurrent": segments fetched in parallel over the async transport
+# "sequential": original one-at-a-time blocking engine calls
+TTS_MODE = os.getenv("TTS_MODE", "concurrent")
+TTS_JOB_CONCURRENCY = int(os.getenv("TTS_JOB_CONCURRENCY", 6))
+
+# "frames": join MP3 frames directly (decode only for fades/mismatches)
+# "pcm": decode every segment and re-encode the whole episode
+TTS_COMBINE = os.getenv("TTS_COMBINE", "frames")
+PAUSE_MS = 500  # pause between speakers
+FADE_MS = 300
+
+ESPEAK_SPEED = int(os.getenv("ESPEAK_SPEED", 165))  # words per minute
+
+# Voice settings per speaker - part of the segment cache key, so changing any
+# value here naturally invalidates previously cached audio for that speaker.
+# "engine" picks the TTS engine (TTS_ENGINE / TTS_ENGINE_<SPEAKER>); lang/tld/slow
+# are for gtts, espeak_* for espeak; pitch is applied whichever engine speaks
+VOICES = {
+    "DIDI": {"engine": engine_for("DIDI"), "lang": "hi", "tld": "com", "slow": False, "pitch": 1.0,
+             "espeak_voice": os.getenv("ESPEAK_VOICE_DIDI", "hi+f3"), "espeak_speed": ESPEAK_SPEED},
+    "BHAIYA": {"engine": engine_for("BHAIYA"), "lang": "en", "tld": "co.in", "slow": False, "pitch": 0.90,
+               "espeak_voice": os.getenv("ESPEAK_VOICE_BHAIYA", "en+m3"), "espeak_speed": ESPEAK_SPEED},
+}
+# Last resort when a segment's own engine fails
+FALLBACK_ENGINE = os.getenv("TTS_FALLBACK_ENGINE", "gtts")
+FALLBACK_VOICE = {"lang": "hi", "tld": "com", "slow": False, "espeak_voice": "hi", "espeak_speed": ESPEAK_SPEED}
+
+
+def _gtts_save(text: str, path: str, **kwargs):
+    """Blocking gTTS request + file write - call through run_io"""
+    gTTS(text=text, **kwargs).save(path)
+
+
+class TurnParser:
+    """Incremental script parser: feed() text as it arrives, get back the turns completed so far.
+
+    A turn is complete once the next speaker label (or close()) is seen; feeding a
+    whole script and closing gives the same turns as TTSService._parse_script.
+    """
+
+    def __init__(self):
+        self.speaker = "DIDI"
+        self.text = []
+        self._partial = ""
+
+    def _line(self, line: str) -> Optional[Tuple[str, str]]:
+        line = line.strip()
+        if not line:
+            return None
+
+        # Check for speaker change
+        for speaker in ("DIDI", "BHAIYA"):
+            if line.upper().startswith(speaker + ":"):
+                finished = (self.speaker, ' '.join(self.text)) if self.text else None
+                self.speaker = speaker
+                text = line[len(speaker) + 1:].strip()
+                self.text = [text] if text else []
+                return finished
+
+        # Continue current speaker
+        self.text.append(line)
+        return None
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        *lines, self._partial = (self._partial + text).split('\n')
+        return [turn for turn in map(self._line, lines) if turn]
+
+    def close(self) -> List[Tuple[str, str]]:
+        turns = [turn for turn in [self._line(self._partial)] if turn]
+        self._partial = ""
+        # Don't forget last segment
+        if self.text:
+            turns.append((self.speaker, ' '.join(self.text)))
+            self.text = []
+        return turns
+
+
+def segment_cache_key(speaker: str, voice: dict, clean_text: str) -> str:
+    return make_key("tts", speaker, config_fingerprint(voice), clean_text)
+
 
 class TTSService:
     def __init__(self):
         self.temp_dir = tempfile.mkdtemp()
-        print("[TTS] Service initialized with Multi-voice gTTS")
-        print("[TTS] Didi: Hindi female (hi)")
-        print("[TTS] Bhaiya: English-India male (en, tld=co.in, slower)")
+        log.info("TTS service ready", extra={"mode": TTS_MODE,
+                                             "engines": {speaker: voice["engine"] for speaker, voice in VOICES.items()}})
 
-    async def generate_audio(self, script: str, output_path: str) -> int:
-        """Convert script to MP3 with different voices for Didi and Bhaiya"""
-        print(f"[TTS] Generating multi-voice audio...")
-        print(f"[TTS] Script length: {len(script)} characters")
+    async def generate_audio(self, script: str, output_path: str,
+                             parts_dir: Optional[str] = None, on_progress: Optional[ProgressCallback] = None) -> int:
+        """Convert script to MP3 with different voices for Didi and Bhaiya
 
+        With `parts_dir`, each finished segment is also published there for
+        progressive playback; `on_progress(done, ready, total)` fires per segment.
+        """
+        publisher = None
         try:
             # Parse script into segments
             segments = self._parse_script(script)
-            print(f"[TTS] Found {len(segments)} dialogue segments")
+            log.info("Generating audio", extra={"chars": len(script), "segments": len(segments)})
 
             if not segments:
                 segments = [("DIDI", script)]
 
-            audio_files = []
-
-            for i, (speaker, text) in enumerate(segments):
-                if not text.strip() or len(text.strip()) < 2:
-                    continue
-
-                segment_path = os.path.join(self.temp_dir, f"seg_{i}.mp3")
-                clean_text = self._clean_text(text)
-
-                print(f"[TTS] Segment {i}: {speaker} - {len(clean_text)} chars")
+            work = [w for w in (self._work_item(i, speaker, text) for i, (speaker, text) in enumerate(segments)) if w]
 
-                try:
-                    if speaker == "DIDI":
-                        # Female voice: Hindi, normal speed
-                        tts = gTTS(text=clean_text, lang='hi', slow=False)
-                        tts.save(segment_path)
-                    else:  # BHAIYA
-                        # Male voice: English-India, slower and deeper
-                        tts = gTTS(text=clean_text, lang='en', tld='co.in', slow=False)
-                        tts.save(segment_path)
-
-                        # Make it sound different (lower pitch via speed manipulation)
-                        audio = AudioSegment.from_mp3(segment_path)
-                        # Slow down slightly and lower pitch
-                        audio = audio._spawn(audio.raw_data, overrides={
-                            "frame_rate": int(audio.frame_rate * 0.90)
-                        }).set_frame_rate(audio.frame_rate)
-                        audio.export(segment_path, format="mp3")
-
-                    audio_files.append(segment_path)
+            publisher = SegmentPublisher(len(work), parts_dir, on_progress)
+            await publisher.start()
 
-                except Exception as e:
-                    print(f"[TTS] Segment {i} failed: {e}")
-                    # Try fallback
-                    try:
-                        tts = gTTS(text=clean_text, lang='hi')
-                        tts.save(segment_path)
-                        audio_files.append(segment_path)
-                    except Exception as e2:
-                        print(f"[TTS] Fallback also failed: {e2}")
-                        continue
-
-            if not audio_files:
-                print("[TTS] No audio generated!")
-                tts = gTTS("Audio generation failed. Please try again.", lang='en')
-                tts.save(output_path)
-                return 5
-
-            # Combine all segments
-            print(f"[TTS] Combining {len(audio_files)} audio segments...")
-            duration = self._combine_audio(audio_files, output_path)
-
-            # Cleanup
-            for f in audio_files:
-                try:
-                    os.remove(f)
-                except:
-                    pass
+            if TTS_MODE == "concurrent":
+                results = await self._synthesize_concurrent(work, publisher)
+            else:
+                results = []
+                for k, w in enumerate(work):
+                    results.append(await run_io(self._synthesize_with_fallback, *w))
+                    await publisher.publish(k, results[-1])
 
-            print(f"[TTS] SUCCESS! Duration: {duration} seconds")
-            return duration
+            return await self._finish_audio(results, output_path)
 
-        except Exception as e:
-            print(f"[TTS] ERROR: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            log.exception("Audio generation failed - using single-voice fallback")
 
             # Emergency fallback
             try:
                 clean_script = re.sub(r'(DIDI:|BHAIYA:)', '', script)
-                tts = gTTS(text=clean_script[:3000], lang='hi')
-                tts.save(output_path)
+                await run_io(_gtts_save, clean_script[:3000], output_path, lang='hi')
                 return 60
             except:
                 raise
 
-    def _parse_script(self, script: str):
-        """Parse script into (speaker, text) tuples"""
-        segments = []
-        current_speaker = "DIDI"
-        current_text = []
+        finally:
+            if publisher is not None:
+                await publisher.finish()
+
+    async def generate_audio_stream(self, turns: AsyncIterator[Tuple[str, str]], output_path: str,
+                                    parts_dir: Optional[str] = None,
+                                    on_progress: Optional[ProgressCallback] = None) -> int:
+        """Pipelined generate_audio: synthesize (speaker, text) turns while the script is still being written.
+
+        Each turn starts as soon as it arrives (same per-job limit as concurrent
+        mode) and the episode is combined once `turns` is exhausted. An error
+        raised by `turns` (script generation failed) cancels synthesis and propagates.
+        """
+        publisher = SegmentPublisher(None, parts_dir, on_progress)
+        await publisher.start()
+        job_limit = asyncio.Semaphore(TTS_JOB_CONCURRENCY)
+        tasks = []
+
+        async def run(k, w):
+            async with job_limit:
+                path = await self._synthesize_one_async(*w)
+            await publisher.publish(k, path)
+            return path
 
-        lines = script.strip().split('\n')
+        try:
+            i = 0
+            async for speaker, text in turns:
+                w = self._work_item(i, speaker, text)
+                i += 1
+                if w:
+                    publisher.add()
+                    tasks.append(asyncio.create_task(run(len(tasks), w)))
+            log.info("Streamed script complete", extra={"segments": len(tasks)})
+            await publisher.seal()
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            await publisher.finish()
+
+        return await self._finish_audio(results, output_path)
+
+    def _work_item(self, i: int, speaker: str, text: str):
+        if not text.strip() or len(text.strip()) < 2:
+            return None
+
+        segment_path = os.path.join(self.temp_dir, f"seg_{i}.mp3")
+        clean_text = self._clean_text(text)
+
+        log.debug("Segment queued", extra={"segment": i, "speaker": speaker, "chars": len(clean_text)})
+        return (i, speaker, clean_text, segment_path)
+
+    async def _finish_audio(self, results: list, output_path: str) -> int:
+        # Results come back in script order; failed segments are None
+        audio_files = [path for path in results if path]
+
+        if not audio_files:
+            log.error("No audio generated")
+            await run_io(_gtts_save, "Audio generation failed. Please try again.", output_path, lang='en')
+            return 5
+
+        # Combine all segments
+        with STAGE_SECONDS.time(stage="combine"):
+            duration = await run_audio(self._combine_audio, audio_files, output_path)
+        BYTES.inc(await run_io(os.path.getsize, output_path), channel="audio", direction="out")
+
+        # Cleanup
+        for f in audio_files:
+            try:
+                await remove(f)
+            except:
+                pass
 
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+        log.info("Audio ready", extra={"segments": len(audio_files), "duration": duration})
+        return duration
 
-            # Check for speaker change
-            if line.upper().startswith('DIDI:'):
-                # Save previous segment
-                if current_text:
-                    segments.append((current_speaker, ' '.join(current_text)))
-                    current_text = []
-                current_speaker = "DIDI"
-                text = line[5:].strip()
-                if text:
-                    current_text.append(text)
-
-            elif line.upper().startswith('BHAIYA:'):
-                # Save previous segment
-                if current_text:
-                    segments.append((current_speaker, ' '.join(current_text)))
-                    current_text = []
-                current_speaker = "BHAIYA"
-                text = line[7:].strip()
-                if text:
-                    current_text.append(text)
-            else:
-                # Continue current speaker
-                current_text.append(line)
+    def _synthesize_with_fallback(self, i: int, speaker: str, clean_text: str, segment_path: str):
+        with STAGE_SECONDS.time(stage="tts_segment"):
+            try:
+                self._synthesize_segment(speaker, clean_text, segment_path)
+                return segment_path
 
-        # Don't forget last segment
-        if current_text:
-            segments.append((current_speaker, ' '.join(current_text)))
+            except Exception as e:
+                log.warning("Segment failed", extra={"segment": i, "error": str(e)})
+                # Try fallback
+                try:
+                    audio = get_engine(FALLBACK_ENGINE).synthesize_blocking(clean_text, FALLBACK_VOICE)
+                    with open(segment_path, "wb") as f:
+                        f.write(audio)
+                    return segment_path
+                except Exception as e2:
+                    log.warning("Fallback also failed", extra={"segment": i, "error": str(e2)})
+                    return None
+
+    async def _synthesize_concurrent(self, work: list, publisher: SegmentPublisher) -> list:
+        """Synthesize all segments in parallel (bounded per job and globally), preserving order"""
+        job_limit = asyncio.Semaphore(TTS_JOB_CONCURRENCY)
+
+        async def run(k, w):
+            async with job_limit:
+                path = await self._synthesize_one_async(*w)
+            await publisher.publish(k, path)
+            return path
+
+        return await asyncio.gather(*(run(k, w) for k, w in enumerate(work)))
+
+    async def _synthesize_one_async(self, i: int, speaker: str, clean_text: str, segment_path: str):
+        with STAGE_SECONDS.time(stage="tts_segment"):
+            try:
+                await self._synthesize_segment_async(speaker, clean_text, segment_path)
+                return segment_path
 
-        return segments
+            except Exception as e:
+                log.warning("Segment failed", extra={"segment": i, "error": str(e)})
+                # Try fallback
+                try:
+                    audio = await get_engine(FALLBACK_ENGINE).synthesize(clean_text, FALLBACK_VOICE)
+                    await write_bytes(segment_path, audio)
+                    return segment_path
+                except Exception as e2:
+                    log.warning("Fallback also failed", extra={"segment": i, "error": str(e2)})
+                    return None
+
+    async def _synthesize_segment_async(self, speaker: str, clean_text: str, segment_path: str):
+        """Async twin of _synthesize_segment - same cache, same voices, non-blocking synthesis"""
+        voice = VOICES.get(speaker, VOICES["BHAIYA"])
+        cache = get_cache("tts")
+        key = segment_cache_key(speaker, voice, clean_text)
+
+        cached = await cache.aget(key) if cache else None
+        if cached is not None:
+            await write_bytes(segment_path, cached)
+            return
+
+        audio = await get_engine(voice["engine"]).synthesize(clean_text, voice)
+        if voice["pitch"] != 1.0:
+            audio = await run_audio(self._apply_pitch, audio, voice["pitch"])
+        await write_bytes(segment_path, audio)
+
+        if cache:
+            await cache.aset(key, audio)
+
+    def _synthesize_segment(self, speaker: str, clean_text: str, segment_path: str):
+        """Write the final (post-processed) audio for one turn, reusing cached audio across jobs"""
+        voice = VOICES.get(speaker, VOICES["BHAIYA"])
+        cache = get_cache("tts")
+        key = segment_cache_key(speaker, voice, clean_text)
+
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            with open(segment_path, "wb") as f:
+                f.write(cached)
+            return
+
+        audio = get_engine(voice["engine"]).synthesize_blocking(clean_text, voice)
+        if voice["pitch"] != 1.0:
+            audio = self._apply_pitch(audio, voice["pitch"])
+        with open(segment_path, "wb") as f:
+            f.write(audio)
+
+        if cache:
+            cache.set(key, audio)
+
+    def _apply_pitch(self, data: bytes, pitch: float) -> bytes:
+        """Make it sound different (lower pitch via speed manipulation).
+
+        Decoded from memory and encoded once, in the engines' segment format, so the
+        cached result is copied frame by frame by the combine on every later job.
+        """
+        audio = AudioSegment.from_file(io.BytesIO(data), format="mp3")
+        audio = audio._spawn(audio.raw_data, overrides={
+            "frame_rate": int(audio.frame_rate * pitch)
+        }).set_frame_rate(audio.frame_rate)
+        buf = io.BytesIO()
+        with STAGE_SECONDS.time(stage="export"):
+            audio.export(buf, format="mp3", bitrate=f"{SEGMENT_BITRATE}k")
+        return buf.getvalue()
+
+    def _parse_script(self, script: str):
+        """Parse script into (speaker, text) tuples"""
+        parser = TurnParser()
+        return parser.feed(script) + parser.close()
 
     def _clean_text(self, text: str) -> str:
         """Clean text for TTS"""
@@ -170,30 +357,106 @@ class TTSService:
 
     def _combine_audio(self, audio_files: list, output_path: str) -> int:
         """Combine audio segments with small pauses"""
-        combined = AudioSegment.empty()
-        pause = AudioSegment.silent(duration=500)  # 500ms pause between speakers
-
-        for i, audio_file in enumerate(audio_files):
+        if TTS_COMBINE == "frames":
             try:
-                segment = AudioSegment.from_mp3(audio_file)
-                combined += segment
+                return self._combine_frames(audio_files, output_path)
+            except Exception as e:
+                log.warning("Frame-level combine failed - falling back to PCM", extra={"error": str(e)})
+        return self._combine_pcm(audio_files, output_path)
+
+    def _combine_frames(self, audio_files: list, output_path: str) -> int:
+        """Join segments MP3 frame by frame, with pre-encoded silent frames as pauses.
+
+        Only the first/last segments (fades) and segments in a different MP3
+        format are decoded and re-encoded; everything else is copied as-is, so
+        cost is linear and memory holds one segment at a time.
+        """
+        last = len(audio_files) - 1
+        with open(output_path, "wb") as out:
+            writer = None
+            for i, audio_file in enumerate(audio_files):
+                try:
+                    with open(audio_file, "rb") as f:
+                        data = f.read()
+
+                    header = probe_format(data)
+                    if writer is None:
+                        if header is None:
+                            raise ValueError("no MP3 frames")
+                        writer = Mp3StreamWriter(out, header.format, header.bitrate)
+
+                    fade_in = writer.frames == 0
+                    fade_out = i == last
+                    if fade_in or fade_out or not writer.accepts(header):
+                        try:
+                            data = self._reencode(data, writer, fade_in, fade_out)
+                        except Exception as e:
+                            if not writer.accepts(header):
+                                raise
+                            log.warning("Fade skipped", extra={"file": audio_file, "error": str(e)})
+
+                    # Pause between segments (not before the first)
+                    if writer.frames > 0:
+                        writer.write_silence(PAUSE_MS)
+                    writer.write_segment(data)
 
-                # Add pause between segments (not after last)
-                if i < len(audio_files) - 1:
-                    combined += pause
+                except Exception as e:
+                    log.warning("Could not load segment", extra={"file": audio_file, "error": str(e)})
+                    continue
 
+            if writer is None or writer.frames == 0:
+                raise ValueError("no segment could be joined")
+            writer.close()
+
+        return int(writer.duration_ms / 1000)
+
+    def _reencode(self, data: bytes, writer: Mp3StreamWriter, fade_in: bool, fade_out: bool) -> bytes:
+        """Decode one segment, apply edge fades, encode it in the writer's MP3 format"""
+        segment = AudioSegment.from_file(io.BytesIO(data), format="mp3")
+        segment = segment.set_frame_rate(writer.format.sample_rate).set_channels(1 if writer.format.mono else 2)
+        if fade_in and len(segment) > FADE_MS:
+            segment = segment.fade_in(FADE_MS)
+        if fade_out and len(segment) > FADE_MS:
+            segment = segment.fade_out(FADE_MS)
+        buf = io.BytesIO()
+        with STAGE_SECONDS.time(stage="export"):
+            segment.export(buf, format="mp3", bitrate=f"{writer.bitrate}k")
+        return buf.getvalue()
+
+    def _combine_pcm(self, audio_files: list, output_path: str) -> int:
+        """Decode everything and encode once - used when frame-level joining isn't possible"""
+        pieces = []
+        for audio_file in audio_files:
+            try:
+                pieces.append(AudioSegment.from_mp3(audio_file))
             except Exception as e:
-                print(f"[TTS] Error loading {audio_file}: {e}")
+                log.warning("Could not load segment", extra={"file": audio_file, "error": str(e)})
                 continue
 
-        if len(combined) == 0:
+        if not pieces:
             combined = AudioSegment.silent(duration=1000)
+        else:
+            # Normalize to the first segment's parameters and join raw PCM in one pass
+            # (repeated `combined += segment` copies the whole buffer every time)
+            first = pieces[0]
+            pause = AudioSegment.silent(duration=PAUSE_MS, frame_rate=first.frame_rate)
+            raw = []
+            for i, piece in enumerate(pieces):
+                if i > 0:
+                    raw.append(self._match(pause, first).raw_data)
+                raw.append(self._match(piece, first).raw_data)
+            combined = first._spawn(b"".join(raw))
 
         # Add fade in/out for polish
         if len(combined) > 1000:
-            combined = combined.fade_in(300).fade_out(300)
+            combined = combined.fade_in(FADE_MS).fade_out(FADE_MS)
 
         # Export
-        combined.export(output_path, format="mp3", bitrate="128k")
+        with STAGE_SECONDS.time(stage="export"):
+            combined.export(output_path, format="mp3", bitrate="128k")
 
         return int(len(combined) / 1000)
+
+    @staticmethod
+    def _match(segment: AudioSegment, like: AudioSegment) -> AudioSegment:
+        return segment.set_frame_rate(like.frame_rate).set_channels(like.channels).set_sample_width(like.sample_width)
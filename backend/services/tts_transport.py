@@ -0,0 +1,99 @@
+"""
+TTS Transport - async client for the Google Translate TTS endpoint gTTS uses
+gTTS still does the text tokenizing and request encoding; the HTTP calls go
+through one pooled httpx.AsyncClient under a process-wide concurrency limit
+"""
+
+import os
+import re
+import base64
+import asyncio
+from typing import Optional
+
+import httpx
+from gtts import gTTS
+from gtts.tts import gTTSError
+from dotenv import load_dotenv
+
+from .metrics import BYTES
+
+# Load environment variables
+load_dotenv()
+
+# Override to point at a different host (e.g. a local stand-in); default follows the voice's tld
+TTS_BASE_URL = os.getenv("TTS_BASE_URL")
+TTS_GLOBAL_CONCURRENCY = int(os.getenv("TTS_GLOBAL_CONCURRENCY", 16))
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", 30))
+
+_AUDIO_RE = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+
+class AsyncTTSTransport:
+    def __init__(self):
+        self.max_connections = int(os.getenv("TTS_MAX_CONNECTIONS", TTS_GLOBAL_CONCURRENCY))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global_limit = asyncio.Semaphore(TTS_GLOBAL_CONCURRENCY)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(limits=limits, timeout=TTS_TIMEOUT)
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def _url(self, tld: str) -> str:
+        base = TTS_BASE_URL or f"https://translate.google.{tld}"
+        return f"{base}/_/TranslateWebserverUi/data/batchexecute"
+
+    async def synthesize(self, text: str, lang: str, tld: str = "com", slow: bool = False) -> bytes:
+        """Return MP3 bytes for `text` - identical to what gTTS(...).save() would write"""
+        tts = gTTS(text=text, lang=lang, tld=tld, slow=slow, lang_check=False)
+        parts = tts._tokenize(tts.text)
+        if not parts:
+            raise gTTSError("No text to send to TTS API")
+
+        url = self._url(tld)
+        # gTTS splits long turns into <=100 char parts; fetch them concurrently, join in order
+        chunks = await asyncio.gather(*(self._fetch(url, tts._package_rpc(part)) for part in parts))
+        return b"".join(chunks)
+
+    async def _fetch(self, url: str, body: str) -> bytes:
+        async with self._global_limit:
+            response = await self.client.post(url, content=body, headers=gTTS.GOOGLE_TTS_HEADERS)
+
+        BYTES.inc(len(response.content), channel="tts", direction="in")
+        if response.status_code != 200:
+            raise gTTSError(f"{response.status_code} from TTS API")
+
+        audio = []
+        for line in response.text.splitlines():
+            if "jQ1olc" in line:
+                match = _AUDIO_RE.search(line)
+                if not match:
+                    raise gTTSError("No audio stream in TTS API response")
+                audio.append(base64.b64decode(match.group(1).encode("ascii")))
+        return b"".join(audio)
+
+
+# App-wide instance
+_transport: Optional[AsyncTTSTransport] = None
+
+
+def get_tts_transport() -> AsyncTTSTransport:
+    global _transport
+    if _transport is None:
+        _transport = AsyncTTSTransport()
+    return _transport
+
+
+async def close_tts_transport():
+    global _transport
+    if _transport is not None:
+        await _transport.close()
+        _transport = None
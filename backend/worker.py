@@ -0,0 +1,154 @@
+"""
+SaarLM Worker - runs queued podcast jobs (EXECUTION_MODE=queue)
+Start it next to the API, from the backend directory, sharing the same disk:
+
+    python worker.py
+
+WORKER_PROCESSES processes each run up to WORKER_CONCURRENCY jobs at a time;
+per-stage limits (STAGE_LIMIT_*) apply inside every process. With
+WORKER_METRICS_PORT set, process i serves Prometheus metrics on that port + i.
+"""
+
+import os
+import sys
+import signal
+import socket
+import asyncio
+import multiprocessing
+
+from dotenv import load_dotenv
+
+from services.logs import get_logger, job_context, shutdown_logging
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger("worker")
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 2))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 2))
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", 1.0))
+# 0 = no metrics listener
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 0))
+
+
+async def _run_job(queue, worker: str, job_id: str, payload: dict, attempt: int):
+    from main import process_file_direct, job_store
+    from services.job_queue import QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS
+
+    if attempt > QUEUE_MAX_ATTEMPTS:
+        log.error("Job gave up", extra={"worker": worker, "attempts": attempt - 1})
+        await job_store.aset(job_id, {"status": "error", "error": "Processing was interrupted too many times"})
+        await queue.afinish(job_id, error="max attempts exceeded")
+        return
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(QUEUE_LEASE_SECONDS / 3)
+            await queue.aextend(job_id, worker)
+
+    log.info("Job claimed", extra={"worker": worker, "attempt": attempt})
+    keepalive = asyncio.create_task(heartbeat())
+    try:
+        await process_file_direct(job_id, **payload)
+    finally:
+        keepalive.cancel()
+
+    job = await job_store.aget(job_id) or {}
+    await queue.afinish(job_id, error=job.get("error") if job.get("status") == "error" else None)
+
+
+async def _slot(queue, worker: str, stop: asyncio.Event):
+    while not stop.is_set():
+        claimed = await queue.aclaim(worker)
+        if claimed is None:
+            try:
+                await asyncio.wait_for(stop.wait(), QUEUE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        job_id, payload, attempt = claimed
+        with job_context(job_id):
+            try:
+                await _run_job(queue, worker, job_id, payload, attempt)
+            except Exception:
+                # process_file_direct records its own errors; this is the queue bookkeeping failing
+                log.exception("Job bookkeeping failed", extra={"worker": worker})
+
+
+async def worker_main(name: str, index: int = 0):
+    from main import job_store  # noqa: F401 - imports the app module (dirs, job store)
+    from services.gemini_client import get_gemini_client, close_gemini_client
+    from services.tts_transport import close_tts_transport
+    from services.job_queue import get_job_queue
+    from services.loop_monitor import loop_monitor
+    from services.audio_stream import cancel_parts_removals
+    from services import offload, metrics
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    queue = get_job_queue()
+    get_gemini_client().start()
+    loop_monitor.start()
+    metrics_server = await metrics.serve(WORKER_METRICS_PORT + index) if WORKER_METRICS_PORT else None
+    log.info("Worker ready", extra={"worker": name, "slots": WORKER_CONCURRENCY})
+
+    try:
+        # Running jobs finish before the worker exits; only claiming stops
+        await asyncio.gather(*(_slot(queue, f"{name}/{i}", stop) for i in range(WORKER_CONCURRENCY)))
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await cancel_parts_removals()
+        await loop_monitor.stop()
+        await close_gemini_client()
+        await close_tts_transport()
+        offload.shutdown()
+        log.info("Worker stopped", extra={"worker": name})
+
+
+def run_worker(name: str, index: int = 0):
+    try:
+        asyncio.run(worker_main(name, index))
+    finally:
+        shutdown_logging()
+
+
+def main():
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    if WORKER_PROCESSES <= 1:
+        run_worker(base)
+        return
+
+    # spawn: each worker gets a fresh interpreter with its own loop, pools and connections
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(f"{base}-{i}", i), name=f"worker-{i}")
+                 for i in range(WORKER_PROCESSES)]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Ctrl+C already reached the children (same process group); wait for them to drain
+        for process in processes:
+            process.join()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
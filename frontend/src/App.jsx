@@ -8,6 +8,9 @@ import {
 
 // API Configuration
 const API_BASE = 'https://saarlm-api.onrender.com/api';
+const API_ORIGIN = API_BASE.replace(/\/api$/, '');
+const LIBRARY_PAGE_SIZE = 50;
+const MAX_UPLOAD_FILES = 10;
 
 // ============================================
 // MAIN APP COMPONENT
@@ -19,6 +22,8 @@ export default function App() {
   const [processingStatus, setProcessingStatus] = useState(null);
   const [currentPodcast, setCurrentPodcast] = useState(null);
   const [library, setLibrary] = useState([]);
+  const [libraryTotal, setLibraryTotal] = useState(0);
+  const [libraryCursor, setLibraryCursor] = useState(null);
   const [isPlaying, setIsPlaying] = useState(false);
   const [currentTime, setCurrentTime] = useState(0);
   const [duration, setDuration] = useState(0);
@@ -36,56 +41,112 @@ export default function App() {
     fetchLibrary();
   }, []);
 
-  // Fetch user's podcast library
-  const fetchLibrary = async () => {
+  // Fetch user's podcast library - one page of list fields (no scripts);
+  // pass the previous page's cursor to append the next page
+  const fetchLibrary = async (cursor = null) => {
     try {
-      const res = await fetch(`${API_BASE}/library`);
+      const params = new URLSearchParams({ limit: LIBRARY_PAGE_SIZE });
+      if (cursor) params.set('cursor', cursor);
+      const res = await fetch(`${API_BASE}/library?${params}`);
       const data = await res.json();
-      setLibrary(data.podcasts || []);
+      const podcasts = data.podcasts || [];
+      setLibrary((prev) => (cursor ? [...prev, ...podcasts] : podcasts));
+      setLibraryTotal(data.total ?? podcasts.length);
+      setLibraryCursor(data.next_cursor || null);
     } catch (err) {
       console.error('Failed to fetch library:', err);
     }
   };
 
-  // Poll for processing status
+  // Apply a job status update (from the event stream or a status poll)
+  const handleStatus = useCallback((jid, data) => {
+    setProcessingStatus(data);
+
+    if (data.status === 'completed' || data.status === 'complete') {
+      // Keep an in-progress live stream playing instead of restarting on the final file
+      setCurrentPodcast(prev => ({
+        ...data.metadata,
+        audio_url: prev?.streaming && prev.job_id === jid ? prev.audio_url : data.audio_url,
+        script: data.script
+      }));
+      fetchLibrary();
+      setTimeout(() => setCurrentView('player'), 1000);
+      return true;
+    }
+    return data.status === 'failed' || data.status === 'error';
+  }, []);
+
+  // Poll for processing status - fallback when the event stream is unavailable
   const pollStatus = useCallback(async (jid) => {
     try {
       const res = await fetch(`${API_BASE}/status/${jid}`);
       const data = await res.json();
-      setProcessingStatus(data);
-
-      if (data.status === 'completed' || data.status === 'complete') {
-        clearInterval(pollIntervalRef.current);
-        setCurrentPodcast({
-          ...data.metadata,
-          audio_url: data.audio_url,
-          script: data.script
-        });
-        fetchLibrary();
-        setTimeout(() => setCurrentView('player'), 1000);
-      } else if (data.status === 'failed') {
+      if (handleStatus(jid, data)) {
         clearInterval(pollIntervalRef.current);
       }
     } catch (err) {
       console.error('Status poll error:', err);
     }
-  }, []);
+  }, [handleStatus]);
 
-  // Start polling when jobId changes
+  // Follow the job: pushed updates over SSE, polling only if that fails
   useEffect(() => {
-    if (jobId && currentView === 'processing') {
+    if (!jobId || currentView !== 'processing') return;
+
+    let finished = false;
+    const startPolling = () => {
+      clearInterval(pollIntervalRef.current);
       pollIntervalRef.current = setInterval(() => pollStatus(jobId), 2000);
+    };
+
+    if (typeof EventSource === 'undefined') {
+      startPolling();
       return () => clearInterval(pollIntervalRef.current);
     }
-  }, [jobId, currentView, pollStatus]);
 
-  // Handle file upload
-  const handleUpload = async (file) => {
+    const source = new EventSource(`${API_BASE}/events/${jobId}`);
+    source.addEventListener('progress', (e) => {
+      finished = handleStatus(jobId, JSON.parse(e.data));
+      if (finished) source.close();
+    });
+    source.addEventListener('end', () => source.close());
+    source.onerror = () => {
+      // EventSource would reconnect forever; fall back to polling instead
+      source.close();
+      if (!finished) startPolling();
+    };
+
+    return () => {
+      source.close();
+      clearInterval(pollIntervalRef.current);
+    };
+  }, [jobId, currentView, pollStatus, handleStatus]);
+
+  // Start listening while the rest of the episode is still being recorded
+  const listenNow = () => {
+    if (!processingStatus?.stream_url) return;
+    setCurrentPodcast({
+      job_id: jobId,
+      title: `${subject} - ${chapter || uploadedFile?.name?.replace(/\.[^/.]+$/, '') || 'Notes'}`,
+      audio_url: `${API_ORIGIN}${processingStatus.stream_url}`,
+      streaming: true
+    });
+    setIsPlaying(false);
+    setCurrentTime(0);
+  };
+
+  // Handle file upload - several files (pages in order) become one episode
+  const handleUpload = async (files) => {
+    const file = files[0];
     setUploadedFile(file);
     setCurrentView('processing');
     
     const formData = new FormData();
-    formData.append('file', file);
+    if (files.length === 1) {
+      formData.append('file', file);
+    } else {
+      files.forEach((f) => formData.append('files', f));
+    }
     formData.append('subject', subject);
     formData.append('chapter', chapter || file.name.replace(/\.[^/.]+$/, ''));
 
@@ -177,11 +238,24 @@ export default function App() {
   };
 
   // Play a podcast from library
-  const playPodcast = (podcast) => {
+  const playPodcast = async (podcast) => {
     setCurrentPodcast(podcast);
     setCurrentView('player');
     setIsPlaying(false);
     setCurrentTime(0);
+
+    // Library pages leave the script out - load the full record for the player
+    if (podcast.script === undefined) {
+      try {
+        const res = await fetch(`${API_BASE}/podcast/${podcast.job_id}`);
+        if (res.ok) {
+          const full = await res.json();
+          setCurrentPodcast((current) => (current?.job_id === podcast.job_id ? { ...current, ...full } : current));
+        }
+      } catch (err) {
+        console.error('Failed to fetch podcast:', err);
+      }
+    }
   };
 
   // Delete a podcast
@@ -204,7 +278,7 @@ export default function App() {
       <Sidebar 
         currentView={currentView} 
         setCurrentView={setCurrentView}
-        libraryCount={library.length}
+        libraryCount={libraryTotal}
       />
 
       {/* Main Content */}
@@ -228,7 +302,7 @@ export default function App() {
         )}
         
         {currentView === 'processing' && (
-          <ProcessingView status={processingStatus} />
+          <ProcessingView status={processingStatus} onListenNow={listenNow} />
         )}
         
         {currentView === 'player' && currentPodcast && (
@@ -238,6 +312,9 @@ export default function App() {
         {currentView === 'library' && (
           <LibraryView
             library={library}
+            total={libraryTotal}
+            hasMore={!!libraryCursor}
+            loadMore={() => fetchLibrary(libraryCursor)}
             playPodcast={playPodcast}
             deletePodcast={deletePodcast}
           />
@@ -409,29 +486,35 @@ function HomeView({ setCurrentView, library, playPodcast }) {
 // ============================================
 function UploadView({ subject, setSubject, chapter, setChapter, onUpload }) {
   const [isDragging, setIsDragging] = useState(false);
-  const [selectedFile, setSelectedFile] = useState(null);
+  const [selectedFiles, setSelectedFiles] = useState([]);
   const fileInputRef = useRef(null);
+  const selectedFile = selectedFiles[0];
+  const totalSize = selectedFiles.reduce((sum, f) => sum + f.size, 0);
 
   const subjects = [
     'Physics', 'Chemistry', 'Biology', 'Mathematics', 
     'English', 'Hindi', 'History', 'Geography', 'General'
   ];
 
+  // Pages are sent in the order picked (sorted by name, as phone cameras number them)
+  const pickFiles = (fileList) => {
+    const files = Array.from(fileList || []).sort((a, b) => a.name.localeCompare(b.name, undefined, { numeric: true }));
+    if (files.length) setSelectedFiles(files.slice(0, MAX_UPLOAD_FILES));
+  };
+
   const handleDrop = (e) => {
     e.preventDefault();
     setIsDragging(false);
-    const file = e.dataTransfer.files[0];
-    if (file) setSelectedFile(file);
+    pickFiles(e.dataTransfer.files);
   };
 
   const handleFileSelect = (e) => {
-    const file = e.target.files[0];
-    if (file) setSelectedFile(file);
+    pickFiles(e.target.files);
   };
 
   const handleSubmit = () => {
-    if (selectedFile) {
-      onUpload(selectedFile);
+    if (selectedFiles.length) {
+      onUpload(selectedFiles);
     }
   };
 
@@ -454,6 +537,7 @@ function UploadView({ subject, setSubject, chapter, setChapter, onUpload }) {
           ref={fileInputRef}
           type="file"
           accept=".pdf,.jpg,.jpeg,.png,.webp"
+          multiple
           onChange={handleFileSelect}
           className="hidden"
         />
@@ -467,12 +551,14 @@ function UploadView({ subject, setSubject, chapter, setChapter, onUpload }) {
                 <Image className="w-8 h-8 text-spotify-green" />
               )}
             </div>
-            <p className="font-medium text-lg mb-1">{selectedFile.name}</p>
+            <p className="font-medium text-lg mb-1">
+              {selectedFiles.length === 1 ? selectedFile.name : `${selectedFiles.length} pages`}
+            </p>
             <p className="text-text-secondary text-sm">
-              {(selectedFile.size / 1024 / 1024).toFixed(2)} MB
+              {(totalSize / 1024 / 1024).toFixed(2)} MB
             </p>
             <button 
-              onClick={(e) => { e.stopPropagation(); setSelectedFile(null); }}
+              onClick={(e) => { e.stopPropagation(); setSelectedFiles([]); }}
               className="mt-4 text-red-400 hover:text-red-300 text-sm flex items-center gap-1 mx-auto"
             >
               <X className="w-4 h-4" /> Remove
@@ -486,7 +572,7 @@ function UploadView({ subject, setSubject, chapter, setChapter, onUpload }) {
             <p className="font-medium text-lg mb-1">Drop your notes here</p>
             <p className="text-text-secondary text-sm">or click to browse</p>
             <p className="text-text-muted text-xs mt-4">
-              Supports: PDF, JPG, PNG (Max 20MB)
+              Supports: PDF, JPG, PNG (Max 20MB each, up to {MAX_UPLOAD_FILES} pages)
             </p>
           </>
         )}
@@ -548,7 +634,7 @@ function UploadView({ subject, setSubject, chapter, setChapter, onUpload }) {
 // ============================================
 // PROCESSING VIEW
 // ============================================
-function ProcessingView({ status }) {
+function ProcessingView({ status, onListenNow }) {
   const stages = [
     { key: 'upload', label: 'Uploading', emoji: '📤' },
     { key: 'ocr', label: 'Reading Notes', emoji: '👀' },
@@ -593,6 +679,17 @@ function ProcessingView({ status }) {
         </div>
       </div>
 
+      {/* Progressive playback - available once the first segments are recorded */}
+      {status?.status === 'processing' && status?.stream_url && (
+        <button
+          onClick={onListenNow}
+          className="btn-primary w-full flex items-center justify-center gap-2 mb-8"
+        >
+          <Play className="w-5 h-5" />
+          Listen now ({status.segments_ready}/{status.segments_total} parts ready)
+        </button>
+      )}
+
       {/* Stage Indicators */}
       <div className="space-y-3">
         {stages.map((stage, index) => (
@@ -649,6 +746,17 @@ function PlayerView({ podcast }) {
           {Math.floor((podcast.duration || 0) / 60)} min podcast
         </p>
 
+        {/* Very long notes: the end was left out to keep the episode a sensible size */}
+        {(podcast.pages_dropped > 0 || podcast.sections_dropped > 0) && (
+          <div className="text-left p-4 mb-6 bg-yellow-500/10 border border-yellow-500/20 rounded-xl">
+            <p className="text-yellow-400 text-sm">
+              Your notes were too long to cover in full.
+              {podcast.pages_dropped > 0 && ` The last ${podcast.pages_dropped} PDF page(s) were not read.`}
+              {podcast.sections_dropped > 0 && ` The last ${podcast.sections_dropped} section(s) of the notes are not in this podcast.`}
+            </p>
+          </div>
+        )}
+
         {/* Script Preview */}
         {podcast.script && (
           <div className="text-left bg-white/5 rounded-xl p-4 mt-6">
@@ -670,12 +778,12 @@ function PlayerView({ podcast }) {
 // ============================================
 // LIBRARY VIEW
 // ============================================
-function LibraryView({ library, playPodcast, deletePodcast }) {
+function LibraryView({ library, total, hasMore, loadMore, playPodcast, deletePodcast }) {
   return (
     <div className="p-6 md:p-8">
       <div className="flex items-center justify-between mb-6">
         <h1 className="font-display text-3xl font-bold">Your Library</h1>
-        <span className="text-text-secondary">{library.length} podcasts</span>
+        <span className="text-text-secondary">{total} podcasts</span>
       </div>
 
       {library.length === 0 ? (
@@ -711,6 +819,14 @@ function LibraryView({ library, playPodcast, deletePodcast }) {
               </button>
             </div>
           ))}
+          {hasMore && (
+            <button
+              onClick={loadMore}
+              className="w-full py-3 text-text-secondary hover:text-white transition-colors"
+            >
+              Load more
+            </button>
+          )}
         </div>
       )}
     </div>